@@ -1,10 +1,22 @@
 import cv2
+import sys
 import argparse
 import pandas as pd
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import timedelta
 
+# the shared helpers live in utils/ at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.cluster import DEFAULT_CLUSTER_PARAMS, cluster_records, first_in_clusters
+from utils.encode import DEFAULT_ENCODE_JOBS, IMAGE_FORMATS, ImageWriter, encode_params, fingerprint, write_image
+from utils.extract import extract_file
+from utils.game_store import GameStore, add_filter_args, filters_from_args
+from utils.ingest import resolve_jobs
+from utils.lifetimes import pair_wards
+from utils.phase_index import PhaseIndex, phase_edges
+from utils.sweep import int_list
+
 
 def to_timedelta(t):
     parts = list(map(int, t.split(":")))
@@ -18,95 +30,118 @@ def to_timedelta(t):
         raise ValueError("Unsupported time format")
 
 
+GAME_COLOR = [
+    (0, 0, 255),
+    (0, 255, 0),
+    (255, 0, 0),
+    (255, 255, 0),
+    (255, 0, 255),
+    (0, 255, 255),
+    (0, 128, 255),
+    (128, 0, 255),
+    (128, 128, 255),
+    (128, 255, 0),
+    (255, 128, 0),
+    (255, 128, 128),
+    (255, 0, 128),
+    (128, 0, 128),
+    (128, 128, 128),
+    (128, 255, 255),
+    (255, 128, 255),
+    (255, 255, 128),
+    (255, 255, 255),
+]
+
+# extracted vision kinds this script draws, and the names it has always used for them
+HISTORY_KINDS = {
+    'placed_observer': 'placed',
+    'smoke': 'smoke',
+    'destroyed_observer': 'destroyed',
+}
+# cluster parameters keyed by those names, so stacked ward spots are merged like smokes
+HISTORY_CLUSTER_PARAMS = {HISTORY_KINDS[kind]: params for kind, params in DEFAULT_CLUSTER_PARAMS.items() if kind in HISTORY_KINDS}
+
+
 def parse_events(file_path, map_width, map_height):
+    # both factions come from the single-pass extraction shared with vision_smoke_moving.py
+    return history_events(extract_file(file_path, map_width, map_height))
 
 
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-    
-    soup = BeautifulSoup(content, 'html.parser')
+def history_events(page):
     events = []
-
-    # Assuming events are in a specific HTML structure, e.g., <div class="event">
-    idx = 0
-    soup = soup.find('div', class_='match-log')
-    for event_div in soup.find_all('div', class_='event'):
-        data_div = event_div.find('div', class_='line')
-        if data_div is None:
+    # placed observer wards get how long they stood and whether the enemy destroyed them
+    lifetimes = pair_wards(page['events'])
+    for i, extracted in enumerate(page['events']):
+        key_action = HISTORY_KINDS.get(extracted['kind'])
+        if key_action is None:
             continue
-        # print(data_div)
-        # break
+        event = {
+            'time': extracted['time'],
+            'time_s': extracted['time_s'],
+            'action': extracted['action'],
+            'key_action': key_action,
+            'side': 'Radiant' if extracted['side'] == 'radiant' else 'Dire',
+            # the label is the first word of the action text
+            'hero': extracted['action'].split(' ')[0],
+            'position': extracted['position'],
+            'position_px': extracted['position_px'],
+        }
+        if i in lifetimes:
+            event['lifetime_s'], event['ward_status'], _ = lifetimes[i]
+        events.append(event)
+    return events
 
-        event = {}
-        event['time'] = data_div.find('span', class_='time').get_text(strip=True) if data_div.find('span', class_='time') else None
-        if event['time'] is None:
-            continue
 
-        action = data_div.find('div', class_='event').get_text()
-        # remove extra \n and spaces in action
-        action = ' '.join(action.split())
-        event['action'] = action
-        event['key_action'] = None
-        if 'placed' in action and 'Observer Ward' in action:
-            event['key_action'] = 'placed'
-        elif 'activated' in action:
-            event['key_action'] = 'smoke'
-        elif 'destroyed' in action and 'Observer Ward' in action:
-            event['key_action'] = 'destroyed'
-        else:
-            continue
+# the map is loaded once per render worker
+_worker = {}
 
-        if event['key_action'] != None:
-            pos_span = data_div.find('span', class_='minimap-tooltip')
-            who_span = data_div.find('a', class_='color-faction-radiant')
-            if who_span:
-                event['side'] = 'Radiant'
-            else:
-                event['side'] = 'Dire'
-
-            if pos_span:
-                map_item = pos_span.find('span', class_='map-item')
-                if map_item and 'style' in map_item.attrs:
-                    style = map_item['style']
-                    # Extract left and top percentages from style
-
-                    event['hero'] = event['action'].split(' ')[0]
-                    left_str = style.split('left:')[1].split('%')[0].strip()
-                    top_str = style.split('top:')[1].split('%')[0].strip()
-                    event['position'] = {
-                        'left_percent': float(left_str),
-                        'top_percent': float(top_str)
-                    }
-                    
-                else:
-                    continue
-            else:
-                continue
 
-            # Do something with placed events
-        events.append(event)
-        # print('event idx:', idx, event_div)
-
-        position = event['position']
-    
-        left = position['left_percent']
-        top = position['top_percent']
-        left = left * 0.01 * map_width
-        top = top * 0.01 * map_height
-        event['position_px'] = (int(left), int(top))
-        
-        # cv2.circle(dota_map, event['position_px'], 10, (0, 0, 255), -1)
-        # event['position_px'] = (int(left)-10, int(top)-15)
-        # cv2.putText(dota_map, event['time'], event['position_px'], cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-        # cv2.imshow('dota_map', dota_map)
-        # cv2.waitKey(0)
-    
-    # print(events)
-    return events
+def _init_worker(map_path, params=()):
+    _worker['dota_map'] = cv2.imread(map_path)
+    _worker['params'] = params
+
+
+def phase_key(map_key, games_events, event_names, title, title_scale):
+    # everything render_phase draws, to skip phase images that did not change
+    drawn = [[(event['position_px'], event['time'], event['hero']) for event in game_event] for game_event in games_events]
+    return fingerprint(map_key, drawn, event_names[:len(games_events)], title, title_scale)
+
+
+def render_phase(games_events, event_names, title, title_scale):
+    """
+    Draw one phase image: the events of every game in its color, then the game names and the title.
+    """
+    vis_map = _worker['dota_map'].copy()
+    for game_idx, game_event in enumerate(games_events):
+        for event in game_event:
+            cv2.circle(vis_map, event['position_px'], 10, GAME_COLOR[game_idx], -1)
+            text_pos = (int(event['position_px'][0])-10, int(event['position_px'][1])-15)
+            cv2.putText(vis_map, event['time'] + f'({event["hero"]})', text_pos, cv2.FONT_HERSHEY_SIMPLEX, 1, GAME_COLOR[game_idx], 2)
+
+        # add the game name, game color to the map
+        cv2.putText(vis_map, f'{event_names[game_idx]}', (vis_map.shape[1] - 300, game_idx * 30 + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, GAME_COLOR[game_idx], 2)
+
+    cv2.putText(vis_map, f'{title}', (30, 50), cv2.FONT_HERSHEY_SIMPLEX, title_scale, (0, 0, 200), 2)
+    cv2.putText(vis_map, 'Made by SPACE', (50, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 200), 2)
+    return vis_map
+
+
+def render_phase_file(games_events, event_names, title, title_scale, out_path):
+    # render processes encode their own images
+    return write_image(out_path, render_phase(games_events, event_names, title, title_scale), _worker['params'])
+
 
 if __name__ == "__main__":
     argparse = argparse.ArgumentParser()
     argparse.add_argument('--team', type=str, default='falcon', choices=['falcon', 'pari'])
+    argparse.add_argument('--vis-phases', type=int_list, default='0,6,12,20,40,100', help='ward phase boundaries in minutes, the first phase is before the first value')
+    argparse.add_argument('--smoke-phases', type=int_list, default='20,40', help='smoke phase boundaries in minutes, from 0 to the first value and after the last')
+    argparse.add_argument('--jobs', type=int, default=0, help='number of render processes, 0 means one per cpu')
+    argparse.add_argument('--image-format', type=str, default='jpg', choices=IMAGE_FORMATS, help='format of the phase images')
+    argparse.add_argument('--quality', type=int, default=None, help='jpg quality 0-100 (default 95), webp quality 1-100 (default 90, 101 is lossless) or png compression level 0-9')
+    argparse.add_argument('--encode-jobs', type=int, default=DEFAULT_ENCODE_JOBS, help='with --jobs 1: threads encoding images in the background')
+    argparse.add_argument('--force', action='store_true', help='render every phase image, also those whose games did not change since the last run')
+    add_filter_args(argparse)
     args = argparse.parse_args()
     game_name = args.team
     assert game_name in ['falcon', 'pari']
@@ -123,183 +158,97 @@ if __name__ == "__main__":
 
     out_dir = Path(f'output_{game_name}_{"only_falcon_xg" if only_falcon_xg else "all"}')
     out_dir.mkdir(exist_ok=True)
+    writer = ImageWriter(out_dir, fmt=args.image_format, quality=args.quality, jobs=args.encode_jobs, force=args.force)
+    map_key = fingerprint(dota_map)
 
     sides = ['Dire', 'Radiant']
-    vis_time_slots = [0, 6, 12, 20, 40, 100]
-    smoke_time_slots = [20]
-    game_color = [
-        (0, 0, 255),
-        (0, 255, 0),
-        (255, 0, 0),
-        (255, 255, 0),
-        (255, 0, 255),
-        (0, 255, 255),
-        (0, 128, 255),
-        (128, 0, 255),
-        (128, 128, 255),
-        (128, 255, 0),
-        (255, 128, 0),
-        (255, 128, 128),
-        (255, 0, 128),
-        (128, 0, 128),
-        (128, 128, 128),
-        (128, 255, 255),
-        (255, 128, 255),
-        (255, 255, 128),
-        (255, 255, 255),
-    ]
+    if game_name == 'falcon':
+        team_title = 'Falcon'
+    elif game_name == 'pari':
+        team_title = 'Pari'
+    else:
+        raise ValueError(f'Invalid game name: {game_name}')
+    phase_edges_by_action = {
+        'placed': phase_edges(args.vis_phases, before_first=True),
+        'smoke': phase_edges([0] + args.smoke_phases, before_first=False, after_last=True),
+    }
+
+    # every listed game is parsed once, then each side selects its games through the store
+    side_column = f'{team_title} 天辉/夜魇'
+    games = []
+    for row in df.to_dict('records'):
+        side = row[side_column]
+        if side not in sides:
+            continue
+        game_id = row['比赛id']
+        if only_falcon_xg and game_id not in [8447554972, 8447613945, 8447703577]:
+            continue
+
+        data_html_path = Path(f'data_{game_name}') / f'Match {game_id} - Vision - DOTABUFF - Dota 2 Stats.html'
+        page = extract_file(data_html_path, map_width, map_height)
+        other_side = 'dire' if side == 'Radiant' else 'radiant'
+        games.append({
+            'game_id': game_id,
+            'side': side.lower(),
+            'game_time': page['game_time'],
+            'hero_players': page['hero_players'][side.lower()],
+            'hero_players_against': page['hero_players'][other_side],
+            'name': row['场次'],
+            'events': history_events(page),
+        })
+    store = GameStore(games).subset(**filters_from_args(args))
+    print('selected game num:', len(store))
+
+    tasks = []
     for side in sides:
-        # if side != 'Radiant':
-            # continue
         events_summary = []
         event_names = []
-        for i in range(0, game_num):
-            if game_name == 'falcon':
-                str_name = 'Falcon 天辉/夜魇'
-            elif game_name == 'pari':
-                str_name = 'Pari 天辉/夜魇'
-            else:
-                raise ValueError(f'Invalid game name: {game_name}')
-            game_side = df.iloc[i][str_name]
-            if game_side != side:
-                continue
-            game_id = df.iloc[i]['比赛id']
-            if only_falcon_xg and game_id not in [8447554972, 8447613945, 8447703577]:
-                continue
-
-            data_html_path = Path(f'data_{game_name}') / f'Match {game_id} - Vision - DOTABUFF - Dota 2 Stats.html'
-            events = parse_events(data_html_path, map_width, map_height)
-            events_summary.append(events)
-            event_names.append(df.iloc[i]['场次'])
+        for game in store.select(side=side.lower()):
+            events = game['events']
+            # several heroes activating the same smoke show up as separate events, draw each cluster once
+            events_summary.append(first_in_clusters(events, cluster_records(events, HISTORY_CLUSTER_PARAMS)))
+            event_names.append(game['name'])
             # convert events to csv
             events_df = pd.DataFrame(events)
-            events_df.to_csv(out_dir / f'{side}_{game_id}.csv', index=False)
-            print(f'{side}_{game_id}.csv saved')
-
-        if True:
-            for time_idx, vis_time_slot in enumerate(vis_time_slots):
-
-                print(f'time_idx: {time_idx}, vis_time_slot: {vis_time_slot}')
-                vis_map = dota_map.copy()
-                for game_idx, game_event in enumerate(events_summary):
-                    if game_idx >= len(game_color):
-                        break
-
-                    for event in game_event:
-                        if event['key_action'] != 'placed':
-                            continue
-                        if time_idx == 0:
-                            if event['time'][0] != '-':
-                                continue
-                        else:
-                            
-                            if event['time'][0] == '-':
-                                continue
-                            prev_time = to_timedelta(f'{vis_time_slots[time_idx - 1]}:00')
-                            cur_time = to_timedelta(f'{vis_time_slots[time_idx]}:00')
-                            event_time = to_timedelta(f'{event["time"]}')
-                            if event_time < prev_time or event_time >= cur_time:
-                                continue
-                        
-                        if event['side'] != side:
-                            continue
-
-                        cv2.circle(vis_map, event['position_px'], 10, game_color[game_idx], -1)
-                        text_pos = (int(event['position_px'][0])-10, int(event['position_px'][1])-15)
-                        cv2.putText(vis_map, event['time'] + f'({event["hero"]})', text_pos, cv2.FONT_HERSHEY_SIMPLEX, 1, game_color[game_idx], 2)
-                        
-                    # add the game name, game color to the map
-                    cv2.putText(vis_map, f'{event_names[game_idx]}', (vis_map.shape[1] - 300, game_idx * 30 + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, game_color[game_idx], 2)
-
-                if game_name == 'falcon':
-                    title = 'Falcon'
-                elif game_name == 'pari':
-                    title = 'Pari'
-                
-                if side == 'Radiant':
-                    title += ' Radiant'
-                else:
-                    title += ' Dire'
-                if vis_time_slot == 0:
-                    title += ' <0 min'
-                elif vis_time_slot == 6:
-                    title += ' 0-6 min'
-                elif vis_time_slot == 12:
-                    title += ' 6-12 min'
-                elif vis_time_slot == 20:
-                    title += ' 12-20 min'
-                elif vis_time_slot == 40:
-                    title += ' 20-40 min'
-                elif vis_time_slot == 100:
-                    title += ' 40-100 min'
-                cv2.putText(vis_map, f'{title}', (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 200), 2)
-                cv2.putText(vis_map, 'Made by SPACE', (50, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 200), 2)
-                cv2.imwrite(str(out_dir / f'{side}_before_{vis_time_slot}_minutes.jpg'), vis_map)
-                print(f'{side}_{vis_time_slot}.jpg saved')
-                
-                
-        if True:
-            for time_idx in range(3):
-
-                print(f'time_idx: {time_idx}')
-                vis_map = dota_map.copy()
-                for game_idx, game_event in enumerate(events_summary):
-                    if game_idx >= len(game_color):
-                        break
-
-                    last_smoke_time = None
-                    for event in game_event:
-                        if event['key_action'] != 'smoke':
-                            continue
-                        
-                        if event["time"][0] == '-':
-                            continue
-
-                        pd_time = to_timedelta('20:00')
-                        pd2_time = to_timedelta('40:00')
-                        event_time = to_timedelta(f'{event["time"]}')
-                        if last_smoke_time is not None and event_time - last_smoke_time < to_timedelta('01:00'):
-                            continue
-
-                        if time_idx == 0 and (event_time >= pd_time):
-                            continue
-                        elif time_idx == 1 and (event_time < pd_time or event_time >= pd2_time):
-                            continue
-                        elif time_idx == 2 and (event_time < pd2_time):
-                            continue
-
-                        if event['side'] != side:
-                            continue
-
-                        last_smoke_time = event_time
-
-                        cv2.circle(vis_map, event['position_px'], 10, game_color[game_idx], -1)
-                        text_pos = (int(event['position_px'][0])-10, int(event['position_px'][1])-15)
-                        cv2.putText(vis_map, event['time'] + f'({event["hero"]})', text_pos, cv2.FONT_HERSHEY_SIMPLEX, 1, game_color[game_idx], 2)
-                        
-                    # add the game name, game color to the map
-                    cv2.putText(vis_map, f'{event_names[game_idx]}', (vis_map.shape[1] - 300, game_idx * 30 + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, game_color[game_idx], 2)
-
-                if game_name == 'falcon':
-                    title = 'Falcon'
-                elif game_name == 'pari':
-                    title = 'Pari'
-                else:
-                    raise ValueError(f'Invalid game name: {game_name}')
-
-                if side == 'Radiant':
-                    title += 'Smoke-Radiant'
-                else:
-                    title += 'Smoke-Dire'
-                if time_idx == 0:
-                    title += ' <20 min'
-                elif time_idx == 1:
-                    title += ' 20-40 min'
-                elif time_idx == 2:
-                    title += ' 40-end min'
-
-                cv2.putText(vis_map, f'{title}', (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (0, 0, 200), 2)
-                cv2.putText(vis_map, 'Made by SPACE', (50, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 200), 2)
-                cv2.imwrite(str(out_dir / f'{title}.jpg'), vis_map)
-                print(f'{title}.jpg saved')
-                
\ No newline at end of file
+            events_df.to_csv(out_dir / f'{side}_{game["game_id"]}.csv', index=False)
+            print(f'{side}_{game["game_id"]}.csv saved')
+
+        # only the first games get a color
+        events_summary = events_summary[:len(GAME_COLOR)]
+        event_names = event_names[:len(GAME_COLOR)]
+
+        # every event is bucketed once, each phase image only draws its own bucket
+        index = PhaseIndex(events_summary, phase_edges_by_action, side=side)
+        phase_tasks = []
+        for phase in range(index.phase_num('placed')):
+            title = f'{team_title} {side} {index.label("placed", phase)}'
+            out_path = writer.path(out_dir, f'{side}_before_{args.vis_phases[phase]}_minutes')
+            phase_tasks.append((index.games(phase, 'placed'), event_names, title, 1.5, out_path))
+        for phase in range(index.phase_num('smoke')):
+            title = f'{team_title}Smoke-{side} {index.label("smoke", phase)}'
+            out_path = writer.path(out_dir, title)
+            phase_tasks.append((index.games(phase, 'smoke'), event_names, title, 1.3, out_path))
+        for render_args in phase_tasks:
+            key = phase_key(map_key, *render_args[:4])
+            out_path = render_args[4]
+            if writer.unchanged(out_path, key):
+                print(f'{out_path.name} unchanged, skipped')
+                continue
+            tasks.append((render_args[:4], out_path, key))
+
+    # the phase images of both sides are independent of each other
+    jobs = min(resolve_jobs(args.jobs), len(tasks))
+    if jobs <= 1:
+        # encoding runs in the writer threads while the next phase is drawn
+        _init_worker('dota2_map.jpg')
+        for render_args, out_path, key in tasks:
+            writer.write(out_path, render_phase(*render_args), key)
+            print(f'{out_path.name} saved')
+        writer.close()
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=('dota2_map.jpg', encode_params(args.image_format, args.quality))) as executor:
+            paths = executor.map(render_phase_file, *zip(*[render_args + (out_path,) for render_args, out_path, _ in tasks]))
+            for path, (_, _, key) in zip(paths, tasks):
+                writer.record(path, key)
+                print(f'{Path(path).name} saved')
+        writer.save()
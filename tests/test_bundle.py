@@ -0,0 +1,18 @@
+from utils.bundle import build_bundle
+from utils.event_store import summary_to_columns
+
+
+def _ward(time, time_s, x):
+    return {'time': time, 'time_s': time_s, 'key_action': 'placed_observer', 'action': 'placed a Observer Ward',
+            'position': {'left_percent': x / 10, 'top_percent': x / 10}, 'position_px': (x, x)}
+
+
+def test_observer_times_count_shared_wards_once():
+    shared = _ward('01:00', 60, 100)
+    game = {'game_id': '1', 'side': 'dire', 'game_time': '2025-06-01 12:00',
+            'hero_players': {'Mars': 'a', 'Tiny': 'b'}, 'hero_players_against': {},
+            'events': {'Mars': [shared, _ward('02:00', 120, 500)], 'Tiny': [shared]}}
+    bundle = build_bundle(*summary_to_columns([game]))
+    assert bundle['games']['observer_times'] == [[60, 120]]
+    # the events keep one row per (event, hero), like the csv
+    assert len(bundle['events']['time_s']) == 3
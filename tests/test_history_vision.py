@@ -0,0 +1,23 @@
+from archive.history_vision import HISTORY_CLUSTER_PARAMS, history_events
+from utils.cluster import cluster_records, first_in_clusters
+
+
+def _extracted(time_s, kind, side, x, y, hero='Mars'):
+    return {'time': f'{time_s // 60:02d}:{time_s % 60:02d}', 'time_s': time_s, 'kind': kind, 'side': side,
+            'action': f'{hero} {kind}', 'position': {'left_percent': x / 10, 'top_percent': y / 10}, 'position_px': (x, y)}
+
+
+def test_stacked_ward_spots_are_merged():
+    page = {'events': [
+        _extracted(600, 'placed_observer', 'radiant', 300, 300),
+        _extracted(602, 'placed_observer', 'radiant', 305, 300, hero='Tiny'),
+        _extracted(603, 'placed_observer', 'radiant', 600, 600),
+        _extracted(700, 'smoke', 'radiant', 300, 300),
+        _extracted(710, 'smoke', 'radiant', 320, 300, hero='Tiny'),
+    ]}
+    events = history_events(page)
+    assert [event['key_action'] for event in events] == ['placed', 'placed', 'placed', 'smoke', 'smoke']
+
+    first = first_in_clusters(events, cluster_records(events, HISTORY_CLUSTER_PARAMS))
+    assert [(event['key_action'], event['position_px']) for event in first] == [
+        ('placed', (300, 300)), ('placed', (600, 600)), ('smoke', (300, 300))]
@@ -0,0 +1,27 @@
+from utils.spatial_index import SpatialIndex
+
+
+def _event(time, key_action, x, y):
+    return {'time': time, 'key_action': key_action, 'action': key_action,
+            'position': {'left_percent': x / 10, 'top_percent': y / 10}, 'position_px': (x, y)}
+
+
+def _game(game_id, events):
+    return {'game_id': str(game_id), 'side': 'dire', 'game_time': '2025-06-01 12:00',
+            'hero_players': {hero: f'p_{hero}' for hero in events}, 'hero_players_against': {},
+            'events': events}
+
+
+def test_hero_filter_keeps_events_shared_as_second_hero():
+    smoke = _event('12:00', 'smoke', 100, 100)
+    ward = _event('13:00', 'placed_observer', 110, 100)
+    index = SpatialIndex.from_summary([_game(1, {'Mars': [smoke, ward], 'Tiny': [smoke]})])
+
+    for hero in ('Mars', 'Tiny'):
+        records = index.records(index.query_radius(100, 100, 20, hero=hero, kind='smoke'))
+        assert [(r['hero'], r['time']) for r in records] == [(hero, '12:00')]
+    assert len(index.query_rect(90, 90, 120, 110, hero='Tiny')) == 1
+
+    # without a hero filter the shared smoke is returned once
+    assert [r['key_action'] for r in index.records(index.query_radius(100, 100, 20))] == ['smoke', 'placed_observer']
+    assert len(SpatialIndex.from_summary([_game(1, {'Mars': [smoke], 'Tiny': [smoke]})], unique=False).query_radius(100, 100, 20)) == 2
@@ -0,0 +1,202 @@
+"""
+Benchmark suite for the ingest-and-render pipeline on synthetic corpora.
+
+The startup time of ``vision_smoke_moving.py`` and each of its commands is
+measured first (``--help``: interpreter start, imports, argument parsing).
+For every corpus size a deterministic set of pages is generated with
+utils/synth.py, then each stage is timed (best of --repeat runs): reading the
+files, parsing with each backend, writing events_summary.csv, writing and
+loading the event store, accumulating heatmaps and rendering both sides.
+Every timing is appended as one JSON line to the results file together with
+the current commit, and compared against the latest earlier run with the same
+parameters, so a regression between two commits shows up as a ratio > 1.
+
+    python -m utils.benchmark --sizes 10,100,500 --events 150
+    python -m utils.benchmark --sizes 50 --parsers fast,bs4 --output benchmark_results.jsonl
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import cv2
+import pandas as pd
+
+from utils.event_store import load_event_store, write_event_store
+from utils.heatmap import HeatmapAccumulator
+from utils.ingest import make_row, parse_file
+from utils.render import GAME_COLORS, LayerCache, render_side
+from utils.sweep import int_list
+from utils.synth import write_corpus
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def best_of(func, repeat):
+    """
+    Returns (best seconds, result of the last call).
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_corpus(paths, dota_map, key_player, parsers, repeat, work_dir):
+    """
+    Time every stage on one corpus, returns [(stage, seconds)].
+    """
+    map_height, map_width, _ = dota_map.shape
+    timings = []
+
+    seconds, _ = best_of(lambda: [p.read_bytes() for p in paths], repeat)
+    timings.append(('read', seconds))
+
+    events_summary = None
+    for parser in parsers:
+        seconds, rows = best_of(lambda: [make_row(p, parse_file(p, map_width, map_height, key_player, parser)) for p in paths], repeat)
+        timings.append((f'parse[{parser}]', seconds))
+        events_summary = events_summary or rows
+
+    csv_path = work_dir / 'events_summary.csv'
+    seconds, _ = best_of(lambda: pd.DataFrame(events_summary).to_csv(csv_path, index=False, lineterminator='\n'), repeat)
+    timings.append(('write_csv', seconds))
+
+    store_dir = work_dir / 'event_store'
+    seconds, _ = best_of(lambda: write_event_store(events_summary, store_dir), repeat)
+    timings.append(('write_store', seconds))
+    seconds, _ = best_of(lambda: load_event_store(store_dir), repeat)
+    timings.append(('load_store', seconds))
+
+    def heatmap():
+        acc = HeatmapAccumulator(map_width, map_height)
+        acc.add_summary(events_summary)
+        return acc
+    seconds, _ = best_of(heatmap, repeat)
+    timings.append(('heatmap', seconds))
+
+    # a fresh layer cache every time, so every game layer is drawn
+    for top_n in sorted({5, len(GAME_COLORS)}):
+        seconds, _ = best_of(lambda: [render_side(dota_map, events_summary, side, 2, top_n, 'bench', LayerCache())
+                                      for side in ('dire', 'radiant')], repeat)
+        timings.append((f'render[top{top_n}]', seconds))
+
+    seconds, _ = best_of(lambda: cv2.imwrite(str(work_dir / 'render.jpg'), dota_map), repeat)
+    timings.append(('imwrite', seconds))
+    return timings
+
+
+def bench_startup(script, repeat):
+    """
+    Time `python <script> [command] --help` for every command, i.e. interpreter
+    start, imports and argument parsing. Returns [(stage, seconds)].
+    """
+    timings = []
+    for command in ('', 'ingest', 'render', 'export'):
+        argv = [sys.executable, str(script)] + ([command] if command else []) + ['--help']
+        seconds, _ = best_of(lambda: subprocess.run(argv, capture_output=True, check=True), repeat)
+        timings.append((f'startup[{command or "all"}]', seconds))
+    return timings
+
+
+def load_results(path):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_seconds(results, record):
+    """
+    seconds of the latest earlier run with the same stage and corpus parameters, or None.
+    """
+    fields = ('stage', 'games', 'events_per_game', 'heroes_per_side')
+    for old in reversed(results):
+        if old['run'] != record['run'] and all(old.get(k) == record[k] for k in fields):
+            return old['seconds']
+    return None
+
+
+def run_benchmark(sizes, events_per_game=120, heroes_per_side=5, parsers=('fast',), repeat=3, map_path='dota2_map.jpg',
+                  output='benchmark_results.jsonl', key_player='YB.BoBoKa', seed=0):
+    dota_map = cv2.imread(str(map_path))
+    if dota_map is None:
+        raise FileNotFoundError(map_path)
+
+    previous = load_results(output)
+    run = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    commit = git_commit()
+    records = []
+    for stage, seconds in bench_startup(Path(__file__).resolve().parent.parent / 'vision_smoke_moving.py', repeat):
+        records.append({
+            'run': run,
+            'commit': commit,
+            'python': platform.python_version(),
+            'stage': stage,
+            'games': 0,
+            'events_per_game': events_per_game,
+            'heroes_per_side': heroes_per_side,
+            'seconds': round(seconds, 6),
+            'ms_per_game': None,
+        })
+    with tempfile.TemporaryDirectory(prefix='vision_bench_') as tmp:
+        for games in sizes:
+            work_dir = Path(tmp) / f'games_{games}'
+            paths = write_corpus(work_dir / 'data', games, events_per_game, heroes_per_side, key_player, seed)
+            for stage, seconds in bench_corpus(paths, dota_map, key_player, parsers, repeat, work_dir):
+                records.append({
+                    'run': run,
+                    'commit': commit,
+                    'python': platform.python_version(),
+                    'stage': stage,
+                    'games': games,
+                    'events_per_game': events_per_game,
+                    'heroes_per_side': heroes_per_side,
+                    'seconds': round(seconds, 6),
+                    'ms_per_game': round(seconds * 1000 / games, 4),
+                })
+
+    with open(output, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+    print(f'{"stage":<16}{"games":>7}{"seconds":>10}{"ms/game":>10}{"vs prev":>9}')
+    for record in records:
+        old = previous_seconds(previous, record)
+        ratio = f'{record["seconds"] / old:.2f}x' if old else '-'
+        ms_per_game = f'{record["ms_per_game"]:.3f}' if record['ms_per_game'] is not None else '-'
+        print(f'{record["stage"]:<16}{record["games"]:>7}{record["seconds"]:>10.4f}{ms_per_game:>10}{ratio:>9}')
+    print(f'{len(records)} results of {commit} appended to {output}')
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='time parsing, serialization and rendering on synthetic corpora')
+    parser.add_argument('--sizes', type=int_list, default='10,100,500', help='corpus sizes in games, e.g. 10,100,1000')
+    parser.add_argument('--events', type=int, default=120, help='match log events per game')
+    parser.add_argument('--heroes', type=int, default=5, help='heroes per side')
+    parser.add_argument('--parsers', type=str, default='fast', help='comma separated parser backends, e.g. fast,bs4')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--map', type=str, default='dota2_map.jpg')
+    parser.add_argument('--output', type=str, default='benchmark_results.jsonl')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.events, args.heroes, args.parsers.split(','), args.repeat, args.map, args.output, seed=args.seed)
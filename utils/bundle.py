@@ -0,0 +1,147 @@
+"""
+Pre-indexed JSON bundle of parsed games for the web visualizer.
+
+``events_summary.csv`` stores every game's events as a Python repr, which the
+browser has to split, rewrite into JSON and re-parse, and it converts every
+``mm:ss`` string back to seconds on each redraw. The bundle is plain JSON
+(optionally gzipped) with the events as columns, one row per (event, hero)
+like the CSV:
+
+    games         game_id, side, game_time, hero_players, hero_players_against,
+                  event_offsets (events of game i are rows offsets[i]:offsets[i + 1],
+                  in time order) and observer_times (seconds of the game's
+                  observer wards, each counted once, so the Nth ward
+                  cutoff is a lookup)
+    side_games    radiant / dire -> game indexes, in summary order
+    events        hero, time (codes into ``heroes`` / ``times``), time_s, kind
+                  (index into ``kinds``), ward_cnt, left_percent, top_percent
+                  and cluster_id (see utils/cluster.py)
+
+so the page only touches the rows of the games it draws.
+"""
+import argparse
+import gzip
+import json
+from pathlib import Path
+
+import numpy as np
+
+from utils.event_store import KINDS, SIDES, load_event_store, summary_to_columns, unique_event_mask
+
+
+BUNDLE_FORMAT = 'ti14-vision-bundle'
+BUNDLE_VERSION = 1
+# games turned into columns at a time when a bundle is written from a stream of games
+DEFAULT_CHUNK_SIZE = 256
+
+
+def _codes(values):
+    vocab, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return codes.tolist(), vocab.tolist()
+
+
+def build_bundle(games, events):
+    """
+    Bundle dict from event store columns (``summary_to_columns`` / ``load_event_store``).
+    """
+    game_ids = games['game_id'].tolist()
+    game_index = {game_id: i for i, game_id in enumerate(game_ids)}
+    row_game = np.array([game_index[g] for g in events['game_id'].tolist()], dtype=np.int64)
+    # by game in summary order, then time; stable so heroes keep their order within a second
+    order = np.lexsort((events['time_s'], row_game))
+    row_game = row_game[order]
+    offsets = np.searchsorted(row_game, np.arange(len(game_ids) + 1)).tolist()
+
+    time_s = events['time_s'][order]
+    kind = events['kind'][order]
+    # a ward credited to several heroes is one ward
+    observer = (kind == KINDS.index('placed_observer')) & unique_event_mask(events)[order]
+    heroes, hero_vocab = _codes(events['hero'][order])
+    times, time_vocab = _codes(events['time'][order])
+
+    return {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'kinds': list(KINDS),
+        'heroes': hero_vocab,
+        'times': time_vocab,
+        'games': {
+            'game_id': [str(g) for g in game_ids],
+            'side': [SIDES[s] for s in games['side'].tolist()],
+            'game_time': games['game_time'].tolist(),
+            'hero_players': [json.loads(p) for p in games['hero_players'].tolist()],
+            'hero_players_against': [json.loads(p) for p in games['hero_players_against'].tolist()],
+            'event_offsets': offsets,
+            'observer_times': [time_s[start:end][observer[start:end]].tolist() for start, end in zip(offsets, offsets[1:])],
+        },
+        'side_games': {side: [i for i, s in enumerate(games['side'].tolist()) if s == k] for k, side in enumerate(SIDES)},
+        'events': {
+            'hero': heroes,
+            'time': times,
+            'time_s': time_s.tolist(),
+            'kind': kind.tolist(),
+            'ward_cnt': events['ward_cnt'][order].tolist(),
+            'left_percent': events['left_percent'][order].tolist(),
+            'top_percent': events['top_percent'][order].tolist(),
+            'cluster_id': events['cluster_id'][order].tolist(),
+        },
+    }
+
+
+def stream_columns(events_summary, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    ``summary_to_columns`` of an iterable of games, read chunk_size games at a
+    time, so only the columns of the whole stream are held in memory.
+    """
+    parts = []
+    chunk = []
+    for game in events_summary:
+        chunk.append(game)
+        if len(chunk) == chunk_size:
+            parts.append(summary_to_columns(chunk))
+            chunk = []
+    if chunk or not parts:
+        parts.append(summary_to_columns(chunk))
+    if len(parts) == 1:
+        return parts[0]
+    return tuple({name: np.concatenate([part[i][name] for part in parts]) for name in parts[0][i]} for i in range(2))
+
+
+def write_bundle(events_summary, path):
+    """
+    Write the bundle of ``events_summary`` (a list or a stream of games),
+    gzipped when path ends in .gz.
+    """
+    return write_bundle_columns(*stream_columns(events_summary), path)
+
+
+def write_bundle_columns(games, events, path):
+    path = Path(path)
+    data = json.dumps(build_bundle(games, events), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    if path.suffix == '.gz':
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            f.write(data)
+    else:
+        tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+    return path
+
+
+def read_bundle(path):
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rb') as f:
+        bundle = json.loads(f.read())
+    if bundle.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f'{path} is not a vision bundle')
+    return bundle
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='export an event store as a JSON bundle for the web visualizer')
+    parser.add_argument('store', type=str, help='event store directory written with --format store')
+    parser.add_argument('output', type=str, help='bundle path, .json or .json.gz')
+    args = parser.parse_args()
+    path = write_bundle_columns(*load_event_store(args.store), args.output)
+    print(f'{path} saved ({path.stat().st_size / 1024:.0f} KB)')
@@ -0,0 +1,98 @@
+"""
+Streaming spatio-temporal clustering of vision events.
+
+The match log lists one line per hero action, so one team smoke can show up
+as several smoke events a few seconds apart, and a ward spot can be logged
+more than once. Events of the same game, side and kind are streamed in time
+order; an event joins the open cluster whose first event is less than
+``window_s`` seconds older and at most ``radius_px`` pixels away, otherwise
+it opens a new cluster. Clusters older than the window are closed as the
+stream advances, so the pass is linear in the number of events.
+
+Cluster ids are numbered from 0 within every game, like ``event_idx``, and
+the first event of a cluster stands for the whole logical action.
+"""
+import numpy as np
+
+
+# (window_s, radius_px) per event kind, kinds without an entry are not merged
+DEFAULT_CLUSTER_PARAMS = {
+    'smoke': (60, 150),
+    'placed_observer': (5, 20),
+    'placed_sentry': (5, 20),
+}
+
+
+def cluster_sorted(scope, group, time_s, x, y, window_s, radius_px):
+    """
+    Cluster rows sorted by (scope, group, time_s). window_s / radius_px hold
+    the parameters of every row. Returns int32 cluster ids numbered from 0
+    within each scope (a game); groups (side, kind) never share a cluster.
+    """
+    n = len(time_s)
+    ids = np.empty(n, dtype=np.int32)
+    scope, group, time_s, x, y = (np.asarray(a).tolist() for a in (scope, group, time_s, x, y))
+    window_s = np.broadcast_to(window_s, n).tolist()
+    radius_px = np.broadcast_to(radius_px, n).tolist()
+
+    current_scope = current_group = None
+    next_id = 0
+    # open clusters of the current group, oldest first: [time, x, y, id]
+    active = []
+    for i in range(n):
+        if scope[i] != current_scope:
+            current_scope = scope[i]
+            current_group = None
+            next_id = 0
+        if group[i] != current_group:
+            current_group = group[i]
+            active = []
+
+        t = time_s[i]
+        while active and t - active[0][0] >= window_s[i]:
+            active.pop(0)
+
+        r2 = radius_px[i] * radius_px[i]
+        for cluster in active:
+            dx = x[i] - cluster[1]
+            dy = y[i] - cluster[2]
+            if dx * dx + dy * dy <= r2:
+                ids[i] = cluster[3]
+                break
+        else:
+            ids[i] = next_id
+            if window_s[i] > 0:
+                active.append([t, x[i], y[i], next_id])
+            next_id += 1
+    return ids
+
+
+def cluster_records(records, params=None, kind_key='key_action', side_key='side'):
+    """
+    Cluster ids for a list of event dicts of one game, in list order.
+    """
+    params = DEFAULT_CLUSTER_PARAMS if params is None else params
+    order = sorted(range(len(records)), key=lambda i: (str(records[i][side_key]), records[i][kind_key], records[i]['time_s']))
+    rows = [records[i] for i in order]
+    window_s = [params.get(r[kind_key], (0, 0))[0] for r in rows]
+    radius_px = [params.get(r[kind_key], (0, 0))[1] for r in rows]
+    ids = cluster_sorted(np.zeros(len(rows), dtype=np.int8), [(str(r[side_key]), r[kind_key]) for r in rows],
+                         [r['time_s'] for r in rows], [r['position_px'][0] for r in rows], [r['position_px'][1] for r in rows],
+                         window_s, radius_px) if rows else []
+    out = [0] * len(records)
+    for i, cluster_id in zip(order, ids):
+        out[i] = int(cluster_id)
+    return out
+
+
+def first_in_clusters(records, cluster_ids):
+    """
+    The first event of every cluster, in list order.
+    """
+    seen = set()
+    first = []
+    for record, cluster_id in zip(records, cluster_ids):
+        if cluster_id not in seen:
+            seen.add(cluster_id)
+            first.append(record)
+    return first
@@ -0,0 +1,291 @@
+"""
+Compact struct-of-arrays representation of parsed games.
+
+A parsed game keeps one dict per event (with a nested ``position`` dict, a
+``position_px`` tuple and the time / action strings), which dominates memory
+once thousands of games are held in ``events_summary``. ``CompactGame``
+stores the same information as typed numpy arrays with one entry per event,
+the hero -> events lists as index arrays, and every string (hero, player,
+time, action) as a code into ``InternTables`` shared by all games.
+
+A ``CompactGame`` can be used wherever an ``events_summary`` row is read:
+``game['events']`` is a read-only view that iterates like the original
+``{hero: [event, ...]}`` dict, with lightweight event views instead of
+dicts, and ``summary_to_columns`` reads the arrays directly.
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+from utils.event_store import KINDS, SIDES, WARD_STATUSES
+
+
+class InternTable:
+    """
+    Bidirectional string <-> int code table.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+        self._array = None
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+            self._array = None
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+    def lookup(self, codes):
+        """
+        Object array of the strings for an array of codes.
+        """
+        if self._array is None or len(self._array) != len(self.values):
+            self._array = np.array(self.values, dtype=object)
+        return self._array[codes]
+
+
+class InternTables:
+    """
+    One table per string field, shared by every game of a corpus.
+    """
+
+    def __init__(self):
+        self.hero = InternTable()
+        self.player = InternTable()
+        self.time = InternTable()
+        self.action = InternTable()
+
+
+class EventView(Mapping):
+    """
+    Read-only view of one event, reads like the parser's event dict.
+    """
+    __slots__ = ('game', 'idx')
+
+    def __init__(self, game, idx):
+        self.game = game
+        self.idx = idx
+
+    def _keys(self):
+        if self.game.kind[self.idx] == 0:
+            keys = ('time', 'time_s', 'action', 'key_action', 'observer_ward_cnt', 'position', 'position_px')
+        else:
+            keys = ('time', 'time_s', 'action', 'key_action', 'position', 'position_px')
+        if self.game.ward_status[self.idx]:
+            keys += ('lifetime_s', 'ward_status')
+        return keys
+
+    def __getitem__(self, key):
+        game, i = self.game, self.idx
+        if key == 'time':
+            return game.tables.time[game.time_code[i]]
+        if key == 'time_s':
+            return int(game.time_s[i])
+        if key == 'action':
+            return game.tables.action[game.action_code[i]]
+        if key == 'key_action':
+            return KINDS[game.kind[i]]
+        if key == 'observer_ward_cnt' and game.kind[i] == 0:
+            return int(game.ward_cnt[i])
+        if key == 'position':
+            return {'left_percent': float(game.left_percent[i]), 'top_percent': float(game.top_percent[i])}
+        if key == 'position_px':
+            return (int(game.x_px[i]), int(game.y_px[i]))
+        if game.ward_status[i]:
+            if key == 'lifetime_s':
+                return int(game.lifetime_s[i])
+            if key == 'ward_status':
+                return WARD_STATUSES[game.ward_status[i]]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __eq__(self, other):
+        if isinstance(other, EventView):
+            return self.game is other.game and self.idx == other.idx
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash((id(self.game), self.idx))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class HeroEventsView(Mapping):
+    """
+    {hero: [event, ...]} view over a CompactGame, in the parser's hero order.
+    """
+    __slots__ = ('game',)
+
+    def __init__(self, game):
+        self.game = game
+
+    def __getitem__(self, hero):
+        game = self.game
+        code = game.tables.hero.codes.get(hero)
+        where = np.flatnonzero(game.heroes == code) if code is not None else []
+        if len(where) == 0:
+            raise KeyError(hero)
+        h = int(where[0])
+        return [EventView(game, int(i)) for i in game.hero_event[game.hero_offsets[h]:game.hero_offsets[h + 1]]]
+
+    def __iter__(self):
+        return (self.game.tables.hero[code] for code in self.game.heroes)
+
+    def __len__(self):
+        return len(self.game.heroes)
+
+
+class CompactGame(Mapping):
+    """
+    One ``events_summary`` row as typed arrays, see the module docstring.
+    """
+    __slots__ = ('tables', 'game_id', 'side', 'game_time', 'hero_players', 'hero_players_against',
+                 'time_s', 'kind', 'ward_cnt', 'left_percent', 'top_percent', 'x_px', 'y_px', 'lifetime_s', 'ward_status',
+                 'time_code', 'action_code',
+                 'heroes', 'hero_offsets', 'hero_event')
+
+    FIELDS = ('events', 'hero_players', 'hero_players_against', 'side', 'game_id', 'game_time')
+
+    @classmethod
+    def from_row(cls, row, tables):
+        game = cls()
+        game.tables = tables
+        game.game_id = row['game_id']
+        game.side = row['side']
+        game.game_time = row['game_time']
+        game.hero_players = np.array([(tables.hero.code(h), tables.player.code(p)) for h, p in row['hero_players'].items()], dtype=np.int32).reshape(-1, 2)
+        game.hero_players_against = np.array([(tables.hero.code(h), tables.player.code(p)) for h, p in row['hero_players_against'].items()], dtype=np.int32).reshape(-1, 2)
+
+        # the same event dict is listed under every hero involved, store it once
+        event_ids = {}
+        events = []
+        heroes = []
+        offsets = [0]
+        hero_event = []
+        for hero, hero_events in row['events'].items():
+            heroes.append(tables.hero.code(hero))
+            for event in hero_events:
+                idx = event_ids.get(id(event))
+                if idx is None:
+                    idx = event_ids[id(event)] = len(events)
+                    events.append(event)
+                hero_event.append(idx)
+            offsets.append(len(hero_event))
+
+        game.time_s = np.array([e['time_s'] for e in events], dtype=np.int32)
+        game.kind = np.array([KINDS.index(e['key_action']) for e in events], dtype=np.int8)
+        game.ward_cnt = np.array([e.get('observer_ward_cnt', 0) for e in events], dtype=np.int16)
+        game.left_percent = np.array([e['position']['left_percent'] for e in events], dtype=np.float64)
+        game.top_percent = np.array([e['position']['top_percent'] for e in events], dtype=np.float64)
+        game.x_px = np.array([e['position_px'][0] for e in events], dtype=np.int32)
+        game.y_px = np.array([e['position_px'][1] for e in events], dtype=np.int32)
+        game.lifetime_s = np.array([e.get('lifetime_s', 0) for e in events], dtype=np.int32)
+        game.ward_status = np.array([WARD_STATUSES.index(e.get('ward_status', '')) for e in events], dtype=np.int8)
+        game.time_code = np.array([tables.time.code(e['time']) for e in events], dtype=np.int32)
+        game.action_code = np.array([tables.action.code(e['action']) for e in events], dtype=np.int32)
+        game.heroes = np.array(heroes, dtype=np.int32)
+        game.hero_offsets = np.array(offsets, dtype=np.int32)
+        game.hero_event = np.array(hero_event, dtype=np.int32)
+        return game
+
+    def _players(self, pairs):
+        return {self.tables.hero[h]: self.tables.player[p] for h, p in pairs.tolist()}
+
+    def __getitem__(self, key):
+        if key == 'events':
+            return HeroEventsView(self)
+        if key == 'hero_players':
+            return self._players(self.hero_players)
+        if key == 'hero_players_against':
+            return self._players(self.hero_players_against)
+        if key in ('side', 'game_id', 'game_time'):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__ if isinstance(getattr(self, name, None), np.ndarray))
+
+    def event_columns(self):
+        """
+        Event store columns of this game, one row per (event, hero) in hero order,
+        same as ``summary_to_columns`` builds them from dicts.
+        """
+        rows = self.hero_event
+        hero_of_row = np.repeat(self.heroes, np.diff(self.hero_offsets))
+        players = dict(self.hero_players.tolist())
+        player_of_row = np.array([players.get(h, -1) for h in hero_of_row.tolist()], dtype=np.int64)
+        n = len(rows)
+        return {
+            'game_id': np.full(n, int(self.game_id), dtype=np.int64),
+            'side': np.full(n, SIDES.index(self.side), dtype=np.int8),
+            'hero': self.tables.hero.lookup(hero_of_row),
+            'player': np.array([self.tables.player[p] if p >= 0 else '' for p in player_of_row.tolist()], dtype=object),
+            'time_s': self.time_s[rows],
+            'kind': self.kind[rows],
+            'ward_cnt': self.ward_cnt[rows],
+            'left_percent': self.left_percent[rows],
+            'top_percent': self.top_percent[rows],
+            'x_px': self.x_px[rows],
+            'y_px': self.y_px[rows],
+            'lifetime_s': self.lifetime_s[rows],
+            'ward_status': self.ward_status[rows],
+            'event_idx': rows.copy(),
+            'time': self.tables.time.lookup(self.time_code[rows]),
+            'action': self.tables.action.lookup(self.action_code[rows]),
+        }
+
+    def to_row(self):
+        """
+        Materialize the original ``events_summary`` row, events shared by
+        several heroes are the same dict again.
+        """
+        shared = {}
+        hero_events = {}
+        for hero, events in self['events'].items():
+            hero_events[hero] = [shared.setdefault(event.idx, dict(event)) for event in events]
+        return {
+            'events': hero_events,
+            'hero_players': self['hero_players'],
+            'hero_players_against': self['hero_players_against'],
+            'side': self.side,
+            'game_id': self.game_id,
+            'game_time': self.game_time,
+        }
+
+
+def compact_summary(events_summary, tables=None):
+    """
+    CompactGame for every row, sharing one set of intern tables.
+    """
+    tables = tables or InternTables()
+    return [row if isinstance(row, CompactGame) else CompactGame.from_row(row, tables) for row in events_summary]
+
+
+def summary_rows(events_summary):
+    """
+    Plain dict rows, materializing compact games one at a time.
+    """
+    for row in events_summary:
+        yield row.to_row() if isinstance(row, CompactGame) else row
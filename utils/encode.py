@@ -0,0 +1,207 @@
+"""
+Image encoding of the rendered maps: output format, a background writer pool
+and fingerprints to skip images whose inputs did not change.
+
+Encoding a full size map costs about as much as compositing it, so
+``ImageWriter.write`` hands the image to a small thread pool (cv2 releases
+the GIL while encoding) and the caller goes on rendering the next image. At
+most ``max_pending`` images wait to be encoded, ``write`` blocks beyond that,
+so memory stays bounded however many images a run produces.
+
+Every image is recorded with a fingerprint of its render inputs (selected
+games, the event data drawn, parameters, base map and output format) in
+``<root>/.fingerprints.json``. Callers compute the fingerprint before
+rendering and skip an image whose file exists with the same fingerprint, so
+rerunning a team after one new match only renders and encodes the images
+that match changes:
+
+    writer = ImageWriter(out_dir, fmt='webp')
+    path = writer.path(out_dir, title)
+    key = fingerprint(map_key, title, game_keys)
+    if not writer.unchanged(path, key):
+        writer.write(path, render(...), key)
+    writer.close()
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+
+IMAGE_FORMATS = ('jpg', 'png', 'webp')
+# jpg keeps cv2's own default quality, so default runs write the same bytes as before;
+# for png the value is the zlib compression level (0-9), None leaves cv2's default
+DEFAULT_QUALITY = {'jpg': 95, 'webp': 90, 'png': None}
+# webp above 100 is lossless
+QUALITY_RANGE = {'jpg': (0, 100), 'webp': (1, 101), 'png': (0, 9)}
+DEFAULT_ENCODE_JOBS = 2
+FINGERPRINT_FILE = '.fingerprints.json'
+# bump when the drawing code changes, so the images of earlier runs are redrawn
+RENDER_VERSION = 1
+
+
+def encode_params(fmt='jpg', quality=None):
+    """
+    cv2.imwrite parameters of an output format.
+    """
+    import cv2
+
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f'unknown image format {fmt!r}, expected one of {", ".join(IMAGE_FORMATS)}')
+    quality = DEFAULT_QUALITY[fmt] if quality is None else quality
+    if quality is None:
+        return []
+    low, high = QUALITY_RANGE[fmt]
+    if not low <= quality <= high:
+        raise ValueError(f'{fmt} quality must be between {low} and {high}, got {quality}')
+    flag = {'jpg': cv2.IMWRITE_JPEG_QUALITY, 'webp': cv2.IMWRITE_WEBP_QUALITY, 'png': cv2.IMWRITE_PNG_COMPRESSION}[fmt]
+    return [flag, int(quality)]
+
+
+def write_image(path, img, params=()):
+    import cv2
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if not cv2.imwrite(str(path), img, list(params)):
+        raise OSError(f'could not write {path}')
+    return path
+
+
+def fingerprint(*parts):
+    """
+    sha1 of the render inputs of one image; arrays are hashed by content,
+    anything else by its repr.
+    """
+    h = hashlib.sha1(f'v{RENDER_VERSION}'.encode('utf-8'))
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(f'|{part.dtype}{part.shape}|'.encode('utf-8'))
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(f'|{part!r}'.encode('utf-8'))
+    return h.hexdigest()
+
+
+class ImageWriter:
+    """
+    Encodes images in background threads and keeps the fingerprints of the
+    images written below root.
+    """
+
+    def __init__(self, root, fmt='jpg', quality=None, jobs=DEFAULT_ENCODE_JOBS, max_pending=None, force=False):
+        self.root = Path(root)
+        self.fmt = fmt
+        self.params = encode_params(fmt, quality)
+        self.force = force
+        # 0 or negative means one thread per cpu
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        self.fingerprints = self._load()
+        self.written = 0
+        self.skipped = 0
+        self._pending = threading.BoundedSemaphore(max_pending or 2 * self.jobs)
+        self._lock = threading.Lock()
+        self._futures = []
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _load(self):
+        try:
+            with open(self.root / FINGERPRINT_FILE, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _name(self, path):
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def _key(self, key):
+        # the same inputs in another format or quality are another image
+        return fingerprint(key, self.fmt, self.params)
+
+    def path(self, out_dir, name):
+        return Path(out_dir) / f'{name}.{self.fmt}'
+
+    def unchanged(self, path, key):
+        """
+        True (and counted as skipped) if path exists and was written from the same inputs.
+        """
+        if self.force or self.fingerprints.get(self._name(path)) != self._key(key) or not Path(path).exists():
+            return False
+        self.skipped += 1
+        return True
+
+    def record(self, path, key):
+        # for images encoded elsewhere, e.g. by a render process
+        with self._lock:
+            self.fingerprints[self._name(path)] = self._key(key)
+            self.written += 1
+
+    def _encode(self, path, img, key):
+        write_image(path, img, self.params)
+        if key is not None:
+            self.record(path, key)
+        else:
+            with self._lock:
+                self.written += 1
+        return path
+
+    def write(self, path, img, key=None):
+        """
+        Queue img for encoding to path, blocks while max_pending images are queued.
+        """
+        # a file that is being replaced has no valid fingerprint until it is written
+        with self._lock:
+            self.fingerprints.pop(self._name(path), None)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.jobs)
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(self._encode, path, img, key)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        self._futures.append(future)
+        return future
+
+    def flush(self):
+        """
+        Wait for the queued images and save the fingerprints, returns the written paths.
+        """
+        futures, self._futures = self._futures, []
+        paths = []
+        error = None
+        for future in futures:
+            try:
+                paths.append(future.result())
+            except Exception as e:
+                error = error or e
+        self.save()
+        if error is not None:
+            raise error
+        return paths
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f'{FINGERPRINT_FILE}.tmp'
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.fingerprints, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.root / FINGERPRINT_FILE)
+
+    def close(self):
+        try:
+            return self.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
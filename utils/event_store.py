@@ -0,0 +1,328 @@
+"""
+Columnar event store, a long-format alternative to ``events_summary.csv``.
+
+One row per (event, hero) with the columns
+
+    game_id, side, hero, player, time_s, kind, ward_cnt,
+    left_percent, top_percent, x_px, y_px, lifetime_s, ward_status
+
+plus ``event_idx`` (rows of the same event share it), ``cluster_id`` (events
+merged into one logical action, see utils/cluster.py) and the original
+``time`` / ``action`` text. String columns are dictionary encoded
+(``<name>`` holds int32 codes into ``<name>_vocab``). Game metadata lives in a
+separate table with one row per game.
+
+Each write produces one compressed ``part-XXXXX.npz`` file holding both
+tables, so new games can be added without rewriting earlier parts. When a
+game id shows up in several parts the latest part wins.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+from utils.cluster import DEFAULT_CLUSTER_PARAMS, cluster_sorted
+from utils.timeline import time_window_mask, to_seconds
+
+
+SIDES = ('radiant', 'dire')
+KINDS = ('placed_observer', 'smoke', 'placed_sentry')
+# status of a placed ward (see utils/lifetimes.py), '' for smokes and unpaired wards
+WARD_STATUSES = ('', 'dewarded', 'expired', 'alive')
+
+EVENT_COLUMNS = ('game_id', 'side', 'hero', 'player', 'time_s', 'kind', 'ward_cnt',
+                 'left_percent', 'top_percent', 'x_px', 'y_px', 'lifetime_s', 'ward_status',
+                 'event_idx', 'cluster_id', 'time', 'action')
+STRING_COLUMNS = ('hero', 'player', 'time', 'action')
+EVENT_DTYPES = {
+    'game_id': np.int64,
+    'side': np.int8,
+    'time_s': np.int32,
+    'kind': np.int8,
+    'ward_cnt': np.int16,
+    'left_percent': np.float64,
+    'top_percent': np.float64,
+    'x_px': np.int32,
+    'y_px': np.int32,
+    'lifetime_s': np.int32,
+    'ward_status': np.int8,
+    'event_idx': np.int32,
+}
+GAME_COLUMNS = ('game_id', 'side', 'game_time', 'hero_players', 'hero_players_against')
+
+
+def _encode(values):
+    vocab, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return codes.astype(np.int32), vocab
+
+
+def _dict_event_columns(events_summary):
+    rows = {name: [] for name in EVENT_COLUMNS if name != 'cluster_id'}
+    for game in events_summary:
+        game_id = int(game['game_id'])
+        side = SIDES.index(game['side'])
+        event_ids = {}
+        for hero_name, hero_events in game['events'].items():
+            player = game['hero_players'].get(hero_name, '')
+            for event in hero_events:
+                # the same event object is listed under every hero involved
+                event_idx = event_ids.setdefault(id(event), len(event_ids))
+                rows['game_id'].append(game_id)
+                rows['side'].append(side)
+                rows['hero'].append(hero_name)
+                rows['player'].append(player)
+                rows['time_s'].append(event['time_s'] if 'time_s' in event else to_seconds(event['time']))
+                rows['kind'].append(KINDS.index(event['key_action']))
+                rows['ward_cnt'].append(event.get('observer_ward_cnt', 0))
+                rows['left_percent'].append(event['position']['left_percent'])
+                rows['top_percent'].append(event['position']['top_percent'])
+                rows['x_px'].append(event['position_px'][0])
+                rows['y_px'].append(event['position_px'][1])
+                rows['lifetime_s'].append(event.get('lifetime_s', 0))
+                rows['ward_status'].append(WARD_STATUSES.index(event.get('ward_status', '')))
+                rows['event_idx'].append(event_idx)
+                rows['time'].append(event['time'])
+                rows['action'].append(event['action'])
+
+    events = {name: np.array(rows[name], dtype=dtype) for name, dtype in EVENT_DTYPES.items()}
+    for name in STRING_COLUMNS:
+        events[name] = np.array(rows[name], dtype=object)
+    return events
+
+
+def summary_to_columns(events_summary):
+    """
+    Flatten ``events_summary`` rows into (game_columns, event_columns).
+    Rows are ordered by game, then hero, then event time; string columns are
+    object arrays, as returned by ``load_event_store``. Compact games (see
+    utils/compact.py) are read from their arrays without building event dicts.
+    """
+    chunks = []
+    pending = []
+    for game in events_summary:
+        if hasattr(game, 'event_columns'):
+            if pending:
+                chunks.append(_dict_event_columns(pending))
+                pending = []
+            chunks.append(game.event_columns())
+        else:
+            pending.append(game)
+    if pending or not chunks:
+        chunks.append(_dict_event_columns(pending))
+    if len(chunks) == 1:
+        events = chunks[0]
+    else:
+        events = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in EVENT_COLUMNS if name != 'cluster_id'}
+    events['cluster_id'] = cluster_column(events)
+
+    games = {
+        'game_id': np.array([int(game['game_id']) for game in events_summary], dtype=np.int64),
+        'side': np.array([SIDES.index(game['side']) for game in events_summary], dtype=np.int8),
+        'game_time': np.array([game['game_time'] for game in events_summary], dtype=str),
+        'hero_players': np.array([json.dumps(game['hero_players']) for game in events_summary], dtype=str),
+        'hero_players_against': np.array([json.dumps(game['hero_players_against']) for game in events_summary], dtype=str),
+    }
+    return games, events
+
+
+def _part_paths(store_dir):
+    return sorted(Path(store_dir).glob('part-*.npz'))
+
+
+def write_event_store(events_summary, store_dir, append=False):
+    """
+    Write ``events_summary`` as a new part of the store in store_dir.
+    Without append, existing parts are removed first.
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    parts = _part_paths(store_dir)
+    if not append:
+        for part in parts:
+            part.unlink()
+        parts = []
+    next_idx = int(parts[-1].stem.split('-')[1]) + 1 if parts else 0
+
+    games, events = summary_to_columns(events_summary)
+    arrays = {f'games.{k}': v for k, v in games.items()}
+    for k, v in events.items():
+        if k in STRING_COLUMNS:
+            arrays[f'events.{k}'], arrays[f'events.{k}_vocab'] = _encode(v)
+        else:
+            arrays[f'events.{k}'] = v
+    part_path = store_dir / f'part-{next_idx:05d}.npz'
+    tmp_path = store_dir / f'.part-{next_idx:05d}.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    tmp_path.replace(part_path)
+    return part_path
+
+
+def _decode_part(path):
+    with np.load(path) as data:
+        games = {k[len('games.'):]: data[k] for k in data.files if k.startswith('games.')}
+        events = {k[len('events.'):]: data[k] for k in data.files if k.startswith('events.')}
+    if 'cluster_id' not in events:
+        # parts written before clustering
+        events['cluster_id'] = cluster_column(events)
+    if 'ward_status' not in events:
+        # parts written before ward pairing, their wards have no lifetime
+        events['lifetime_s'] = np.zeros(len(events['game_id']), dtype=np.int32)
+        events['ward_status'] = np.zeros(len(events['game_id']), dtype=np.int8)
+    for name in STRING_COLUMNS:
+        # vocabularies differ between parts, store the decoded strings as object arrays
+        events[name] = events.pop(f'{name}_vocab')[events[name]].astype(object) if len(events[name]) else np.array([], dtype=object)
+    return games, events
+
+
+def load_event_store(store_dir):
+    """
+    Load every part of the store. Returns (games, events), both dicts of
+    equal-length numpy columns; string columns are decoded to object arrays.
+    """
+    parts = [_decode_part(path) for path in _part_paths(store_dir)]
+    if len(parts) == 0:
+        raise FileNotFoundError(f'no event store parts in {store_dir}')
+
+    # the latest part that contains a game wins
+    latest = {}
+    for part_idx, (games, _) in enumerate(parts):
+        for game_id in games['game_id'].tolist():
+            latest[game_id] = part_idx
+
+    game_cols = {k: [] for k in GAME_COLUMNS}
+    event_cols = {k: [] for k in EVENT_COLUMNS}
+    for part_idx, (games, events) in enumerate(parts):
+        keep_games = np.array([latest[g] == part_idx for g in games['game_id'].tolist()], dtype=bool)
+        keep_ids = games['game_id'][keep_games]
+        keep_events = np.isin(events['game_id'], keep_ids)
+        for k in GAME_COLUMNS:
+            game_cols[k].append(games[k][keep_games])
+        for k in EVENT_COLUMNS:
+            event_cols[k].append(events[k][keep_events])
+
+    games = {k: np.concatenate(v) for k, v in game_cols.items()}
+    events = {k: np.concatenate(v) for k, v in event_cols.items()}
+    return games, events
+
+
+def event_mask(events, side=None, kind=None, max_ward_cnt=None, game_ids=None, time_range=None):
+    """
+    Vectorized row filter over the event columns.
+    side / kind are names ('dire', 'placed_observer'), time_range is [start, end) in seconds.
+    """
+    mask = np.ones(len(events['game_id']), dtype=bool)
+    if side is not None:
+        mask &= events['side'] == SIDES.index(side)
+    if kind is not None:
+        mask &= events['kind'] == KINDS.index(kind)
+    if max_ward_cnt is not None:
+        mask &= events['ward_cnt'] <= max_ward_cnt
+    if game_ids is not None:
+        mask &= np.isin(events['game_id'], np.array([int(g) for g in game_ids], dtype=np.int64))
+    if time_range is not None:
+        mask &= time_window_mask(events['time_s'], *time_range)
+    return mask
+
+
+def unique_event_mask(events):
+    """
+    First row of every event, so events shared by several heroes count once.
+    """
+    key = events['game_id'] * (int(events['event_idx'].max()) + 1 if len(events['event_idx']) else 1) + events['event_idx']
+    _, first = np.unique(key, return_index=True)
+    mask = np.zeros(len(key), dtype=bool)
+    mask[first] = True
+    return mask
+
+
+def cluster_column(events, params=None):
+    """
+    Cluster id of every row, streaming each game / side / kind in time order.
+    Rows of the same event share its cluster.
+    """
+    params = DEFAULT_CLUSTER_PARAMS if params is None else params
+    if len(events['game_id']) == 0:
+        return np.zeros(0, dtype=np.int32)
+    rows = np.flatnonzero(unique_event_mask(events))
+    rows = rows[np.lexsort((events['time_s'][rows], events['kind'][rows], events['side'][rows], events['game_id'][rows]))]
+    kind = events['kind'][rows].astype(np.int64)
+    window_s = np.array([params.get(k, (0, 0))[0] for k in KINDS])[kind]
+    radius_px = np.array([params.get(k, (0, 0))[1] for k in KINDS])[kind]
+    ids = cluster_sorted(events['game_id'][rows], events['side'][rows].astype(np.int64) * len(KINDS) + kind,
+                         events['time_s'][rows], events['x_px'][rows], events['y_px'][rows], window_s, radius_px)
+
+    # spread the id of every event to all of its rows
+    key = events['game_id'] * (int(events['event_idx'].max()) + 1) + events['event_idx']
+    event_keys = key[rows]
+    order = np.argsort(event_keys)
+    return ids[order][np.searchsorted(event_keys[order], key)]
+
+
+def cluster_mask(events):
+    """
+    First row of every cluster, so a logical action (one team smoke, one
+    ward spot) counts once.
+    """
+    if len(events['game_id']) == 0:
+        return np.zeros(0, dtype=bool)
+    key = events['game_id'] * (int(events['cluster_id'].max()) + 1) + events['cluster_id']
+    _, first = np.unique(key, return_index=True)
+    mask = np.zeros(len(key), dtype=bool)
+    mask[first] = True
+    return mask
+
+
+def rows_by_game(events, mask=None):
+    """
+    {game_id: row indices} keeping the stored row order within each game.
+    """
+    order = np.argsort(events['game_id'], kind='stable')
+    if mask is not None:
+        order = order[mask[order]]
+    bounds = np.flatnonzero(np.diff(events['game_id'][order])) + 1
+    return {int(events['game_id'][idx[0]]): idx for idx in np.split(order, bounds) if len(idx)}
+
+
+def to_events_summary(games, events):
+    """
+    Rebuild the ``events_summary`` rows (same structure as ``parse_games``)
+    from the store columns.
+    """
+    game_rows = rows_by_game(events)
+    columns = {k: events[k].tolist() for k in EVENT_COLUMNS}
+    events_summary = []
+    for i, game_id in enumerate(games['game_id'].tolist()):
+        hero_events = dict()
+        shared = dict()
+        for r in game_rows.get(game_id, []):
+            event_idx = columns['event_idx'][r]
+            event = shared.get(event_idx)
+            if event is None:
+                event = {
+                    'time': columns['time'][r],
+                    'time_s': columns['time_s'][r],
+                    'action': columns['action'][r],
+                    'key_action': KINDS[columns['kind'][r]],
+                }
+                if event['key_action'] == 'placed_observer':
+                    event['observer_ward_cnt'] = columns['ward_cnt'][r]
+                event['position'] = {
+                    'left_percent': columns['left_percent'][r],
+                    'top_percent': columns['top_percent'][r],
+                }
+                event['position_px'] = (columns['x_px'][r], columns['y_px'][r])
+                if columns['ward_status'][r]:
+                    event['lifetime_s'] = columns['lifetime_s'][r]
+                    event['ward_status'] = WARD_STATUSES[columns['ward_status'][r]]
+                shared[event_idx] = event
+            hero_events.setdefault(columns['hero'][r], []).append(event)
+
+        events_summary.append({
+            'events': hero_events,
+            'hero_players': json.loads(games['hero_players'][i]),
+            'hero_players_against': json.loads(games['hero_players_against'][i]),
+            'side': SIDES[int(games['side'][i])],
+            'game_id': str(game_id),
+            'game_time': str(games['game_time'][i]),
+        })
+    return events_summary
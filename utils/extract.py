@@ -0,0 +1,286 @@
+"""
+Single-pass extraction of every vision event of a DOTABUFF vision page.
+
+``extract_page`` reads the ``<time>`` tag, both player tables and every line
+of ``div.match-log`` once, and keeps all vision events of both factions:
+observer / sentry placements, smokes and destroyed wards, each with its side,
+heroes, time and map position. It does not depend on the key player, so one
+extraction serves every view of a page:
+
+- ``utils.parsers.key_player_view`` gives the ``parse_events`` tuple of
+  ``vision_smoke_moving.py`` (the ``fast`` parser backend),
+- ``archive/history_vision.py`` filters placements, destructions and smokes
+  of both sides from the same result.
+
+The page is scanned with precompiled regexes on the raw text instead of
+building a full document tree.
+"""
+import re
+from html import unescape
+
+from utils.timeline import to_seconds
+
+
+# placements and smokes keep the order of utils.event_store.KINDS
+VISION_KINDS = ('placed_observer', 'smoke', 'placed_sentry', 'destroyed_observer', 'destroyed_sentry')
+SIDES = ('radiant', 'dire')
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_COMMENT_RE = re.compile(r'<!--.*?-->', re.S)
+_ATTR_RE = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+)))?')
+_OPEN_TAG_RES = {}
+_TAG_TOKEN_RES = {}
+
+
+def _open_tag_re(tag):
+    # opening tags of one element type, group 1 is the attribute string
+    if tag not in _OPEN_TAG_RES:
+        _OPEN_TAG_RES[tag] = re.compile(r'<%s\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>' % tag, re.I)
+    return _OPEN_TAG_RES[tag]
+
+
+def _tag_token_re(tag):
+    # opening and closing tags of one element type, used for depth counting
+    if tag not in _TAG_TOKEN_RES:
+        _TAG_TOKEN_RES[tag] = re.compile(r'<(/?)%s\b(?:[^>"\']|"[^"]*"|\'[^\']*\')*>' % tag, re.I)
+    return _TAG_TOKEN_RES[tag]
+
+
+def _attrs(attr_str):
+    attrs = {}
+    for name, v1, v2, v3 in _ATTR_RE.findall(attr_str):
+        name = name.lower()
+        if name not in attrs:
+            attrs[name] = unescape(v1 or v2 or v3)
+    return attrs
+
+
+def _has_class(attrs, cls):
+    return cls in attrs.get('class', '').split()
+
+
+def _close_pos(content, tag, pos, end):
+    """
+    Return (close_start, close_end) of the element whose opening tag ends at pos.
+    """
+    depth = 1
+    for m in _tag_token_re(tag).finditer(content, pos, end):
+        if m.group(1):
+            depth -= 1
+            if depth == 0:
+                return m.start(), m.end()
+        elif not m.group(0).endswith('/>'):
+            depth += 1
+    return end, end
+
+
+def _find(content, tag, cls, pos=0, end=None, exact=False):
+    """
+    Find the first <tag> with class cls in content[pos:end].
+    Returns (attrs, inner_start, inner_end, element_end) or None.
+    """
+    if end is None:
+        end = len(content)
+    for m in _open_tag_re(tag).finditer(content, pos, end):
+        attrs = _attrs(m.group(1))
+        if cls is not None:
+            if exact:
+                if attrs.get('class') != cls:
+                    continue
+            elif not _has_class(attrs, cls):
+                continue
+        inner_end, element_end = _close_pos(content, tag, m.end(), end)
+        return attrs, m.end(), inner_end, element_end
+    return None
+
+
+def _find_all(content, tag, cls, pos=0, end=None):
+    if end is None:
+        end = len(content)
+    for m in _open_tag_re(tag).finditer(content, pos, end):
+        attrs = _attrs(m.group(1))
+        if not _has_class(attrs, cls):
+            continue
+        inner_end, element_end = _close_pos(content, tag, m.end(), end)
+        yield attrs, m.end(), inner_end, element_end
+
+
+def _text(fragment, strip=False):
+    # same result as bs4 get_text() / get_text(strip=True) for simple markup
+    parts = _TAG_RE.split(_COMMENT_RE.sub('', fragment))
+    if strip:
+        return ''.join(s for s in (unescape(p).strip() for p in parts) if s)
+    return unescape(''.join(parts))
+
+
+def _hero_players(content, side):
+    hero_players = dict()
+    section = _find(content, 'section', side)
+    if section is None:
+        raise ValueError(f'no player section for {side}')
+    _, start, end, _ = section
+    for _, tr_start, tr_end, _ in _find_all(content, 'tr', f'faction-{side}', start, end):
+        hero = _find(content, 'img', 'image-hero image-icon', tr_start, tr_end, exact=True)
+        player = _find(content, 'a', f'player-{side}', tr_start, tr_end)
+        if hero is None or player is None:
+            raise ValueError(f'incomplete player row for {side}')
+        hero_name = hero[0]['title'].replace("'", "")
+        hero_players[hero_name] = _text(content[player[1]:player[2]], strip=True)
+    return hero_players
+
+
+def _div_spans(content, start, end):
+    """
+    Single pass over the <div> tags in content[start:end].
+    Returns a list of (classes, inner_start, inner_end) in document order.
+    """
+    divs = []
+    stack = []
+    for m in _tag_token_re('div').finditer(content, start, end):
+        if m.group(1):
+            if stack:
+                idx = stack.pop()
+                divs[idx][2] = m.start()
+        else:
+            tag = m.group(0)
+            attrs = _attrs(tag[4:-1])
+            divs.append([attrs.get('class', '').split(), m.end(), end])
+            if not tag.endswith('/>'):
+                stack.append(len(divs) - 1)
+    return divs
+
+
+def classify_action(action):
+    """
+    Vision kind of a match log action text, or None for other actions.
+    """
+    if 'placed a Observer Ward' in action:
+        return 'placed_observer'
+    if 'activated Smoke of Deceit to stealth' in action:
+        return 'smoke'
+    if 'placed a Sentry Ward' in action:
+        return 'placed_sentry'
+    if 'destroyed' in action:
+        if 'Observer Ward' in action:
+            return 'destroyed_observer'
+        if 'Sentry Ward' in action:
+            return 'destroyed_sentry'
+    return None
+
+
+def _faction_heroes(content, start, end):
+    """
+    Hero names (img alt) of the color-faction-radiant / -dire links in content[start:end].
+    """
+    heroes = {'radiant': [], 'dire': []}
+    for m in _open_tag_re('a').finditer(content, start, end):
+        classes = _attrs(m.group(1)).get('class', '').split()
+        for side in SIDES:
+            if f'color-faction-{side}' in classes:
+                a_end = _close_pos(content, 'a', m.end(), end)[0]
+                heroes[side].append(_attrs(_open_tag_re('img').search(content, m.end(), a_end).group(1))['alt'])
+    return heroes
+
+
+def _position(content, start, end):
+    pos_span = _find(content, 'span', 'minimap-tooltip', start, end)
+    if pos_span is None:
+        return None
+    map_item = _find(content, 'span', 'map-item', pos_span[1], pos_span[2])
+    if map_item is None or 'style' not in map_item[0]:
+        return None
+    style = map_item[0]['style']
+    left_str = style.split('left:')[1].split('%')[0].strip()
+    top_str = style.split('top:')[1].split('%')[0].strip()
+    return float(left_str), float(top_str)
+
+
+def extract_page(content, map_width, map_height):
+    """
+    Returns a dict with
+
+        game_time     the datetime attribute of the first <time> tag
+        hero_players  {'radiant': {hero: player}, 'dire': {hero: player}}
+        events        vision events of both sides in match log order
+
+    Every event is {time, time_s, action, kind, side, heroes, position,
+    position_px}. side is the faction of the hero links in the line
+    (radiant first, None without hero links) and heroes their names.
+    Lines without time or minimap position are skipped.
+    """
+    time_tag = _open_tag_re('time').search(content)
+    game_time = _attrs(time_tag.group(1)).get('datetime') if time_tag is not None else None
+    if game_time is None:
+        # e.g. a page that is still being saved
+        raise ValueError('no <time> tag with a datetime in page')
+    hero_players = {side: _hero_players(content, side) for side in SIDES}
+
+    match_log = _find(content, 'div', 'match-log')
+    if match_log is None:
+        raise ValueError('no match-log in page')
+    divs = _div_spans(content, match_log[1], match_log[2])
+
+    events = []
+    for i, (classes, ev_start, ev_end) in enumerate(divs):
+        if 'event' not in classes:
+            continue
+        # first div.line inside this div.event
+        line = None
+        for classes2, start, end in divs[i + 1:]:
+            if start >= ev_end:
+                break
+            if 'line' in classes2:
+                line = (start, end)
+                break
+        if line is None:
+            continue
+        start, end = line
+
+        action_div = None
+        for classes2, a_start, a_end in divs[i + 1:]:
+            if a_start >= end:
+                break
+            if a_start > start and 'event' in classes2:
+                action_div = (a_start, a_end)
+                break
+        if action_div is None:
+            continue
+        action = ' '.join(_text(content[action_div[0]:action_div[1]]).split())
+        kind = classify_action(action)
+        if kind is None:
+            continue
+
+        time_span = _find(content, 'span', 'time', start, end)
+        position = _position(content, start, end)
+        if time_span is None or position is None:
+            continue
+        time = _text(content[time_span[1]:time_span[2]], strip=True)
+
+        heroes = _faction_heroes(content, start, end)
+        side = next((s for s in SIDES if heroes[s]), None)
+        left, top = position
+        events.append({
+            'time': time,
+            'time_s': to_seconds(time),
+            'action': action,
+            'kind': kind,
+            'side': side,
+            'heroes': heroes[side] if side else [],
+            'position': {
+                'left_percent': left,
+                'top_percent': top
+            },
+            'position_px': (int(left * 0.01 * map_width), int(top * 0.01 * map_height)),
+        })
+
+    return {
+        'game_time': game_time,
+        'hero_players': hero_players,
+        'events': events,
+    }
+
+
+def extract_file(data_html_path, map_width, map_height):
+    with open(data_html_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    return extract_page(content, map_width, map_height)
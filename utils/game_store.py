@@ -0,0 +1,245 @@
+"""
+In-memory game selection with hash indexes over the parsed games.
+
+``GameStore`` keeps the ``events_summary`` rows (dicts or compact games) in
+their original order and indexes their positions by
+
+    player     key faction players (values of ``hero_players``)
+    hero       key faction heroes (keys of ``hero_players``)
+    opponent   opposing players (values of ``hero_players_against``)
+    side       'radiant' / 'dire'
+    date       'YYYY-MM-DD' of ``game_time``, month 'YYYY-MM' and year 'YYYY'
+
+so "games where YB.BoBoKa played Dire against X in November 2025" is a few
+dict lookups and a set intersection, smallest set first, instead of a scan
+over every game:
+
+    store.select(player='YB.BoBoKa', side='dire', opponent='X', month='2025-11', limit=5)
+
+Every filter takes one value or a list (any of them). Results keep the
+store order, which is newest game first for the parse output.
+"""
+import bisect
+
+
+INDEXES = ('player', 'hero', 'opponent', 'side', 'date', 'month', 'year')
+# distance between the order keys of neighbouring games, so a game can be
+# inserted between two others without renumbering the rest
+ORDER_GAP = 1 << 20
+
+
+def _day(game_time):
+    # game_time is the ISO datetime of the page, e.g. '2025-11-03T14:02:11+00:00'
+    return str(game_time)[:10]
+
+
+def _index_keys(game):
+    hero_players = game['hero_players']
+    day = _day(game['game_time'])
+    return {
+        'player': set(hero_players.values()),
+        'hero': set(hero_players),
+        'opponent': set(game['hero_players_against'].values()),
+        'side': {game['side']},
+        'date': {day},
+        'month': {day[:7]},
+        'year': {day[:4]},
+    }
+
+
+def game_matches(game, since=None, until=None, **filters):
+    """
+    True if a single game passes the filters of GameStore.select.
+    """
+    return len(GameStore([game]).positions(since=since, until=until, **filters)) > 0
+
+
+class GameStore:
+    """
+    Every game gets a fixed slot; the indexes hold slots and each slot has an
+    order key, so games can be added or replaced (``upsert``) without
+    touching the index entries of the other games.
+    """
+
+    def __init__(self, games):
+        # games, their order keys and slots in store order
+        self.games = list(games)
+        self._keys = [i * ORDER_GAP for i in range(len(self.games))]
+        self._slots = list(range(len(self.games)))
+        # slot -> game (None once removed) and slot -> order key
+        self._rows = list(self.games)
+        self._order = list(self._keys)
+        self.indexes = {name: {} for name in INDEXES}
+        self.days = []
+        self.by_id = {}
+        for slot, game in enumerate(self.games):
+            self._add(slot, game)
+
+    def _add(self, slot, game):
+        for name, values in _index_keys(game).items():
+            index = self.indexes[name]
+            for value in values:
+                if value not in index:
+                    index[value] = set()
+                    if name == 'date':
+                        bisect.insort(self.days, value)
+                index[value].add(slot)
+        self.by_id[str(game['game_id'])] = slot
+
+    def _remove(self, slot, game):
+        for name, values in _index_keys(game).items():
+            index = self.indexes[name]
+            for value in values:
+                index[value].discard(slot)
+                if not index[value]:
+                    del index[value]
+                    if name == 'date':
+                        self.days.remove(value)
+
+    def _position(self, slot):
+        return bisect.bisect_left(self._keys, self._order[slot])
+
+    def _order_key(self, position):
+        # a key between the games before and after position
+        before = self._keys[position - 1] if position > 0 else None
+        after = self._keys[position] if position < len(self._keys) else None
+        if before is None:
+            return 0 if after is None else after - ORDER_GAP
+        if after is None:
+            return before + ORDER_GAP
+        if after - before > 1:
+            return (before + after) // 2
+        # no room left between them, spread all keys out again
+        for position_, slot in enumerate(self._slots):
+            self._keys[position_] = self._order[slot] = position_ * ORDER_GAP
+        return self._order_key(position)
+
+    def upsert(self, game):
+        """
+        Replace the game with the same id in place, or insert it by game id,
+        newest first like the parse output. Only the game's own index entries
+        change. Returns the replaced game or None.
+        """
+        slot = self.by_id.get(str(game['game_id']))
+        if slot is not None:
+            old = self._rows[slot]
+            self._remove(slot, old)
+            self._rows[slot] = game
+            self.games[self._position(slot)] = game
+            self._add(slot, game)
+            return old
+
+        position = bisect.bisect_left(self.games, -int(game['game_id']), key=lambda g: -int(g['game_id']))
+        key = self._order_key(position)
+        slot = len(self._rows)
+        self._rows.append(game)
+        self._order.append(key)
+        self.games.insert(position, game)
+        self._keys.insert(position, key)
+        self._slots.insert(position, slot)
+        self._add(slot, game)
+        return None
+
+    def remove(self, game_id):
+        """
+        Drop a game, returns it or None if it is not in the store.
+        """
+        slot = self.by_id.pop(str(game_id), None)
+        if slot is None:
+            return None
+        old = self._rows[slot]
+        self._remove(slot, old)
+        position = self._position(slot)
+        del self.games[position], self._keys[position], self._slots[position]
+        self._rows[slot] = None
+        return old
+
+    def __len__(self):
+        return len(self.games)
+
+    def __iter__(self):
+        return iter(self.games)
+
+    def get(self, game_id):
+        slot = self.by_id.get(str(game_id))
+        return None if slot is None else self._rows[slot]
+
+    def values(self, name):
+        """
+        Indexed values of one field, e.g. every opponent player.
+        """
+        return sorted(self.indexes[name])
+
+    def _lookup(self, name, value):
+        if isinstance(value, (list, tuple, set, frozenset)):
+            slots = set()
+            for v in value:
+                slots.update(self.indexes[name].get(v, ()))
+            return slots
+        return set(self.indexes[name].get(value, ()))
+
+    def _date_range(self, since, until):
+        # days are sorted, so a range is a slice of the date index
+        lo = 0 if since is None else bisect.bisect_left(self.days, _day(since))
+        hi = len(self.days) if until is None else bisect.bisect_right(self.days, _day(until))
+        slots = set()
+        for day in self.days[lo:hi]:
+            slots.update(self.indexes['date'][day])
+        return slots
+
+    def positions(self, since=None, until=None, **filters):
+        """
+        Slots of the games matching every filter in store order, see select.
+        """
+        unknown = set(filters) - set(INDEXES)
+        if unknown:
+            raise ValueError(f'unknown game filters: {sorted(unknown)}, choose from {list(INDEXES)}')
+        sets = [self._lookup(name, value) for name, value in filters.items() if value is not None]
+        if since is not None or until is not None:
+            sets.append(self._date_range(since, until))
+        if not sets:
+            return list(self._slots)
+        sets.sort(key=len)
+        result = sets[0].intersection(*sets[1:])
+        return sorted(result, key=self._order.__getitem__)
+
+    def select(self, limit=None, since=None, until=None, **filters):
+        """
+        Games matching every filter (player, hero, opponent, side, date, month,
+        year; since / until are inclusive dates), in store order, at most limit.
+        """
+        slots = self.positions(since=since, until=until, **filters)
+        if limit is not None:
+            slots = slots[:limit]
+        return [self._rows[slot] for slot in slots]
+
+    def subset(self, since=None, until=None, **filters):
+        """
+        A new store over the matching games, the store itself without filters.
+        """
+        if since is None and until is None and all(value is None for value in filters.values()):
+            return self
+        return GameStore(self.select(since=since, until=until, **filters))
+
+
+def add_filter_args(parser):
+    """
+    Game filter options shared by the command line tools.
+    """
+    parser.add_argument('--with-player', type=str, nargs='+', default=None, help='only games where one of these players was on the key faction')
+    parser.add_argument('--with-hero', type=str, nargs='+', default=None, help='only games where the key faction picked one of these heroes')
+    parser.add_argument('--vs', type=str, nargs='+', default=None, help='only games against one of these players')
+    parser.add_argument('--month', type=str, nargs='+', default=None, help='only games in these months, e.g. 2025-11')
+    parser.add_argument('--since', type=str, default=None, help='only games on or after this date, e.g. 2025-11-01')
+    parser.add_argument('--until', type=str, default=None, help='only games on or before this date')
+
+
+def filters_from_args(args):
+    return {
+        'player': args.with_player,
+        'hero': args.with_hero,
+        'opponent': args.vs,
+        'month': args.month,
+        'since': args.since,
+        'until': args.until,
+    }
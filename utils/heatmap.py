@@ -0,0 +1,174 @@
+"""
+Ward / smoke placement density heatmaps over large match corpora.
+
+Individual circles stop being readable after a couple of dozen games, so this
+accumulates observer, sentry and smoke positions into fixed-size 2D
+histograms per (side, phase, kind). Memory does not depend on the number of
+games, and accumulators from parallel workers or separate runs can be merged
+with ``merge`` (or ``python -m utils.heatmap a.npz b.npz``). Smoothing is done on
+the accumulated grid, then the result is color mapped and blended onto the map.
+"""
+import argparse
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from utils.encode import ImageWriter, fingerprint
+from utils.event_store import KINDS, SIDES, cluster_mask, summary_to_columns
+
+
+# phase boundaries in minutes: pre-game, 0-6, 6-12, 12-20, 20-40, 40+
+DEFAULT_PHASE_MINUTES = (0, 6, 12, 20, 40)
+DEFAULT_BINS = 256
+
+
+def phase_names(phase_minutes):
+    names = [f'<{phase_minutes[0]}min']
+    for start, end in zip(phase_minutes[:-1], phase_minutes[1:]):
+        names.append(f'{start}-{end}min')
+    names.append(f'{phase_minutes[-1]}+min')
+    return names
+
+
+class HeatmapAccumulator:
+
+    def __init__(self, map_width, map_height, bins=DEFAULT_BINS, phase_minutes=DEFAULT_PHASE_MINUTES):
+        self.map_width = map_width
+        self.map_height = map_height
+        self.bins = bins
+        self.phase_minutes = tuple(phase_minutes)
+        self.phase_bounds = np.array(self.phase_minutes, dtype=np.int64) * 60
+        self.phases = phase_names(self.phase_minutes)
+        self.grid = np.zeros((len(SIDES), len(self.phases), len(KINDS), bins, bins), dtype=np.uint32)
+        self.game_num = 0
+
+    def add_columns(self, events):
+        """
+        Add event store columns; events shared by several heroes count once, and
+        so does a cluster (a smoke used by several heroes, a ward logged twice).
+        """
+        if len(events['game_id']) == 0:
+            return
+        mask = cluster_mask(events)
+        x = np.clip(events['x_px'][mask] * self.bins // self.map_width, 0, self.bins - 1)
+        y = np.clip(events['y_px'][mask] * self.bins // self.map_height, 0, self.bins - 1)
+        phase = np.searchsorted(self.phase_bounds, events['time_s'][mask], side='right')
+        side = events['side'][mask].astype(np.int64)
+        kind = events['kind'][mask].astype(np.int64)
+        flat = np.ravel_multi_index((side, phase, kind, y, x), self.grid.shape)
+        cells, counts = np.unique(flat, return_counts=True)
+        self.grid.reshape(-1)[cells] += counts.astype(np.uint32)
+        self.game_num += len(np.unique(events['game_id']))
+
+    def add_summary(self, events_summary):
+        # feed games in chunks to keep the flattened columns small
+        for i in range(0, len(events_summary), 256):
+            self.add_columns(summary_to_columns(events_summary[i:i + 256])[1])
+
+    def merge(self, other):
+        if other.grid.shape != self.grid.shape or other.phase_minutes != self.phase_minutes \
+                or (other.map_width, other.map_height) != (self.map_width, self.map_height):
+            raise ValueError('cannot merge heatmaps with different map size, bins or phases')
+        self.grid += other.grid
+        self.game_num += other.game_num
+        return self
+
+    def density(self, side, phase=None, kinds=None):
+        """
+        Sum of the histograms of one side over the given phase index (None: all
+        phases) and kind names (None: all kinds), as float32.
+        """
+        grid = self.grid[SIDES.index(side)]
+        if phase is not None:
+            grid = grid[phase:phase + 1]
+        if kinds is not None:
+            grid = grid[:, [KINDS.index(k) for k in kinds]]
+        return grid.sum(axis=(0, 1)).astype(np.float32)
+
+    def render(self, dota_map, side, phase=None, kinds=None, sigma=2.0, alpha=0.6):
+        """
+        Smooth the accumulated grid, color map it and blend it onto dota_map.
+        """
+        density = self.density(side, phase, kinds)
+        if sigma > 0:
+            density = cv2.GaussianBlur(density, (0, 0), sigma)
+        peak = density.max()
+        if peak > 0:
+            density /= peak
+        density = cv2.resize(density, (dota_map.shape[1], dota_map.shape[0]), interpolation=cv2.INTER_LINEAR)
+        heat = cv2.applyColorMap((density * 255).astype(np.uint8), cv2.COLORMAP_JET)
+        weight = (alpha * np.clip(density * 4, 0, 1))[:, :, None]
+        return (dota_map * (1 - weight) + heat * weight).astype(np.uint8)
+
+    def save(self, path):
+        np.savez_compressed(path, grid=self.grid, map_size=np.array([self.map_width, self.map_height]),
+                            phase_minutes=np.array(self.phase_minutes), game_num=self.game_num)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            map_width, map_height = data['map_size'].tolist()
+            acc = cls(map_width, map_height, bins=data['grid'].shape[-1], phase_minutes=data['phase_minutes'].tolist())
+            acc.grid = data['grid'].astype(np.uint32)
+            acc.game_num = int(data['game_num'])
+        return acc
+
+
+HEATMAP_KIND_SETS = {
+    'observer': ('placed_observer',),
+    'sentry': ('placed_sentry',),
+    'smoke': ('smoke',),
+}
+
+
+def write_heatmaps(acc, dota_map, out_dir, team_name, sigma=2.0, writer=None):
+    """
+    One image per side x (all phases + each phase) x kind set. Images whose
+    density and label did not change since the last run are skipped, see
+    utils/encode.py; writer defaults to a jpg ImageWriter rooted at out_dir.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    own_writer = writer is None
+    if own_writer:
+        writer = ImageWriter(out_dir)
+    map_key = fingerprint(dota_map)
+    paths = []
+    for side in SIDES:
+        for phase in [None] + list(range(len(acc.phases))):
+            phase_name = 'all' if phase is None else acc.phases[phase]
+            for kind_name, kinds in HEATMAP_KIND_SETS.items():
+                title = f'{team_name}-{side}-{kind_name}-heatmap-{phase_name}'
+                label = f'{title} ({acc.game_num} games)'
+                path = writer.path(out_dir, title)
+                paths.append(path)
+                key = fingerprint(map_key, label, sigma, acc.density(side, phase, kinds))
+                if writer.unchanged(path, key):
+                    continue
+                vis_map = acc.render(dota_map, side, phase, kinds, sigma=sigma)
+                cv2.putText(vis_map, label, (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 200), 2)
+                cv2.putText(vis_map, 'Made by SPACE', (vis_map.shape[1] - 300, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (200, 0, 0), 2)
+                writer.write(path, vis_map, key)
+    if own_writer:
+        writer.close()
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='merge saved heatmap accumulators and render them')
+    parser.add_argument('inputs', nargs='+', help='heatmap.npz files written by vision_smoke_moving.py --heatmap')
+    parser.add_argument('--output', type=str, default='heatmap_merged.npz')
+    parser.add_argument('--render-dir', type=str, default=None)
+    parser.add_argument('--team', type=str, default='merged')
+    parser.add_argument('--sigma', type=float, default=2.0)
+    args = parser.parse_args()
+
+    acc = HeatmapAccumulator.load(args.inputs[0])
+    for path in args.inputs[1:]:
+        acc.merge(HeatmapAccumulator.load(path))
+    acc.save(args.output)
+    print(f'{args.output} saved ({acc.game_num} games)')
+    if args.render_dir is not None:
+        paths = write_heatmaps(acc, cv2.imread('dota2_map.jpg'), args.render_dir, args.team, sigma=args.sigma)
+        print(f'{len(paths)} heatmaps saved to {args.render_dir}')
@@ -0,0 +1,126 @@
+"""
+Ingest stage: turn saved DOTABUFF vision pages into ``events_summary`` rows.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from tqdm import tqdm
+
+from utils.compact import CompactGame
+from utils.parsers import DEFAULT_PARSER, get_parser
+from utils.profiler import get_profiler, profile_stage, profiled_call
+from utils.sources import decode_text, read_order
+
+
+def game_id_from_path(data_html_path):
+    # 'Match 8526048356 - Vision - DOTABUFF - Dota 2 Stats.html' -> '8526048356'
+    return data_html_path.stem.split(' ')[1]
+
+
+def make_row(data_html_path, parsed):
+    events, hero_players, hero_players_against, game_time, side = parsed
+    return {
+        'events': events,
+        'hero_players': hero_players,
+        'hero_players_against': hero_players_against,
+        'side': side,
+        'game_id': game_id_from_path(data_html_path),
+        'game_time': game_time,
+    }
+
+
+def parse_file(data_html_path, map_width, map_height, key_player, parser=DEFAULT_PARSER, content=None):
+    """
+    Return the ``parse_events`` tuple of one saved page, a file or an archive
+    member (see utils/sources.py). content is the raw bytes of the page when
+    they were already read (e.g. for the cache key). Only plain values are
+    passed in so this can run inside a worker process.
+    """
+    with profile_stage('parse_file', file=data_html_path.name):
+        with profile_stage('read'):
+            content = data_html_path.read_text(encoding='utf-8') if content is None else decode_text(content)
+        with profile_stage(f'parse[{parser}]'):
+            return get_parser(parser)(content, map_width, map_height, key_player)
+
+
+def _parse_worker(data_html_path, content, **kwargs):
+    # executor.map passes the page and its bytes positionally
+    return parse_file(data_html_path, content=content, **kwargs)
+
+
+def resolve_jobs(jobs):
+    # 0 or negative means one worker per cpu
+    if jobs is None or jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _parse_files(paths, contents, worker, jobs, progress):
+    jobs = min(resolve_jobs(jobs), max(len(paths), 1))
+    if jobs == 1:
+        for data_html_path, content in zip(paths, contents):
+            yield worker(data_html_path, content)
+            progress.update(1)
+        return
+
+    # a few chunks per worker keeps the pool busy without per-file IPC overhead
+    chunksize = max(1, len(paths) // (jobs * 4))
+    profiler = get_profiler()
+    if profiler.enabled:
+        # workers profile themselves and send their stages back with every result
+        worker = partial(profiled_call, worker, profiler.trace_memory)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for parsed in executor.map(worker, paths, contents, chunksize=chunksize):
+            if profiler.enabled:
+                parsed, data = parsed
+                profiler.merge(data)
+            yield parsed
+            progress.update(1)
+
+
+def parse_games(games, map_width, map_height, key_player, parser=DEFAULT_PARSER, jobs=1, cache=None, tables=None):
+    """
+    Parse every page in ``games`` and return the rows in the same order.
+
+    With jobs > 1 the pages are spread over a process pool; the output order
+    does not depend on which worker finishes first. With a ``ParseCache`` only
+    pages whose content has not been seen before are parsed. With intern
+    ``tables`` every row is turned into a ``CompactGame`` as soon as it is
+    parsed, so the event dicts of the whole corpus are never held at once.
+    """
+    def row(i, result):
+        result = make_row(games[i], result)
+        return result if tables is None else CompactGame.from_row(result, tables)
+
+    parsed = [None] * len(games)
+    keys = [None] * len(games)
+    # bytes read for the cache key of a page that missed, parsed without reading it again
+    contents = [None] * len(games)
+    todo = []
+    # pages of compressed tars are cheapest to read in archive order, the rows keep the games order
+    for i in sorted(range(len(games)), key=lambda i: read_order(games[i])):
+        data_html_path = games[i]
+        if cache is not None:
+            with profile_stage('cache_lookup', file=data_html_path.name):
+                content = data_html_path.read_bytes()
+                keys[i] = cache.key(content, map_width, map_height, key_player, parser)
+                parsed[i] = cache.get(keys[i])
+            if parsed[i] is None:
+                contents[i] = content
+        if parsed[i] is None:
+            todo.append(i)
+        else:
+            parsed[i] = row(i, parsed[i])
+
+    worker = partial(_parse_worker, map_width=map_width, map_height=map_height, key_player=key_player, parser=parser)
+    with tqdm(total=len(games), initial=len(games) - len(todo), desc='Processing games') as progress:
+        for i, result in zip(todo, _parse_files([games[i] for i in todo], [contents[i] for i in todo], worker, jobs, progress)):
+            if cache is not None:
+                cache.put(keys[i], result)
+            contents[i] = None
+            parsed[i] = row(i, result)
+    if cache is not None:
+        cache.evict()
+
+    return parsed
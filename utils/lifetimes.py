@@ -0,0 +1,280 @@
+"""
+Ward lifetimes: pair every destroyed ward with its placement.
+
+The match log has a line for every ward placed and every ward destroyed, but
+nothing links the two. ``pair_wards`` streams the vision events of one game
+in time order and keeps the standing wards of each (side, ward type) in a
+hash of ``PAIR_RADIUS`` sized map cells. A destruction by one side only looks
+at the enemy wards in its own and the 8 neighbouring cells and takes the
+closest one that is still up (placed at most a ward duration earlier, oldest
+first on ties), so a game is paired in one pass instead of comparing every
+destruction with every placement.
+
+Every placed ward ends up with a lifetime in seconds and a status:
+
+    dewarded   destroyed by the enemy, lifetime = destruction - placement
+    expired    not destroyed and the log goes on past its full duration
+    alive      still standing at the last logged event of the game
+
+``spot_survival`` aggregates the lifetimes of the event store columns per map
+spot (a grid cell) across games, and ``render_lifetimes`` colors wards by
+how long they stood.
+"""
+import argparse
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from utils.event_store import KINDS, SIDES, WARD_STATUSES, unique_event_mask
+
+
+# full duration of a ward that is never destroyed, in seconds
+WARD_DURATION_S = {'observer': 360, 'sentry': 420}
+# destruction and placement positions are the ward's minimap position, in percent of the map
+PAIR_RADIUS = 1.5
+DEFAULT_SPOT_GRID = 32
+
+_PLACED = {'placed_observer': 'observer', 'placed_sentry': 'sentry'}
+_DESTROYED = {'destroyed_observer': 'observer', 'destroyed_sentry': 'sentry'}
+_ENEMY = {'radiant': 'dire', 'dire': 'radiant'}
+
+
+def _cell(position, radius):
+    return int(position['left_percent'] // radius), int(position['top_percent'] // radius)
+
+
+def pair_wards(events, kind_key='kind', durations=None, radius=PAIR_RADIUS):
+    """
+    events: vision events of one game (both sides, in log order) with kind,
+    side, time_s and position, e.g. ``extract_page(...)['events']``.
+    Returns {index of a placed ward: (lifetime_s, status, index of its destruction or None)}.
+    """
+    durations = WARD_DURATION_S if durations is None else durations
+    order = sorted(range(len(events)), key=lambda i: events[i]['time_s'])
+    game_end = max((event['time_s'] for event in events), default=0)
+    # (side, ward type, cell x, cell y) -> indexes of the wards placed there, oldest first
+    standing = {}
+    paired = {}
+    r2 = radius * radius
+    for i in order:
+        event = events[i]
+        kind = event[kind_key]
+        if kind in _PLACED:
+            cx, cy = _cell(event['position'], radius)
+            standing.setdefault((event['side'], _PLACED[kind], cx, cy), []).append(i)
+            continue
+        if kind not in _DESTROYED or event['side'] not in _ENEMY:
+            continue
+
+        ward = _DESTROYED[kind]
+        side = _ENEMY[event['side']]
+        t = event['time_s']
+        left, top = event['position']['left_percent'], event['position']['top_percent']
+        cx, cy = _cell(event['position'], radius)
+        best = None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                bucket = standing.get((side, ward, cx + dx, cy + dy))
+                if not bucket:
+                    continue
+                # wards past their duration are gone, drop them from the front of the bucket
+                while bucket and t - events[bucket[0]]['time_s'] > durations[ward]:
+                    bucket.pop(0)
+                for j in bucket:
+                    placed = events[j]
+                    d2 = (placed['position']['left_percent'] - left) ** 2 + (placed['position']['top_percent'] - top) ** 2
+                    if d2 <= r2 and (best is None or (d2, placed['time_s']) < best[:2]):
+                        best = (d2, placed['time_s'], j, bucket)
+        if best is not None:
+            j, bucket = best[2], best[3]
+            bucket.remove(j)
+            paired[j] = (t - events[j]['time_s'], 'dewarded', i)
+
+    lifetimes = {}
+    for i in order:
+        kind = events[i][kind_key]
+        if kind not in _PLACED:
+            continue
+        if i in paired:
+            lifetimes[i] = paired[i]
+            continue
+        duration = durations[_PLACED[kind]]
+        placed_s = events[i]['time_s']
+        if placed_s + duration <= game_end:
+            lifetimes[i] = (duration, 'expired', None)
+        else:
+            lifetimes[i] = (game_end - placed_s, 'alive', None)
+    return lifetimes
+
+
+def ward_rows(events, mask=None):
+    """
+    Rows of the event store columns holding one placed ward each (the first
+    hero row of every event) with a known status.
+    """
+    if len(events['game_id']) == 0:
+        return np.zeros(0, dtype=np.int64)
+    ward = np.isin(events['kind'], [KINDS.index(k) for k in _PLACED]) & (events['ward_status'] > 0)
+    ward &= unique_event_mask(events)
+    if mask is not None:
+        ward &= mask
+    return np.flatnonzero(ward)
+
+
+def spot_survival(events, grid=DEFAULT_SPOT_GRID, min_wards=1):
+    """
+    Survival of the placed wards per (side, ward type, spot) across games, a
+    spot being a cell of a grid x grid map grid. Returns a list of dicts,
+    most used spots first.
+    """
+    rows = ward_rows(events)
+    if len(rows) == 0:
+        return []
+    gx = np.clip((events['left_percent'][rows] * grid // 100).astype(np.int64), 0, grid - 1)
+    gy = np.clip((events['top_percent'][rows] * grid // 100).astype(np.int64), 0, grid - 1)
+    key = (events['side'][rows].astype(np.int64) * len(KINDS) + events['kind'][rows]) * grid * grid + gy * grid + gx
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    lifetime = events['lifetime_s'][rows][order].astype(np.int64)
+    status = events['ward_status'][rows][order]
+    games = events['game_id'][rows][order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    ends = np.r_[starts[1:], len(key)]
+
+    spots = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        n = end - start
+        if n < min_wards:
+            continue
+        k = int(key[start])
+        side_kind, cell = divmod(k, grid * grid)
+        side, kind = divmod(side_kind, len(KINDS))
+        cy, cx = divmod(cell, grid)
+        spot_status = status[start:end]
+        spot_lifetime = lifetime[start:end]
+        dewarded = int(np.count_nonzero(spot_status == WARD_STATUSES.index('dewarded')))
+        spots.append({
+            'side': SIDES[side],
+            'ward': _PLACED[KINDS[kind]],
+            'cell_x': cx,
+            'cell_y': cy,
+            'left_percent': round((cx + 0.5) * 100 / grid, 2),
+            'top_percent': round((cy + 0.5) * 100 / grid, 2),
+            'wards': n,
+            'games': len(np.unique(games[start:end])),
+            'dewarded': dewarded,
+            'expired': int(np.count_nonzero(spot_status == WARD_STATUSES.index('expired'))),
+            'alive': int(np.count_nonzero(spot_status == WARD_STATUSES.index('alive'))),
+            'deward_rate': round(dewarded / n, 4),
+            'mean_lifetime_s': round(float(spot_lifetime.mean()), 1),
+            'median_lifetime_s': float(np.median(spot_lifetime)),
+        })
+    spots.sort(key=lambda spot: (-spot['wards'], spot['side'], spot['ward'], spot['cell_y'], spot['cell_x']))
+    return spots
+
+
+def write_spot_survival(spots, path):
+    fields = ['side', 'ward', 'cell_x', 'cell_y', 'left_percent', 'top_percent', 'wards', 'games',
+              'dewarded', 'expired', 'alive', 'deward_rate', 'mean_lifetime_s', 'median_lifetime_s']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(spots)
+    return path
+
+
+def lifetime_color(lifetime_s, duration_s):
+    # red: destroyed right away, green: stood its full duration
+    frac = min(max(lifetime_s / duration_s, 0.0), 1.0)
+    return (0, int(255 * frac), int(255 * (1 - frac)))
+
+
+def side_ward_rows(events, side, ward='observer'):
+    """
+    Placed wards of one side and ward type, longest-living first, so the
+    short-lived wards are drawn on top.
+    """
+    rows = ward_rows(events, (events['side'] == SIDES.index(side)) & (events['kind'] == KINDS.index(f'placed_{ward}')))
+    return rows[np.argsort(-events['lifetime_s'][rows], kind='stable')]
+
+
+def render_lifetimes(dota_map, events, side, ward='observer', durations=None):
+    """
+    The placed wards of one side on a copy of dota_map, colored by lifetime.
+    Dewarded wards get a white ring, wards still up at the end a black one.
+    """
+    # cv2 only for drawing, the parsers use pair_wards without loading it
+    import cv2
+
+    durations = WARD_DURATION_S if durations is None else durations
+    vis_map = dota_map.copy()
+    rows = side_ward_rows(events, side, ward)
+    for r in rows.tolist():
+        center = (int(events['x_px'][r]), int(events['y_px'][r]))
+        cv2.circle(vis_map, center, 8, lifetime_color(int(events['lifetime_s'][r]), durations[ward]), -1)
+        status = WARD_STATUSES[events['ward_status'][r]]
+        if status == 'dewarded':
+            cv2.circle(vis_map, center, 9, (255, 255, 255), 2)
+        elif status == 'alive':
+            cv2.circle(vis_map, center, 9, (0, 0, 0), 2)
+    return vis_map, len(rows)
+
+
+def write_lifetime_maps(events, dota_map, out_dir, team_name, grid=DEFAULT_SPOT_GRID, writer=None):
+    """
+    One lifetime map per side and ward type plus ward_survival.csv. Maps
+    whose wards did not change since the last run are skipped, see
+    utils/encode.py.
+    """
+    import cv2
+
+    from utils.encode import ImageWriter, fingerprint
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    own_writer = writer is None
+    if own_writer:
+        writer = ImageWriter(out_dir)
+    map_key = fingerprint(dota_map)
+    paths = []
+    for side in SIDES:
+        for ward in WARD_DURATION_S:
+            title = f'{team_name}-{side}-{ward}-lifetimes'
+            path = writer.path(out_dir, title)
+            paths.append(path)
+            rows = side_ward_rows(events, side, ward)
+            key = fingerprint(map_key, title, events['x_px'][rows], events['y_px'][rows],
+                              events['lifetime_s'][rows], events['ward_status'][rows])
+            if writer.unchanged(path, key):
+                continue
+            vis_map, count = render_lifetimes(dota_map, events, side, ward)
+            cv2.putText(vis_map, f'{title} ({count} wards, red: short, green: full {WARD_DURATION_S[ward] // 60} min)', (30, 50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 200), 2)
+            cv2.putText(vis_map, 'Made by SPACE', (vis_map.shape[1] - 300, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (200, 0, 0), 2)
+            writer.write(path, vis_map, key)
+    write_spot_survival(spot_survival(events, grid), out_dir / 'ward_survival.csv')
+    if own_writer:
+        writer.close()
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='per-spot ward survival of an event store')
+    parser.add_argument('store', type=str, help='event store directory written with --format store')
+    parser.add_argument('--grid', type=int, default=DEFAULT_SPOT_GRID, help='spots per map side')
+    parser.add_argument('--min-wards', type=int, default=3, help='skip spots with fewer wards')
+    parser.add_argument('--top', type=int, default=20, help='number of spots to print')
+    parser.add_argument('--output', type=str, default=None, help='write every spot to this csv')
+    args = parser.parse_args()
+
+    from utils.event_store import load_event_store
+
+    _, events = load_event_store(args.store)
+    spots = spot_survival(events, args.grid, args.min_wards)
+    for spot in spots[:args.top]:
+        print(f'{spot["side"]:8s}{spot["ward"]:10s}({spot["left_percent"]:5.1f}%, {spot["top_percent"]:5.1f}%)  '
+              f'{spot["wards"]:4d} wards  dewarded {spot["deward_rate"]:6.1%}  median {spot["median_lifetime_s"]:5.0f}s')
+    if args.output:
+        write_spot_survival(spots, args.output)
+        print(f'{args.output} saved ({len(spots)} spots)')
@@ -0,0 +1,125 @@
+"""
+Content-addressed on-disk cache of ``parse_events`` results.
+
+Saved DOTABUFF pages never change, so the parse output only depends on the
+page content, the map size, the key player, the parser backend and the
+parser version. Entries are pickled to ``<cache_dir>/<key[:2]>/<key>.pkl``;
+once the cache grows over ``max_bytes`` the least recently used entries are
+removed.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+from utils.parsers import PARSER_VERSION
+
+
+DEFAULT_CACHE_DIR = '.parse_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ParseCache:
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = None
+        self._total_bytes = 0
+
+    @staticmethod
+    def key(content, map_width, map_height, key_player, parser):
+        """
+        content is the raw bytes of the saved page, parser the backend name,
+        so e.g. bs4 results are never served to a fast run or the other way round.
+        """
+        h = hashlib.sha256(content)
+        h.update(f'|{map_width}x{map_height}|{key_player}|{parser}|v{PARSER_VERSION}'.encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f'{key}.pkl'
+
+    def _load_index(self):
+        # {path: (last_used, size)}, scanned once per process
+        if self._entries is not None:
+            return
+        self._entries = {}
+        self._total_bytes = 0
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.glob('*/*.pkl'):
+            stat = path.stat()
+            self._entries[path] = (stat.st_mtime, stat.st_size)
+            self._total_bytes += stat.st_size
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        # the mtime is the last-used time for the LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if self._entries is not None and path in self._entries:
+            self._entries[path] = (path.stat().st_mtime, self._entries[path][1])
+        return value
+
+    def put(self, key, value):
+        self._load_index()
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        stat = path.stat()
+        if path in self._entries:
+            self._total_bytes -= self._entries[path][1]
+        self._entries[path] = (stat.st_mtime, stat.st_size)
+        self._total_bytes += stat.st_size
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        self._load_index()
+        for path, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            del self._entries[path]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
+        self._entries = {}
+        self._total_bytes = 0
+
+    def stats(self):
+        self._load_index()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'size_mb': round(self._total_bytes / 1024 / 1024, 2),
+        }
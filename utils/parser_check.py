@@ -0,0 +1,87 @@
+"""
+Parity check and throughput comparison between the parser backends.
+
+Runs every backend in utils/parsers.py over the same saved DOTABUFF pages,
+checks that they return exactly the same structures as the ``bs4`` reference
+backend and prints files/s and MB/s for each backend.
+
+    python -m utils.parser_check --team yb --player YB.BoBoKa
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from utils.parsers import PARSERS
+
+
+def check_parity(contents, map_width, map_height, key_player, reference='bs4'):
+    """
+    Compare every backend against the reference backend.
+    Returns a list of (file_name, backend, message) for every mismatch.
+    """
+    mismatches = []
+    for name, content in contents:
+        expected = PARSERS[reference](content, map_width, map_height, key_player)
+        for backend, parser in PARSERS.items():
+            if backend == reference:
+                continue
+            try:
+                got = parser(content, map_width, map_height, key_player)
+            except Exception as e:
+                mismatches.append((name, backend, f'raised {e!r}'))
+                continue
+            if got != expected:
+                fields = ['hero_events', 'hero_players', 'hero_players_against', 'game_time', 'side']
+                diff = [field for field, a, b in zip(fields, got, expected) if a != b]
+                mismatches.append((name, backend, f'differs in {", ".join(diff)}'))
+    return mismatches
+
+
+def measure_throughput(contents, map_width, map_height, key_player, repeat=1):
+    """
+    Returns {backend: (seconds, files_per_second, mb_per_second)}.
+    """
+    total_mb = sum(len(content.encode('utf-8')) for _, content in contents) / 1e6
+    results = {}
+    for backend, parser in PARSERS.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _, content in contents:
+                parser(content, map_width, map_height, key_player)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[backend] = (best, len(contents) / best, total_mb / best)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--team', type=str, default='yb')
+    parser.add_argument('--data-dir', type=str, default=None, help='defaults to data_{team}')
+    parser.add_argument('--player', type=str, default='YB.BoBoKa')
+    parser.add_argument('--map-size', type=int, nargs=2, default=[1024, 1024], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir or f'data_{args.team}')
+    files = sorted(data_dir.glob('*.html'))
+    if len(files) == 0:
+        raise ValueError(f'no html files found in {data_dir}')
+    contents = [(f.name, f.read_text(encoding='utf-8')) for f in files]
+    map_width, map_height = args.map_size
+
+    mismatches = check_parity(contents, map_width, map_height, args.player)
+    for name, backend, message in mismatches:
+        print(f'MISMATCH [{backend}] {name}: {message}')
+    print(f'parity: {len(files) - len({m[0] for m in mismatches})}/{len(files)} files identical')
+
+    results = measure_throughput(contents, map_width, map_height, args.player, repeat=args.repeat)
+    print(f'{"backend":<8} {"seconds":>9} {"files/s":>9} {"MB/s":>8}')
+    for backend, (seconds, files_per_s, mb_per_s) in results.items():
+        print(f'{backend:<8} {seconds:>9.3f} {files_per_s:>9.1f} {mb_per_s:>8.2f}')
+    if 'bs4' in results and 'fast' in results:
+        print(f'speedup fast vs bs4: {results["bs4"][0] / results["fast"][0]:.1f}x')
+
+    sys.exit(1 if mismatches else 0)
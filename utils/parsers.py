@@ -0,0 +1,231 @@
+"""
+Parser backends for DOTABUFF vision pages.
+
+Every backend takes the raw html of a saved vision page and returns the same
+``(hero_events, hero_players, hero_players_against, game_time, side)`` tuple
+that ``vision_smoke_moving.parse_events`` has always returned.
+
+- ``fast``: the single-pass extraction of utils/extract.py (both factions,
+  regexes on the raw text instead of a full document tree), filtered down to
+  the key player's faction by ``key_player_view``.
+- ``bs4``: the original BeautifulSoup implementation, kept as the reference
+  backend for parity checks (see ``utils/parser_check.py``).
+"""
+from utils.extract import SIDES, classify_action, extract_page
+from utils.lifetimes import pair_wards
+from utils.profiler import profile_stage
+from utils.timeline import to_seconds
+
+
+# bump this whenever the structure returned by the parsers changes
+PARSER_VERSION = 4
+
+DEFAULT_PARSER = 'fast'
+
+
+def parse_events_bs4(content, map_width, map_height, key_player):
+    from bs4 import BeautifulSoup
+
+    with profile_stage('parse.tree'):
+        soup = BeautifulSoup(content, 'html.parser')
+
+    # check if the game side is Radiant or Dire
+    res = soup.find('a', string=key_player)
+    if 'radiant' in str(res).lower():
+        side = 'radiant'
+        side_against = 'dire'
+    else:
+        side = 'dire'
+        side_against = 'radiant'
+
+    # parse the time of the game, the the year-month-day
+    # <time datetime="2025-11-15T17:24:12+00:00" title="Sat, 15 Nov 2025 17:24:12 +0000" data-time-ago="2025-11-15T17:24:12+00:00">13 hours ago</time>
+    time_span = soup.find('time')
+    game_time = time_span['datetime']
+
+    # find the player and hero name
+    player_section = soup.find('section', class_=side)
+    player_section_against = soup.find('section', class_=side_against)
+    hero_players = dict()
+    hero_players_against = dict()
+
+    for player in player_section.find_all('tr', class_=f'faction-{side}'):
+        hero = player.find('img', class_='image-hero image-icon')
+        hero_name = hero['title'].replace("'", "")
+        player_name = player.find('a', class_=f'player-{side}')
+        hero_players[hero_name] = player_name.get_text(strip=True)
+    for player in player_section_against.find_all('tr', class_=f'faction-{side_against}'):
+        hero = player.find('img', class_='image-hero image-icon')
+        hero_name = hero['title'].replace("'", "")
+        player_name = player.find('a', class_=f'player-{side_against}')
+        hero_players_against[hero_name] = player_name.get_text(strip=True)
+
+    # Assuming events are in a specific HTML structure, e.g., <div class="event">
+    soup = soup.find('div', class_='match-log')
+
+    hero_events = dict()
+    observer_ward_cnt = 0
+    # vision lines of both factions, to pair the key faction's wards with their destruction
+    vision = []
+    ward_events = {}
+
+    for event_div in soup.find_all('div', class_='event'):
+        data_div = event_div.find('div', class_='line')
+        if data_div is None:
+            continue
+        record = _bs4_vision_record(data_div)
+        if record is not None:
+            vision.append(record)
+        record_idx = len(vision) - 1 if record is not None else None
+
+        heros = data_div.find_all('a', class_=f'color-faction-{side}')
+        if len(heros) == 0:
+            # not the action we are interested in
+            continue
+
+        event = {}
+        event['time'] = data_div.find('span', class_='time').get_text(strip=True) if data_div.find('span', class_='time') else None
+        event['time_s'] = to_seconds(event['time'])
+
+        action = data_div.find('div', class_='event').get_text()
+        # remove extra \n and spaces in action
+        action = ' '.join(action.split())
+
+        event['action'] = action
+        event['key_action'] = None
+        if 'placed a Observer Ward' in action:
+            event['key_action'] = 'placed_observer'
+            observer_ward_cnt += 1
+            event['observer_ward_cnt'] = observer_ward_cnt
+        elif 'activated Smoke of Deceit to stealth' in action:
+            event['key_action'] = 'smoke'
+        elif 'placed a Sentry Ward' in action:
+            event['key_action'] = 'placed_sentry'
+        else:
+            continue
+
+        hero_names = set()
+        for hero in heros:
+            # hero_name is in <img> alt tag
+            hero_name = hero.find('img')['alt']
+            if hero_name not in hero_events:
+                hero_events[hero_name] = []
+            hero_names.add(hero_name)
+
+        pos_span = data_div.find('span', class_='minimap-tooltip')
+        map_item = pos_span.find('span', class_='map-item')
+
+        style = map_item['style']
+        left_str = style.split('left:')[1].split('%')[0].strip()
+        top_str = style.split('top:')[1].split('%')[0].strip()
+        event['position'] = {
+            'left_percent': float(left_str),
+            'top_percent': float(top_str)
+        }
+
+        left = float(left_str) * 0.01 * map_width
+        top = float(top_str) * 0.01 * map_height
+        event['position_px'] = (int(left), int(top))
+
+        for hero_name in list(hero_names):
+            hero_events[hero_name].append(event)
+        if event['key_action'] != 'smoke' and record_idx is not None:
+            ward_events[record_idx] = event
+
+    for i, (lifetime_s, status, _) in pair_wards(vision).items():
+        if i in ward_events:
+            ward_events[i]['lifetime_s'] = lifetime_s
+            ward_events[i]['ward_status'] = status
+
+    return hero_events, hero_players, hero_players_against, game_time, side
+
+
+def _bs4_vision_record(data_div):
+    """
+    kind, side, time_s and position of a vision line of either faction, the
+    fields pair_wards reads; None for other lines.
+    """
+    action_div = data_div.find('div', class_='event')
+    time_span = data_div.find('span', class_='time')
+    pos_span = data_div.find('span', class_='minimap-tooltip')
+    map_item = pos_span.find('span', class_='map-item') if pos_span else None
+    if action_div is None or time_span is None or map_item is None or not map_item.get('style'):
+        return None
+    kind = classify_action(' '.join(action_div.get_text().split()))
+    if kind is None:
+        return None
+    side = next((s for s in SIDES if data_div.find('a', class_=f'color-faction-{s}')), None)
+    style = map_item['style']
+    return {
+        'kind': kind,
+        'side': side,
+        'time_s': to_seconds(time_span.get_text(strip=True)),
+        'position': {
+            'left_percent': float(style.split('left:')[1].split('%')[0].strip()),
+            'top_percent': float(style.split('top:')[1].split('%')[0].strip()),
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# fast backend
+# ---------------------------------------------------------------------------
+
+# the actions parse_events has always kept
+KEY_PLAYER_KINDS = ('placed_observer', 'smoke', 'placed_sentry')
+
+
+def key_player_view(page, key_player):
+    """
+    The ``parse_events`` tuple of the key player's faction, filtered from an
+    ``extract_page`` result. Observer wards are numbered in placement order,
+    and placed wards carry their lifetime (see utils/lifetimes.py).
+    """
+    if any(player == key_player for player in page['hero_players']['radiant'].values()):
+        side = 'radiant'
+        side_against = 'dire'
+    else:
+        side = 'dire'
+        side_against = 'radiant'
+
+    hero_events = dict()
+    observer_ward_cnt = 0
+    # destructions are only logged on the enemy's lines, pair on the events of both factions
+    lifetimes = pair_wards(page['events'])
+    for i, extracted in enumerate(page['events']):
+        if extracted['side'] != side or extracted['kind'] not in KEY_PLAYER_KINDS:
+            continue
+        event = {
+            'time': extracted['time'],
+            'time_s': extracted['time_s'],
+            'action': extracted['action'],
+            'key_action': extracted['kind'],
+        }
+        if event['key_action'] == 'placed_observer':
+            observer_ward_cnt += 1
+            event['observer_ward_cnt'] = observer_ward_cnt
+        event['position'] = dict(extracted['position'])
+        event['position_px'] = extracted['position_px']
+        if i in lifetimes:
+            event['lifetime_s'], event['ward_status'], _ = lifetimes[i]
+        # the same event object is listed under every hero involved
+        for hero_name in dict.fromkeys(extracted['heroes']):
+            hero_events.setdefault(hero_name, []).append(event)
+
+    return hero_events, dict(page['hero_players'][side]), dict(page['hero_players'][side_against]), page['game_time'], side
+
+
+def parse_events_fast(content, map_width, map_height, key_player):
+    return key_player_view(extract_page(content, map_width, map_height), key_player)
+
+
+PARSERS = {
+    'fast': parse_events_fast,
+    'bs4': parse_events_bs4,
+}
+
+
+def get_parser(name=DEFAULT_PARSER):
+    if name not in PARSERS:
+        raise ValueError(f'unknown parser backend: {name}, choose from {list(PARSERS)}')
+    return PARSERS[name]
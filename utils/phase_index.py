@@ -0,0 +1,75 @@
+"""
+Events of several games grouped by (phase, action) in a single pass.
+
+Time-slot renders used to scan every event of every game once per slot.
+``PhaseIndex`` looks at each event once, finds its phase with a binary search
+over the phase edges of its action and appends it to the bucket of that
+(phase, action) pair, keeping one list per game in the original event order.
+Rendering a phase then only touches the events drawn in it, so finer phases
+do not multiply the work.
+"""
+import bisect
+
+
+def phase_edges(minutes, before_first=True, after_last=False):
+    """
+    Phase edges in seconds from boundaries in minutes, e.g. [0, 6, 12] gives
+    the phases <0, 0-6 and 6-12. before_first / after_last add an open phase
+    before the first / after the last boundary.
+    """
+    edges = [m * 60 for m in minutes]
+    if before_first:
+        edges.insert(0, float('-inf'))
+    if after_last:
+        edges.append(float('inf'))
+    return edges
+
+
+def phase_label(edges, phase):
+    """
+    '<0 min', '0-6 min', '40-end min': the first phase is labeled by its end.
+    """
+    start, end = edges[phase], edges[phase + 1]
+    if phase == 0:
+        return f'<{end // 60:g} min'
+    if end == float('inf'):
+        return f'{start // 60:g}-end min'
+    return f'{start // 60:g}-{end // 60:g} min'
+
+
+class PhaseIndex:
+
+    def __init__(self, games_events, edges_by_action, side=None, action_key='key_action'):
+        """
+        games_events is one event list per game; edges_by_action gives the
+        phase edges (seconds, ascending) of every action to index. Events
+        outside the edges, of other actions or (with side) of the other side
+        are left out.
+        """
+        self.edges = {action: list(edges) for action, edges in edges_by_action.items()}
+        self.game_num = len(games_events)
+        self.buckets = {}
+        for game_idx, events in enumerate(games_events):
+            for event in events:
+                edges = self.edges.get(event[action_key])
+                if edges is None or (side is not None and event['side'] != side):
+                    continue
+                phase = bisect.bisect_right(edges, event['time_s']) - 1
+                if phase < 0 or phase >= len(edges) - 1:
+                    continue
+                key = (phase, event[action_key])
+                if key not in self.buckets:
+                    self.buckets[key] = [[] for _ in range(self.game_num)]
+                self.buckets[key][game_idx].append(event)
+
+    def phase_num(self, action):
+        return len(self.edges[action]) - 1
+
+    def label(self, action, phase):
+        return phase_label(self.edges[action], phase)
+
+    def games(self, phase, action):
+        """
+        One event list per game (possibly empty) for a phase of an action.
+        """
+        return self.buckets.get((phase, action), [[] for _ in range(self.game_num)])
@@ -0,0 +1,163 @@
+"""
+Opt-in per-stage and per-file profiling of the ingest-and-render pipeline.
+
+Pipeline code marks its stages with
+
+    with profile_stage('read'):
+        ...
+
+which is a shared no-op context manager unless ``enable_profiler()`` was
+called (``vision_smoke_moving.py --profile``), so the marks can stay in
+production runs. When enabled every stage records its call count, wall time,
+self time (wall time minus nested stages) and, with tracemalloc, the peak
+traced memory while it was open. A stage opened with ``file=`` charges itself
+and every nested stage to that file, so the same calls, time and peak memory
+are also kept per file and per stage of each file, which gives the slowest
+pages.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+_NULL_STAGE = nullcontext()
+
+
+class _DisabledProfiler:
+    enabled = False
+
+    def stage(self, name, file=None):
+        return _NULL_STAGE
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.files = {}
+        # open stages, innermost last: [file, child seconds, peak bytes]
+        self._open = []
+        self.started = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _fold_peak(self):
+        # tracemalloc only has one peak, fold it into every open stage before it is reset
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in self._open:
+            frame[2] = max(frame[2], peak)
+
+    @contextmanager
+    def stage(self, name, file=None):
+        if file is None and self._open:
+            file = self._open[-1][0]
+        if self.trace_memory:
+            self._fold_peak()
+            tracemalloc.reset_peak()
+        frame = [file, 0.0, 0]
+        self._open.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.trace_memory:
+                self._fold_peak()
+            self._open.pop()
+            if self._open:
+                self._open[-1][1] += elapsed
+            self._record(name, file, elapsed, elapsed - frame[1], frame[2], outermost=file is not None and (not self._open or self._open[-1][0] != file))
+
+    def _record(self, name, file, seconds, self_seconds, peak_bytes, outermost=False, calls=1):
+        stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'peak_bytes': 0})
+        stats['calls'] += calls
+        stats['seconds'] += seconds
+        stats['self_seconds'] += self_seconds
+        stats['peak_bytes'] = max(stats['peak_bytes'], peak_bytes)
+        if file is None:
+            return
+        file_stats = self.files.setdefault(str(file), {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0, 'stages': {}})
+        stage_stats = file_stats['stages'].setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0})
+        stage_stats['calls'] += calls
+        stage_stats['seconds'] += seconds
+        stage_stats['peak_bytes'] = max(stage_stats['peak_bytes'], peak_bytes)
+        if outermost:
+            # the stage that opened the file, e.g. one parse_file call
+            file_stats['calls'] += calls
+            file_stats['seconds'] += seconds
+            file_stats['peak_bytes'] = max(file_stats['peak_bytes'], peak_bytes)
+
+    def merge(self, data):
+        """
+        Add the stages and files of another profiler's ``data()``, e.g. from a worker process.
+        """
+        for name, stats in data['stages'].items():
+            self._record(name, None, stats['seconds'], stats['self_seconds'], stats['peak_bytes'], calls=stats['calls'])
+        for file, file_stats in data['files'].items():
+            own = self.files.setdefault(file, {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0, 'stages': {}})
+            own['calls'] += file_stats['calls']
+            own['seconds'] += file_stats['seconds']
+            own['peak_bytes'] = max(own['peak_bytes'], file_stats['peak_bytes'])
+            for name, stats in file_stats['stages'].items():
+                own_stage = own['stages'].setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0})
+                own_stage['calls'] += stats['calls']
+                own_stage['seconds'] += stats['seconds']
+                own_stage['peak_bytes'] = max(own_stage['peak_bytes'], stats['peak_bytes'])
+
+    def data(self):
+        return {
+            'total_seconds': time.perf_counter() - self.started,
+            'trace_memory': self.trace_memory,
+            'stages': self.stages,
+            'files': self.files,
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.data(), f, indent=2)
+
+    def summary(self, top_files=10):
+        lines = [f'{"stage":<24}{"calls":>8}{"total s":>10}{"self s":>10}{"peak MB":>10}']
+        for name, stats in sorted(self.stages.items(), key=lambda x: -x[1]['seconds']):
+            peak = f'{stats["peak_bytes"] / 1e6:.1f}' if self.trace_memory else '-'
+            lines.append(f'{name:<24}{stats["calls"]:>8}{stats["seconds"]:>10.3f}{stats["self_seconds"]:>10.3f}{peak:>10}')
+        slowest = sorted(self.files.items(), key=lambda x: -x[1]['seconds'])[:top_files]
+        if slowest:
+            lines.append(f'slowest {len(slowest)} of {len(self.files)} files:')
+            for file, file_stats in slowest:
+                peak = f'  {file_stats["peak_bytes"] / 1e6:6.1f} MB' if self.trace_memory else ''
+                lines.append(f'{file_stats["seconds"]:>8.3f}s{peak}  {file_stats["calls"]}x  {file}')
+        lines.append(f'total {time.perf_counter() - self.started:.2f}s')
+        return '\n'.join(lines)
+
+
+_profiler = _DisabledProfiler()
+
+
+def enable_profiler(trace_memory=True):
+    """
+    Start collecting in this process, replaces any previous profiler.
+    """
+    global _profiler
+    _profiler = Profiler(trace_memory)
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def profile_stage(name, file=None):
+    return _profiler.stage(name, file)
+
+
+def profiled_call(func, trace_memory, *args):
+    """
+    Run func(*args) in a pool worker with a fresh profiler, returns (result, profiler data).
+    """
+    profiler = enable_profiler(trace_memory)
+    result = func(*args)
+    return result, profiler.data()
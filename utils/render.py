@@ -0,0 +1,315 @@
+"""
+Layer-based renderer for the ward / smoke maps of vision_smoke_moving.py.
+
+Every selected game is rasterized once into its own overlay layer (BGR pixels
+premultiplied by an alpha mask, cropped to the area the game touches). Output
+images are composited from the base map and the selected layers, so changing
+``--top-n``, the game selection or the side only re-composites cached layers
+instead of redrawing every circle, label and arrow.
+"""
+import hashlib
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from utils.encode import fingerprint
+from utils.event_store import KINDS, rows_by_game, summary_to_columns
+from utils.game_store import GameStore
+from utils.profiler import profile_stage
+from utils.timeline import ward_window_mask
+from utils.vis import draw_arrow_fixed_tip
+
+
+GAME_COLORS = [
+    (0, 0, 255),
+    (0, 255, 0),
+    # (255, 0, 0),
+    (255, 255, 0),
+    (255, 0, 255),
+    # (0, 255, 255),
+    (0, 128, 255),
+    (128, 0, 255),
+    (128, 128, 255),
+    (128, 255, 0),
+    (255, 128, 0),
+    (255, 128, 128),
+    (255, 0, 128),
+    (128, 0, 128),
+    (128, 128, 128),
+    (128, 255, 255),
+    (255, 128, 255),
+    (255, 255, 128),
+    (255, 255, 255),
+]
+# smoke color is purple
+SMOKE_COLOR = (173, 13, 106)
+# observer ward color is yellow
+OBSERVER_WARD_COLOR = (0, 255, 255)
+SENTRY_WARD_COLOR = (255, 0, 0)
+KIND_COLORS = {
+    'smoke': SMOKE_COLOR,
+    'placed_observer': OBSERVER_WARD_COLOR,
+    'placed_sentry': SENTRY_WARD_COLOR,
+}
+
+SIDE_LABEL_OFFSET = {'dire': 40, 'radiant': -25}
+
+
+def _draw_game(img, color, game_id, game_idx, rows, columns, offset):
+    """
+    Draw one game exactly like the original render loop: events grouped by
+    hero with arrows between successive events, then the game id label.
+    color is the game color for a BGR image or a scalar for the alpha mask.
+    """
+    mask_mode = not isinstance(color, tuple)
+    last_hero = None
+    last_position_px = None
+    for r in rows:
+        # rows are grouped by hero, the arrow chain restarts for every hero
+        if columns['hero'][r] != last_hero:
+            last_hero = columns['hero'][r]
+            last_position_px = None
+
+        key_action = KINDS[columns['kind'][r]]
+        position_px = (columns['x_px'][r], columns['y_px'][r])
+        text_pos = (position_px[0]-50, position_px[1]+offset)
+        label = columns['time'][r]
+        if key_action == 'placed_observer':
+            label += f"[{str(columns['ward_cnt'][r])}]"
+        cv2.circle(img, position_px, 10, color if mask_mode else KIND_COLORS[key_action], -1)
+        cv2.putText(img, label, text_pos, cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+
+        if last_position_px is not None:
+            draw_arrow_fixed_tip(img, last_position_px, position_px, color, 2)
+        last_position_px = position_px
+
+    # set gray background for the game id
+    cv2.rectangle(img, (img.shape[1] - 260, game_idx * 40+20), (img.shape[1]-40, game_idx * 40 + 70), color if mask_mode else (128, 128, 128), -1)
+    cv2.putText(img, f'{game_id}', (img.shape[1] - 250, game_idx * 40 + 50), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+
+
+def draw_game_layer(shape, game_id, game_idx, rows, columns, offset):
+    """
+    Rasterize one game into a layer: (y0, x0, premultiplied BGR crop, alpha crop).
+    """
+    height, width = shape[:2]
+    color = GAME_COLORS[game_idx]
+    layer = np.zeros((height, width, 3), dtype=np.uint8)
+    alpha = np.zeros((height, width), dtype=np.uint8)
+    _draw_game(layer, color, game_id, game_idx, rows, columns, offset)
+    _draw_game(alpha, 255, game_id, game_idx, rows, columns, offset)
+
+    ys, xs = np.nonzero(alpha)
+    if len(ys) == 0:
+        return 0, 0, layer[:0, :0], alpha[:0, :0]
+    y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+    # opaque pixels take the exact layer color, antialiased edges blend with the map
+    return int(y0), int(x0), layer[y0:y1, x0:x1].copy(), alpha[y0:y1, x0:x1].copy()
+
+
+def game_layer_key(game_id, game_idx, rows, columns, offset, shape):
+    h = hashlib.sha1(f'{game_id}|{game_idx}|{offset}|{shape[0]}x{shape[1]}'.encode('utf-8'))
+    for r in rows:
+        h.update(f"|{columns['hero'][r]},{columns['kind'][r]},{columns['x_px'][r]},{columns['y_px'][r]},{columns['time'][r]},{columns['ward_cnt'][r]}".encode('utf-8'))
+    return h.hexdigest()
+
+
+class LayerCache:
+    """
+    In-memory cache of rasterized game layers, optionally persisted as
+    compressed npz files in cache_dir so later runs can reuse them.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.layers = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return self.cache_dir / f'{key}.npz'
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return int(data['y0']), int(data['x0']), data['bgr'], data['alpha']
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save(self, key, layer):
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        y0, x0, bgr, alpha = layer
+        np.savez_compressed(self._path(key), y0=y0, x0=x0, bgr=bgr, alpha=alpha)
+
+    def get(self, key, draw):
+        layer = self.layers.get(key)
+        if layer is None:
+            layer = self._load(key)
+        if layer is None:
+            self.misses += 1
+            with profile_stage('render.draw'):
+                layer = draw()
+            self._save(key, layer)
+        else:
+            self.hits += 1
+        self.layers[key] = layer
+        return layer
+
+
+def composite(base, layers):
+    """
+    Alpha-composite the layers over a copy of base, in order.
+    """
+    out = base.copy()
+    for y0, x0, bgr, alpha in layers:
+        if bgr.size == 0:
+            continue
+        h, w = alpha.shape
+        region = out[y0:y0 + h, x0:x0 + w]
+        opaque = alpha == 255
+        region[opaque] = bgr[opaque]
+        edge = (alpha > 0) & ~opaque
+        if edge.any():
+            a = alpha[edge].astype(np.float32)[:, None] / 255.0
+            # layer pixels were drawn over black, i.e. they are premultiplied
+            region[edge] = np.clip(region[edge] * (1.0 - a) + bgr[edge], 0, 255).astype(np.uint8)
+    return out
+
+
+def composite_rgba(shape, layers):
+    """
+    The layers over a transparent canvas, as a BGRA image with straight alpha.
+    """
+    height, width = shape[:2]
+    bgr = np.zeros((height, width, 3), dtype=np.float32)
+    alpha = np.zeros((height, width), dtype=np.float32)
+    for y0, x0, layer_bgr, layer_alpha in layers:
+        if layer_bgr.size == 0:
+            continue
+        h, w = layer_alpha.shape
+        a = layer_alpha.astype(np.float32) / 255.0
+        # premultiplied "over"
+        region = bgr[y0:y0 + h, x0:x0 + w]
+        region *= (1.0 - a)[:, :, None]
+        region += layer_bgr
+        region_alpha = alpha[y0:y0 + h, x0:x0 + w]
+        region_alpha *= 1.0 - a
+        region_alpha += a
+    out = np.zeros((height, width, 4), dtype=np.uint8)
+    drawn = alpha > 0
+    out[drawn, :3] = np.clip(bgr[drawn] / alpha[drawn][:, None], 0, 255).astype(np.uint8)
+    out[:, :, 3] = np.clip(alpha * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    return out
+
+
+def select_game_rows(events_summary, side, top_n=None):
+    """
+    events_summary rows of one side in their original order, at most top_n of them.
+    A GameStore answers from its side index instead of scanning the rows.
+    """
+    if isinstance(events_summary, GameStore):
+        return events_summary.select(side=side, limit=top_n)
+    selected = []
+    for game_event in events_summary:
+        if game_event['side'] != side:
+            continue
+        selected.append(game_event)
+        if top_n is not None and len(selected) >= top_n:
+            break
+    return selected
+
+
+def select_games(events_summary, side, top_n=None):
+    """
+    Game ids of one side in events_summary order, at most top_n of them.
+    """
+    return [game_event['game_id'] for game_event in select_game_rows(events_summary, side, top_n)]
+
+
+def ward_map_layers(shape, events_summary, columns, game_rows, side, top_n, layer_cache=None):
+    """
+    The game layers of one side's ward map, in drawing order.
+    """
+    if layer_cache is None:
+        layer_cache = LayerCache()
+    offset = SIDE_LABEL_OFFSET[side]
+
+    layers = []
+    for game_idx, game_id in enumerate(select_games(events_summary, side, top_n)):
+        rows = game_rows.get(int(game_id), [])
+        key = game_layer_key(game_id, game_idx, rows, columns, offset, shape)
+        layers.append(layer_cache.get(key, lambda: draw_game_layer(shape, game_id, game_idx, rows, columns, offset)))
+    return layers
+
+
+def ward_map_title(team_name, side, max_ward_cnt, top_n):
+    title = f'{team_name}-{side}-Wards<={max_ward_cnt}'
+    if top_n is not None:
+        title += f'-Top {top_n} Games'
+    return title
+
+
+def render_ward_map(dota_map, events_summary, columns, game_rows, side, max_ward_cnt, top_n, team_name, layer_cache=None):
+    """
+    Composite the ward map of one side and return (title, image).
+    events_summary gives the game order, game_rows the selected rows per game id.
+    """
+    layers = ward_map_layers(dota_map.shape, events_summary, columns, game_rows, side, top_n, layer_cache)
+    with profile_stage('render.composite'):
+        vis_map = composite(dota_map, layers)
+
+    title = ward_map_title(team_name, side, max_ward_cnt, top_n)
+    cv2.putText(vis_map, f'{title}', (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 200), 2)
+    cv2.putText(vis_map, 'Made by SPACE', (vis_map.shape[1] - 300, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (200, 0, 0), 2)
+    return title, vis_map
+
+
+def _selected_columns(events_summary, side, max_ward_cnt, top_n):
+    selected = select_game_rows(events_summary, side, top_n)
+    _, event_columns = summary_to_columns(selected)
+    game_rows = rows_by_game(event_columns, ward_window_mask(event_columns, max_ward_cnt))
+    columns = {k: v.tolist() for k, v in event_columns.items()}
+    return selected, columns, game_rows
+
+
+def render_side(dota_map, events_summary, side, max_ward_cnt, top_n, team_name, layer_cache=None):
+    """
+    Like render_ward_map, but only flattens and filters the games that end up
+    in the image, so the cost does not grow with the size of events_summary.
+    """
+    selected, columns, game_rows = _selected_columns(events_summary, side, max_ward_cnt, top_n)
+    return render_ward_map(dota_map, selected, columns, game_rows, side, max_ward_cnt, top_n, team_name, layer_cache)
+
+
+def ward_map_key(shape, events_summary, columns, game_rows, side, max_ward_cnt, top_n, team_name):
+    """
+    Fingerprint of everything render_ward_map draws over the map: the layer
+    keys of the selected games (ids, order and drawn rows) and the title.
+    """
+    offset = SIDE_LABEL_OFFSET[side]
+    keys = [game_layer_key(game_id, game_idx, game_rows.get(int(game_id), []), columns, offset, shape)
+            for game_idx, game_id in enumerate(select_games(events_summary, side, top_n))]
+    return fingerprint(ward_map_title(team_name, side, max_ward_cnt, top_n), *keys)
+
+
+def side_render_key(shape, events_summary, side, max_ward_cnt, top_n, team_name):
+    """
+    ward_map_key of render_side, again only flattening the selected games.
+    """
+    selected, columns, game_rows = _selected_columns(events_summary, side, max_ward_cnt, top_n)
+    return ward_map_key(shape, selected, columns, game_rows, side, max_ward_cnt, top_n, team_name)
+
+
+def render_side_overlay(shape, events_summary, side, max_ward_cnt, top_n, layer_cache=None):
+    """
+    The games of one side without map and title, as a transparent BGRA image for tiling.
+    """
+    selected, columns, game_rows = _selected_columns(events_summary, side, max_ward_cnt, top_n)
+    layers = ward_map_layers(shape, selected, columns, game_rows, side, top_n, layer_cache)
+    with profile_stage('render.composite'):
+        return composite_rgba(shape, layers)
@@ -0,0 +1,129 @@
+"""
+Match page sources: saved pages in a directory or inside zip / tar archives.
+
+``list_sources`` turns data directories and archives into one list of page
+sources. Pages on disk are plain ``Path`` objects; pages inside an archive are
+``ArchiveMember`` objects with the part of the ``Path`` interface the ingest
+stage uses (``name``, ``stem``, ``read_bytes``, ``read_text``), so
+``game_id_from_path`` and ``parse_file`` work on both without extracting.
+
+An ``ArchiveMember`` only holds the archive path and the member name, so it
+can be sent to worker processes; every process opens the archive itself (once)
+and reads its members directly. Compressed tars can only be read front to back,
+``read_order`` gives the order in which their members are cheapest to read.
+"""
+import fnmatch
+import io
+import os
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+
+
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# (archive path, pid) -> open ZipFile / TarFile, a forked worker must not share the parent's file offset
+_handles = {}
+
+
+def decode_text(content, encoding='utf-8'):
+    # same newline handling as reading the file in text mode
+    return io.TextIOWrapper(io.BytesIO(content), encoding=encoding).read()
+
+
+def is_archive(path):
+    name = Path(path).name.lower()
+    return name.endswith(ZIP_SUFFIXES) or name.endswith(TAR_SUFFIXES)
+
+
+def _open_archive(archive):
+    key = (archive, os.getpid())
+    handle = _handles.get(key)
+    if handle is None:
+        if archive.lower().endswith(ZIP_SUFFIXES):
+            handle = zipfile.ZipFile(archive)
+        else:
+            handle = tarfile.open(archive, 'r:*')
+        _handles[key] = handle
+    return handle
+
+
+class ArchiveMember:
+    """
+    One page inside a zip / tar archive.
+    """
+    __slots__ = ('archive', 'member', 'index')
+
+    def __init__(self, archive, member, index):
+        self.archive = str(archive)
+        self.member = member
+        # position in the archive listing, see read_order
+        self.index = index
+
+    @property
+    def name(self):
+        return PurePosixPath(self.member).name
+
+    @property
+    def stem(self):
+        return PurePosixPath(self.member).stem
+
+    def read_bytes(self):
+        handle = _open_archive(self.archive)
+        if isinstance(handle, zipfile.ZipFile):
+            return handle.read(self.member)
+        return handle.extractfile(self.member).read()
+
+    def read_text(self, encoding='utf-8'):
+        return decode_text(self.read_bytes(), encoding)
+
+    def __eq__(self, other):
+        return isinstance(other, ArchiveMember) and (self.archive, self.member) == (other.archive, other.member)
+
+    def __hash__(self):
+        return hash((self.archive, self.member))
+
+    def __str__(self):
+        return f'{self.archive}!{self.member}'
+
+    def __repr__(self):
+        return f'ArchiveMember({self.archive!r}, {self.member!r})'
+
+
+def archive_members(archive, pattern='*.html'):
+    """
+    Members of a zip / tar archive whose file name matches pattern.
+    """
+    archive = str(archive)
+    handle = _open_archive(archive)
+    if isinstance(handle, zipfile.ZipFile):
+        names = [info.filename for info in handle.infolist() if not info.is_dir()]
+    else:
+        names = [info.name for info in handle.getmembers() if info.isfile()]
+    return [ArchiveMember(archive, name, i) for i, name in enumerate(names) if fnmatch.fnmatch(PurePosixPath(name).name, pattern)]
+
+
+def list_sources(paths, pattern='*.html'):
+    """
+    Page sources of every data directory and archive in paths.
+    """
+    sources = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            sources.extend(path.glob(pattern))
+        elif is_archive(path):
+            sources.extend(archive_members(path, pattern))
+        else:
+            raise ValueError(f'{path} is neither a directory nor a zip / tar archive')
+    return sources
+
+
+def read_order(source):
+    """
+    Sort key reading archive members in listing order, files keep their order.
+    """
+    if isinstance(source, ArchiveMember):
+        return (source.archive, source.index)
+    return ('', 0)
@@ -0,0 +1,187 @@
+"""
+Spatial-temporal index over parsed vision events.
+
+Answers questions like "which wards did this team place within 80 px of the
+Roshan pit between 12 and 20 minutes, across all games" without scanning
+every event. Events are bucketed into a uniform grid over ``position_px``;
+inside every cell the rows are sorted by game time, so a query only touches
+the cells overlapping the search area and binary-searches the time window in
+each of them.
+
+    python -m utils.spatial_index radius --store output_yb/event_store --x 420 --y 560 --r 80 --start 12:00 --end 20:00
+    python -m utils.spatial_index rect --team yb --x0 0 --y0 0 --x1 300 --y1 300 --kind placed_observer
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from utils.event_store import KINDS, SIDES, load_event_store, summary_to_columns, unique_event_mask
+from utils.timeline import to_seconds
+
+
+DEFAULT_CELL_SIZE = 32
+
+
+class SpatialIndex:
+
+    def __init__(self, events, cell_size=DEFAULT_CELL_SIZE, unique=True):
+        """
+        events are event store columns. Every (event, hero) row is indexed;
+        with unique, a query returns an event shared by several heroes once,
+        under its first hero that passes the filters.
+        """
+        self.events = events
+        self.cell_size = cell_size
+        self.unique = unique
+        rows = np.arange(len(events['game_id']))
+
+        x = events['x_px'][rows]
+        y = events['y_px'][rows]
+        self.nx = int(x.max()) // cell_size + 1 if len(rows) else 1
+        self.ny = int(y.max()) // cell_size + 1 if len(rows) else 1
+        cell = (y // cell_size) * self.nx + (x // cell_size)
+
+        # sort by cell, then by time inside the cell
+        order = np.lexsort((events['time_s'][rows], cell))
+        self.rows = rows[order]
+        self.cell_of_row = cell[order]
+        self.time_s = events['time_s'][self.rows]
+        self.cell_start = np.searchsorted(self.cell_of_row, np.arange(self.nx * self.ny + 1))
+
+    @classmethod
+    def from_summary(cls, events_summary, **kwargs):
+        return cls(summary_to_columns(events_summary)[1], **kwargs)
+
+    def _candidates(self, x0, y0, x1, y1, start, end):
+        cx0 = max(int(x0) // self.cell_size, 0)
+        cy0 = max(int(y0) // self.cell_size, 0)
+        cx1 = min(int(x1) // self.cell_size, self.nx - 1)
+        cy1 = min(int(y1) // self.cell_size, self.ny - 1)
+        chunks = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                c = cy * self.nx + cx
+                lo, hi = self.cell_start[c], self.cell_start[c + 1]
+                if lo == hi:
+                    continue
+                if start is not None:
+                    lo = lo + np.searchsorted(self.time_s[lo:hi], start, side='left')
+                if end is not None:
+                    hi = lo + np.searchsorted(self.time_s[lo:hi], end, side='left')
+                if lo < hi:
+                    chunks.append(self.rows[lo:hi])
+        if len(chunks) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def _filter(self, rows, side, hero, kind, game_ids):
+        mask = np.ones(len(rows), dtype=bool)
+        if side is not None:
+            mask &= self.events['side'][rows] == SIDES.index(side)
+        if kind is not None:
+            mask &= self.events['kind'][rows] == KINDS.index(kind)
+        if hero is not None:
+            mask &= self.events['hero'][rows] == hero
+        if game_ids is not None:
+            mask &= np.isin(self.events['game_id'][rows], np.array([int(g) for g in game_ids], dtype=np.int64))
+        rows = rows[mask]
+        if self.unique and len(rows):
+            # dedupe after the hero filter, so events a hero shares as second hero are kept
+            rows = np.sort(rows)
+            rows = rows[unique_event_mask({name: self.events[name][rows] for name in ('game_id', 'event_idx')})]
+        return rows
+
+    def _sorted(self, rows):
+        order = np.lexsort((self.events['time_s'][rows], self.events['game_id'][rows]))
+        return rows[order]
+
+    def query_radius(self, x, y, r, start=None, end=None, side=None, hero=None, kind=None, game_ids=None):
+        """
+        Rows within r pixels of (x, y) and start <= time_s < end, sorted by game and time.
+        """
+        rows = self._candidates(x - r, y - r, x + r, y + r, start, end)
+        dx = self.events['x_px'][rows] - x
+        dy = self.events['y_px'][rows] - y
+        rows = rows[dx * dx + dy * dy <= r * r]
+        return self._sorted(self._filter(rows, side, hero, kind, game_ids))
+
+    def query_rect(self, x0, y0, x1, y1, start=None, end=None, side=None, hero=None, kind=None, game_ids=None):
+        """
+        Rows with x0 <= x <= x1, y0 <= y <= y1 and start <= time_s < end.
+        """
+        rows = self._candidates(x0, y0, x1, y1, start, end)
+        x = self.events['x_px'][rows]
+        y = self.events['y_px'][rows]
+        rows = rows[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)]
+        return self._sorted(self._filter(rows, side, hero, kind, game_ids))
+
+    def records(self, rows):
+        return [{
+            'game_id': str(self.events['game_id'][r]),
+            'side': SIDES[self.events['side'][r]],
+            'hero': self.events['hero'][r],
+            'player': self.events['player'][r],
+            'time': self.events['time'][r],
+            'time_s': int(self.events['time_s'][r]),
+            'key_action': KINDS[self.events['kind'][r]],
+            'position_px': (int(self.events['x_px'][r]), int(self.events['y_px'][r])),
+        } for r in rows]
+
+
+def parse_time_arg(value):
+    # '12' (minutes), '12:30' or '-00:30'
+    if ':' in value:
+        return to_seconds(value)
+    return int(float(value) * 60)
+
+
+def _load_events(args):
+    if args.store is not None:
+        _, events = load_event_store(args.store)
+        return events
+
+    import cv2
+    from utils.ingest import game_id_from_path, parse_games
+    from utils.parse_cache import ParseCache
+
+    games = sorted(Path(f'data_{args.team}').glob('*.html'), key=lambda x: int(game_id_from_path(x)), reverse=True)
+    map_height, map_width, _ = cv2.imread('dota2_map.jpg').shape
+    events_summary = parse_games(games, map_width, map_height, args.player, jobs=args.jobs, cache=ParseCache())
+    return summary_to_columns(events_summary)[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='radius / rectangle queries over parsed vision events')
+    subparsers = parser.add_subparsers(dest='query', required=True)
+    radius = subparsers.add_parser('radius')
+    radius.add_argument('--x', type=int, required=True)
+    radius.add_argument('--y', type=int, required=True)
+    radius.add_argument('--r', type=int, required=True, help='radius in map pixels')
+    rect = subparsers.add_parser('rect')
+    for name in ('--x0', '--y0', '--x1', '--y1'):
+        rect.add_argument(name, type=int, required=True)
+    for sub in (radius, rect):
+        sub.add_argument('--store', type=str, default=None, help='event store written with --format store, instead of parsing data_{team}')
+        sub.add_argument('--team', type=str, default='yb')
+        sub.add_argument('--player', type=str, default='YB.BoBoKa')
+        sub.add_argument('--jobs', type=int, default=1)
+        sub.add_argument('--start', type=parse_time_arg, default=None, help='minutes or mm:ss, inclusive')
+        sub.add_argument('--end', type=parse_time_arg, default=None, help='minutes or mm:ss, exclusive')
+        sub.add_argument('--side', type=str, default=None, choices=SIDES)
+        sub.add_argument('--hero', type=str, default=None)
+        sub.add_argument('--kind', type=str, default=None, choices=KINDS)
+        sub.add_argument('--cell-size', type=int, default=DEFAULT_CELL_SIZE)
+    args = parser.parse_args()
+
+    index = SpatialIndex(_load_events(args), cell_size=args.cell_size)
+    filters = dict(start=args.start, end=args.end, side=args.side, hero=args.hero, kind=args.kind)
+    if args.query == 'radius':
+        rows = index.query_radius(args.x, args.y, args.r, **filters)
+    else:
+        rows = index.query_rect(args.x0, args.y0, args.x1, args.y1, **filters)
+
+    records = index.records(rows)
+    for record in records:
+        print(f"{record['game_id']} {record['side']:<7} {record['time']:>7} {record['key_action']:<15} {record['hero']:<20} {record['position_px']}")
+    print(f'{len(records)} events in {len(set(r["game_id"] for r in records))} games')
@@ -0,0 +1,132 @@
+"""
+Sweep mode: render every side / ward-count / top-N combination from one parse.
+
+The corpus is parsed once by the caller. Rendering fans out over a process
+pool with one task per (side, ward_cnt); each task renders all top-N values
+with the same layer cache, so the layers of the first games are drawn once
+and reused for every larger top-N. Images are written to
+
+    <out_dir>/<side>/wards_<ward_cnt>/top_<top_n>.jpg
+
+(or .png / .webp) and described in ``<out_dir>/manifest.json``. The workers
+skip images whose games did not change since the last sweep; their
+fingerprints are kept by the caller, see utils/encode.py.
+"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+
+from utils.encode import ImageWriter, fingerprint, write_image
+from utils.event_store import rows_by_game, summary_to_columns
+from utils.game_store import GameStore
+from utils.ingest import resolve_jobs
+from utils.render import LayerCache, render_ward_map, select_games, ward_map_key, ward_map_title
+from utils.timeline import ward_window_mask
+
+
+def int_list(value):
+    """
+    argparse type for '2', '1,2,5' or '1-4' (inclusive range), returns a list of ints.
+    """
+    values = []
+    for part in value.split(','):
+        part = part.strip()
+        if '-' in part[1:]:
+            start, end = part.split('-', 1)
+            values.extend(range(int(start), int(end) + 1))
+        elif part:
+            values.append(int(part))
+    if len(values) == 0:
+        raise ValueError(f'empty list: {value!r}')
+    return values
+
+
+# per-worker state, set once by _init_worker instead of being sent with every task
+_worker = {}
+
+
+def _init_worker(map_path, games, event_columns, team_name, out_dir, layer_cache_dir, image_format, quality, force):
+    _worker['dota_map'] = cv2.imread(str(map_path))
+    _worker['map_key'] = fingerprint(_worker['dota_map'])
+    _worker['games'] = GameStore(games)
+    _worker['event_columns'] = event_columns
+    _worker['columns'] = {k: v.tolist() for k, v in event_columns.items()}
+    _worker['team_name'] = team_name
+    _worker['out_dir'] = Path(out_dir)
+    _worker['layer_cache'] = LayerCache(layer_cache_dir)
+    # only reads the fingerprints of the last sweep, the caller records the new ones
+    _worker['writer'] = ImageWriter(out_dir, fmt=image_format, quality=quality, force=force)
+
+
+def _render_task(side, max_ward_cnt, top_ns):
+    """
+    Returns the manifest entries and (path, fingerprint) of every image written.
+    """
+    event_columns = _worker['event_columns']
+    writer = _worker['writer']
+    game_rows = rows_by_game(event_columns, ward_window_mask(event_columns, max_ward_cnt))
+    entries = []
+    written = []
+    for top_n in top_ns:
+        path = writer.path(Path(side) / f'wards_{max_ward_cnt}', f'top_{top_n}')
+        key = fingerprint(_worker['map_key'], ward_map_key(_worker['dota_map'].shape, _worker['games'], _worker['columns'], game_rows,
+                                                           side, max_ward_cnt, top_n, _worker['team_name']))
+        title = ward_map_title(_worker['team_name'], side, max_ward_cnt, top_n)
+        if not writer.unchanged(_worker['out_dir'] / path, key):
+            _, vis_map = render_ward_map(_worker['dota_map'], _worker['games'], _worker['columns'], game_rows,
+                                             side, max_ward_cnt, top_n, _worker['team_name'], _worker['layer_cache'])
+            # the sweep is already spread over processes, each one encodes its own images
+            write_image(_worker['out_dir'] / path, vis_map, writer.params)
+            written.append((path, key))
+        entries.append({
+            'side': side,
+            'ward_cnt': max_ward_cnt,
+            'top_n': top_n,
+            'title': title,
+            'path': path.as_posix(),
+            'game_ids': select_games(_worker['games'], side, top_n),
+        })
+    return entries, written
+
+
+def run_sweep(events_summary, map_path, out_dir, team_name, ward_cnts, top_ns, sides=('dire', 'radiant'), jobs=1, layer_cache_dir=None,
+              image_format='jpg', quality=None, force=False):
+    """
+    Render every (side, ward_cnt, top_n) combination, returns the manifest.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # the workers only need the game metadata for their GameStore, plus the event columns
+    fields = ('game_id', 'side', 'game_time', 'hero_players', 'hero_players_against')
+    games = [{k: game[k] for k in fields} for game in events_summary]
+    _, event_columns = summary_to_columns(events_summary)
+    init_args = (map_path, games, event_columns, team_name, out_dir, layer_cache_dir, image_format, quality, force)
+
+    tasks = [(side, ward_cnt, sorted(top_ns)) for side in sides for ward_cnt in ward_cnts]
+    jobs = min(resolve_jobs(jobs), len(tasks))
+    if jobs == 1:
+        _init_worker(*init_args)
+        results = [_render_task(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=init_args) as executor:
+            results = list(executor.map(_render_task, *zip(*tasks)))
+
+    writer = ImageWriter(out_dir, fmt=image_format, quality=quality)
+    for _, written in results:
+        for path, key in written:
+            writer.record(out_dir / path, key)
+    writer.save()
+
+    manifest = {
+        'team': team_name,
+        'sides': list(sides),
+        'ward_cnts': list(ward_cnts),
+        'top_ns': sorted(top_ns),
+        'game_num': len(events_summary),
+        'images': [entry for entries, _ in results for entry in entries],
+    }
+    with open(out_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
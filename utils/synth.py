@@ -0,0 +1,146 @@
+"""
+Synthetic DOTABUFF vision pages for benchmarks and local experiments.
+
+The pages only contain the markup the parsers read (``time``, the
+``section.radiant`` / ``section.dire`` player tables and the ``div.match-log``
+events with their ``span.minimap-tooltip`` / ``span.map-item`` positions),
+plus events the parsers have to skip: the other faction, item purchases and
+destroyed wards. Ward and smoke positions are drawn around a few common spots
+instead of uniformly, so renders and heatmaps look like real corpora.
+
+    python -m utils.synth data_synth --games 200 --events 150 --heroes 5
+"""
+import argparse
+import html
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+HEROES = [
+    'Abaddon', 'Axe', 'Bane', 'Batrider', 'Chen', 'Clockwerk', 'Dark Seer', 'Dawnbreaker', 'Doom', 'Earth Spirit',
+    'Earthshaker', 'Ember Spirit', 'Enchantress', 'Enigma', 'Hoodwink', 'Io', 'Jakiro', 'Keeper of the Light',
+    'Lion', 'Magnus', 'Mars', 'Marci', 'Mirana', "Nature's Prophet", 'Nyx Assassin', 'Pangolier', 'Phoenix',
+    'Primal Beast', 'Pudge', 'Rubick', 'Sand King', 'Shadow Demon', 'Snapfire', 'Spirit Breaker', 'Techies',
+    'Tiny', 'Tusk', 'Undying', 'Venomancer', 'Windranger',
+]
+
+# (left %, top %) of spots where wards and smokes are usually used
+HOTSPOTS = [
+    (25, 30), (40, 45), (55, 55), (70, 70), (35, 70), (65, 30), (50, 20), (50, 80), (20, 55), (80, 45),
+]
+
+# action text and relative frequency in the match log
+ACTIONS = [
+    ('placed a Observer Ward', 20),
+    ('placed a Sentry Ward', 25),
+    ('activated Smoke of Deceit to stealth', 6),
+    ('destroyed a Observer Ward', 10),
+    ('destroyed a Sentry Ward', 10),
+    ('purchased a Observer Ward', 15),
+    ('purchased a Smoke of Deceit', 14),
+]
+
+PAGE_NAME = 'Match {game_id} - Vision - DOTABUFF - Dota 2 Stats.html'
+
+
+def format_time(seconds):
+    sign = '-' if seconds < 0 else ''
+    seconds = abs(seconds)
+    if seconds >= 3600:
+        return f'{sign}{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+    return f'{sign}{seconds // 60:02d}:{seconds % 60:02d}'
+
+
+def _position(rng):
+    left, top = rng.choice(HOTSPOTS)
+    left = min(max(int(rng.gauss(left, 6)), 0), 100)
+    top = min(max(int(rng.gauss(top, 6)), 0), 100)
+    return left, top
+
+
+def _player_rows(side, heroes, players):
+    rows = [f'<section class="{side}"><table><tbody>']
+    for hero, player in zip(heroes, players):
+        rows.append(f'<tr class="col-hints faction-{side}"><td><img class="image-hero image-icon" title="{html.escape(hero)}" alt="{html.escape(hero)}"/></td>'
+                    f'<td><a class="player-{side} link-type-player" href="/players/0">{html.escape(player)}</a></td></tr>')
+    rows.append('</tbody></table></section>')
+    return rows
+
+
+def _event(seconds, side, heroes, action, position):
+    heroes_html = ' and '.join(
+        f'<a class="color-faction-{side}" href="/heroes/x"><img alt="{html.escape(hero)}" class="image-hero image-icon" src="/assets/heroes/x.png"/>{html.escape(hero)}</a>'
+        for hero in heroes)
+    minimap = ''
+    if position is not None:
+        minimap = f'<span class="minimap-tooltip" data-tooltip="map"><span class="map-item" style="left: {position[0]}%; top: {position[1]}%"></span></span>'
+    return (f'<div class="event"><div class="line"><span class="time">{format_time(seconds)}</span> {minimap}'
+            f'<div class="event">{heroes_html}\n  {action}&nbsp;</div></div></div>')
+
+
+def synth_page(game_id, rng, events_per_game=120, heroes_per_side=5, key_player='YB.BoBoKa', padding_kb=0):
+    """
+    One vision page as a string. key_player plays the first hero of a random side.
+    padding_kb adds inert markup to the head to mimic the weight of real pages.
+    """
+    heroes = rng.sample(HEROES, 2 * heroes_per_side)
+    heroes = {'radiant': heroes[:heroes_per_side], 'dire': heroes[heroes_per_side:]}
+    players = {side: [f'{side[0].upper()}.player{i}' for i in range(heroes_per_side)] for side in heroes}
+    players[rng.choice(['radiant', 'dire'])][0] = key_player
+    game_time = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=int(game_id) % 500000)
+
+    out = ['<!DOCTYPE html><html><head><title>Match {} - Vision - DOTABUFF</title>'.format(game_id)]
+    if padding_kb > 0:
+        out.append('<script>/*' + 'x' * (padding_kb * 1024) + '*/</script>')
+    out.append('</head><body>')
+    out.append(f'<time datetime="{game_time.isoformat()}" title="{game_time:%a, %d %b %Y %H:%M:%S %z}">{game_time:%Y-%m-%d}</time>')
+    for side in ('radiant', 'dire'):
+        out.extend(_player_rows(side, heroes[side], players[side]))
+
+    out.append('<div class="match-log"><div class="heading">Vision Log</div>')
+    actions, weights = zip(*ACTIONS)
+    # spread the events over a 35-55 minute game that starts at -01:30
+    duration = rng.randint(35 * 60, 55 * 60)
+    times = sorted(rng.randint(-90, duration) for _ in range(events_per_game))
+    for seconds in times:
+        side = rng.choice(['radiant', 'dire'])
+        action = rng.choices(actions, weights)[0]
+        who = rng.sample(heroes[side], 2 if action.startswith('activated') and rng.random() < 0.3 else 1)
+        position = None if action.startswith('purchased') else _position(rng)
+        out.append(_event(seconds, side, who, action, position))
+    out.append('</div><footer></footer></body></html>')
+    return '\n'.join(out)
+
+
+def write_corpus(out_dir, games=100, events_per_game=120, heroes_per_side=5, key_player='YB.BoBoKa', seed=0,
+                 padding_kb=0, first_game_id=8400000000):
+    """
+    Write games pages into out_dir, returns their paths (newest game first).
+    The same seed always gives the same pages.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(games):
+        game_id = first_game_id + i
+        path = out_dir / PAGE_NAME.format(game_id=game_id)
+        path.write_text(synth_page(game_id, rng, events_per_game, heroes_per_side, key_player, padding_kb), encoding='utf-8')
+        paths.append(path)
+    return paths[::-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='write synthetic DOTABUFF vision pages')
+    parser.add_argument('out_dir', type=str, help='e.g. data_synth, then run vision_smoke_moving.py --team synth')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--events', type=int, default=120, help='match log events per game, vision and others')
+    parser.add_argument('--heroes', type=int, default=5, help='heroes per side')
+    parser.add_argument('--player', type=str, default='YB.BoBoKa')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--padding-kb', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_corpus(args.out_dir, args.games, args.events, args.heroes, args.player, args.seed, args.padding_kb)
+    print(f'{len(paths)} pages written to {args.out_dir}')
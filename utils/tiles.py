@@ -0,0 +1,159 @@
+"""
+Zoomable tile pyramids of the map and the ward overlays.
+
+Every layer (the base map, each side's overlay) is cut into fixed-size tiles
+at every zoom level, from one tile showing the whole map (z=0) down to full
+resolution, and written as
+
+    <out_dir>/<layer>/<z>/<x>/<y>.<jpg|png>
+
+the XYZ layout tiled map viewers expect (e.g. Leaflet with ``L.CRS.Simple``).
+The base map is JPEG, overlays are transparent PNG so any of them can be
+stacked on the same map tiles; fully transparent overlay tiles are not
+written. Edge tiles are padded to the tile size.
+
+``<out_dir>/tiles.json`` keeps the content hash of every layer and tile.
+A layer whose source pixels did not change is skipped entirely, and within a
+changed layer only tiles whose pixels changed are encoded and written again.
+Tiles are encoded in parallel, one task per column of tiles.
+"""
+import hashlib
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from utils.ingest import resolve_jobs
+
+
+DEFAULT_TILE_SIZE = 256
+JPEG_QUALITY = 90
+
+
+def max_zoom(width, height, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Zoom level at which the image is shown at full resolution.
+    """
+    return max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+
+
+def content_hash(img):
+    h = hashlib.sha1(f'{img.shape}|{img.dtype}'.encode('utf-8'))
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+def level_image(img, z, zmax):
+    """
+    The image scaled for zoom level z, full size at zmax.
+    """
+    if z == zmax:
+        return img
+    scale = 2 ** (z - zmax)
+    height, width = img.shape[:2]
+    return cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+def _encode_column(out_dir, layer, z, x, strip, tile_size, ext, old_hashes):
+    """
+    Write the tiles of one column whose hash changed, returns ({key: hash}, written).
+    """
+    hashes = {}
+    written = 0
+    for y in range(math.ceil(strip.shape[0] / tile_size)):
+        tile = strip[y * tile_size:(y + 1) * tile_size]
+        if tile.shape[0] != tile_size or tile.shape[1] != tile_size:
+            padded = np.zeros((tile_size, tile_size, tile.shape[2]), dtype=tile.dtype)
+            padded[:tile.shape[0], :tile.shape[1]] = tile
+            tile = padded
+        if ext == 'png' and not tile[:, :, 3].any():
+            # nothing drawn here, the viewer shows the map tile alone
+            continue
+
+        key = f'{z}/{x}/{y}'
+        hashes[key] = content_hash(tile)
+        path = out_dir / layer / str(z) / str(x) / f'{y}.{ext}'
+        if old_hashes.get(key) == hashes[key] and path.exists():
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY] if ext == 'jpg' else [cv2.IMWRITE_PNG_COMPRESSION, 6]
+        cv2.imwrite(str(path), tile, params)
+        written += 1
+    return hashes, written
+
+
+def _remove_stale(out_dir, layer, ext, old_tiles, new_tiles):
+    for key in set(old_tiles) - set(new_tiles):
+        path = out_dir / layer / f'{key}.{ext}'
+        if path.exists():
+            path.unlink()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(Path(out_dir) / 'tiles.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_tile_pyramids(layers, out_dir, tile_size=DEFAULT_TILE_SIZE, jobs=1):
+    """
+    layers: {name: image}, BGR images become JPEG pyramids, BGRA images PNG
+    pyramids. All layers must have the same size. Returns {name: tiles written},
+    0 for layers that were unchanged since the last run.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    shapes = {img.shape[:2] for img in layers.values()}
+    if len(shapes) != 1:
+        raise ValueError(f'tile layers must have the same size, got {sorted(shapes)}')
+    height, width = shapes.pop()
+    zmax = max_zoom(width, height, tile_size)
+
+    manifest = load_manifest(out_dir)
+    if manifest is None or manifest['tile_size'] != tile_size or manifest['width'] != width or manifest['height'] != height:
+        manifest = {'tile_size': tile_size, 'width': width, 'height': height, 'layers': {}}
+    manifest['max_zoom'] = zmax
+
+    written = {}
+    tasks = []
+    for name, img in layers.items():
+        ext = 'png' if img.shape[2] == 4 else 'jpg'
+        source_hash = content_hash(img)
+        old = manifest['layers'].get(name, {})
+        if old.get('source_hash') == source_hash and old.get('format') == ext:
+            written[name] = 0
+            continue
+        for z in range(zmax + 1):
+            level = level_image(img, z, zmax)
+            for x in range(math.ceil(level.shape[1] / tile_size)):
+                strip = np.ascontiguousarray(level[:, x * tile_size:(x + 1) * tile_size])
+                prefix = f'{z}/{x}/'
+                old_hashes = {k: v for k, v in old.get('tiles', {}).items() if k.startswith(prefix)}
+                tasks.append((out_dir, name, z, x, strip, tile_size, ext, old_hashes))
+        manifest['layers'][name] = {'format': ext, 'source_hash': source_hash, 'old_tiles': old.get('tiles', {}), 'tiles': {}}
+        written[name] = 0
+
+    jobs = min(resolve_jobs(jobs), max(len(tasks), 1))
+    if jobs == 1:
+        results = [_encode_column(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_encode_column, *zip(*tasks)))
+
+    for task, (hashes, count) in zip(tasks, results):
+        name = task[1]
+        manifest['layers'][name]['tiles'].update(hashes)
+        written[name] += count
+    for name, layer in manifest['layers'].items():
+        old_tiles = layer.pop('old_tiles', None)
+        if old_tiles is not None:
+            _remove_stale(out_dir, name, layer['format'], old_tiles, layer['tiles'])
+
+    with open(out_dir / 'tiles.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return written
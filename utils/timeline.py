@@ -0,0 +1,73 @@
+"""
+Integer game-time helpers and batched time / ward-count filters.
+
+Events carry ``time_s`` (integer game seconds, negative before the horn) from
+parse time onward, so nothing on the render path has to split time strings
+again. The filters below work on the numpy event columns of
+``utils/event_store.py`` and evaluate every event of every game at once.
+"""
+import numpy as np
+
+
+KIND_PLACED_OBSERVER = 0
+NO_CUTOFF = np.iinfo(np.int32).max
+
+
+def to_seconds(t):
+    # '-00:42' -> -42, '12:05' -> 725, '1:02:03' -> 3723
+    negative = t[0] == '-'
+    if negative:
+        t = t[1:]
+    parts = list(map(int, t.split(':')))
+    if len(parts) not in (2, 3):
+        raise ValueError("Unsupported time format")
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return -seconds if negative else seconds
+
+
+def time_window_mask(time_s, start=None, end=None):
+    """
+    Rows with start <= time_s < end, either bound may be None.
+    """
+    mask = np.ones(len(time_s), dtype=bool)
+    if start is not None:
+        mask &= time_s >= start
+    if end is not None:
+        mask &= time_s < end
+    return mask
+
+
+def ward_cutoffs(events, max_ward_cnt):
+    """
+    Per-row cutoff time: the time of the ``max_ward_cnt``-th observer ward of
+    the row's game, or NO_CUTOFF when the game has fewer observer wards.
+    """
+    game_ids, game_idx = np.unique(events['game_id'], return_inverse=True)
+    cutoff = np.full(len(game_ids), NO_CUTOFF, dtype=np.int64)
+    is_cut = (events['kind'] == KIND_PLACED_OBSERVER) & (events['ward_cnt'] == max_ward_cnt)
+    np.minimum.at(cutoff, game_idx[is_cut], events['time_s'][is_cut])
+    return cutoff[game_idx]
+
+
+def key_hero_mask(events, max_ward_cnt):
+    """
+    Rows of heroes that placed at least one of the first ``max_ward_cnt``
+    observer wards of their game.
+    """
+    _, game_idx = np.unique(events['game_id'], return_inverse=True)
+    heroes, hero_idx = np.unique(events['hero'], return_inverse=True)
+    pair_idx = game_idx.astype(np.int64) * len(heroes) + hero_idx
+    is_key = (events['kind'] == KIND_PLACED_OBSERVER) & (events['ward_cnt'] <= max_ward_cnt)
+    return np.isin(pair_idx, pair_idx[is_key])
+
+
+def ward_window_mask(events, max_ward_cnt):
+    """
+    Events drawn for a ``--ward-cnt`` render: every event of a key hero up to
+    and including the time of the ``max_ward_cnt``-th observer ward.
+    """
+    if len(events['game_id']) == 0:
+        return np.zeros(0, dtype=bool)
+    return key_hero_mask(events, max_ward_cnt) & (events['time_s'] <= ward_cutoffs(events, max_ward_cnt))
@@ -0,0 +1,258 @@
+"""
+Ward / smoke route transitions between map grid cells over large corpora.
+
+The side images draw an arrow from every hero's event to its next one, which
+shows the routes of a handful of games. Here ``position_px`` is discretized
+into a ``grid`` x ``grid`` map grid, and every pair of successive events of a
+hero (observer, sentry or smoke, in game time order) adds one to the
+transition count from the first event's cell to the second one's, per
+(side, phase of the first event). Counts are accumulated chunk by chunk with
+NumPy, so memory only depends on the grid size; like heatmaps, accumulators
+of separate runs can be merged (``python -m utils.transitions a.npz b.npz``).
+
+``probabilities`` normalizes the counts into P(next cell | cell), and
+``top_flows`` / ``render_flows`` pick the K strongest moves between
+different cells and draw them as weighted arrows onto the map.
+"""
+import argparse
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from utils.encode import ImageWriter, fingerprint
+from utils.event_store import SIDES, summary_to_columns
+from utils.heatmap import DEFAULT_PHASE_MINUTES, phase_names
+from utils.vis import draw_arrow_fixed_tip
+
+
+DEFAULT_GRID = 16
+DEFAULT_TOP_K = 12
+CHUNK_GAMES = 256
+
+
+def iter_chunks(events_summary, size=CHUNK_GAMES):
+    """
+    Lists of at most size games from any iterable of games, so a generator
+    (e.g. ``Warehouse.iter_summary``) is never read as a whole.
+    """
+    chunk = []
+    for game in events_summary:
+        chunk.append(game)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class TransitionAccumulator:
+
+    def __init__(self, map_width, map_height, grid=DEFAULT_GRID, phase_minutes=DEFAULT_PHASE_MINUTES):
+        self.map_width = map_width
+        self.map_height = map_height
+        self.grid = grid
+        self.phase_minutes = tuple(phase_minutes)
+        self.phase_bounds = np.array(self.phase_minutes, dtype=np.int64) * 60
+        self.phases = phase_names(self.phase_minutes)
+        cells = grid * grid
+        # counts[side, phase, from_cell, to_cell]
+        self.counts = np.zeros((len(SIDES), len(self.phases), cells, cells), dtype=np.uint32)
+        self.game_num = 0
+
+    def cells(self, x_px, y_px):
+        """
+        Grid cell index (row-major) of pixel positions.
+        """
+        gx = np.clip(np.asarray(x_px, dtype=np.int64) * self.grid // self.map_width, 0, self.grid - 1)
+        gy = np.clip(np.asarray(y_px, dtype=np.int64) * self.grid // self.map_height, 0, self.grid - 1)
+        return gy * self.grid + gx
+
+    def cell_center(self, cell):
+        gy, gx = divmod(int(cell), self.grid)
+        return (int((gx + 0.5) * self.map_width / self.grid), int((gy + 0.5) * self.map_height / self.grid))
+
+    def add_columns(self, events):
+        """
+        Add event store columns holding whole games. Rows are put in (game,
+        hero, time) order, so each hero's successive events are neighbours.
+        """
+        if len(events['game_id']) == 0:
+            return
+        _, hero = np.unique(events['hero'].astype(str), return_inverse=True)
+        # lexsort is stable, events at the same second keep the hero's list order
+        order = np.lexsort((events['time_s'], hero, events['game_id']))
+        game_id = events['game_id'][order]
+        hero = hero[order]
+        cell = self.cells(events['x_px'][order], events['y_px'][order])
+
+        # a transition links a row to the next row of the same game and hero
+        link = (game_id[1:] == game_id[:-1]) & (hero[1:] == hero[:-1])
+        src = np.flatnonzero(link)
+        phase = np.searchsorted(self.phase_bounds, events['time_s'][order][src], side='right')
+        side = events['side'][order][src].astype(np.int64)
+        flat = np.ravel_multi_index((side, phase, cell[src], cell[src + 1]), self.counts.shape)
+        pairs, counts = np.unique(flat, return_counts=True)
+        self.counts.reshape(-1)[pairs] += counts.astype(np.uint32)
+        self.game_num += len(np.unique(game_id))
+
+    def add_summary(self, events_summary):
+        # feed games in chunks to keep the flattened columns small
+        for chunk in iter_chunks(events_summary):
+            self.add_columns(summary_to_columns(chunk)[1])
+
+    def merge(self, other):
+        if other.counts.shape != self.counts.shape or other.phase_minutes != self.phase_minutes \
+                or (other.map_width, other.map_height) != (self.map_width, self.map_height):
+            raise ValueError('cannot merge transitions with different map size, grid or phases')
+        self.counts += other.counts
+        self.game_num += other.game_num
+        return self
+
+    def count_matrix(self, side, phase=None):
+        """
+        (cells, cells) transition counts of one side, summed over all phases
+        when phase is None.
+        """
+        counts = self.counts[SIDES.index(side)]
+        if phase is not None:
+            return counts[phase].astype(np.int64)
+        return counts.sum(axis=0, dtype=np.int64)
+
+    def probabilities(self, side, phase=None):
+        """
+        Row-normalized transition matrix, P(next event in cell j | event in
+        cell i); rows of cells without outgoing transitions are zero.
+        """
+        counts = self.count_matrix(side, phase).astype(np.float64)
+        totals = counts.sum(axis=1, keepdims=True)
+        return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+    def top_flows(self, side, phase=None, k=DEFAULT_TOP_K):
+        """
+        The k largest transitions between different cells, strongest first:
+        [{from, to, count, probability}], cells as (column, row) of the grid.
+        """
+        counts = self.count_matrix(side, phase)
+        np.fill_diagonal(counts, 0)
+        flat = counts.reshape(-1)
+        k = min(k, int(np.count_nonzero(flat)))
+        if k == 0:
+            return []
+        top = np.argpartition(flat, -k)[-k:]
+        top = top[np.lexsort((top, -flat[top]))]
+        probabilities = self.probabilities(side, phase)
+        flows = []
+        for src, dst in zip(*np.unravel_index(top, counts.shape)):
+            flows.append({
+                'from': divmod(int(src), self.grid)[::-1],
+                'to': divmod(int(dst), self.grid)[::-1],
+                'count': int(counts[src, dst]),
+                'probability': round(float(probabilities[src, dst]), 4),
+            })
+        return flows
+
+    def render_flows(self, dota_map, side, phase=None, k=DEFAULT_TOP_K):
+        """
+        Draw the top k flows onto a copy of dota_map: arrow width follows the
+        count, color the probability (blue: rare next step, red: usual one).
+        """
+        vis_map = dota_map.copy()
+        flows = self.top_flows(side, phase, k)
+        if len(flows) == 0:
+            return vis_map, flows
+        max_count = flows[0]['count']
+        colors = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(-1, 1), cv2.COLORMAP_JET).reshape(-1, 3)
+        # weakest first, so the strongest flows end up on top
+        for flow in reversed(flows):
+            pt1 = self.cell_center(flow['from'][1] * self.grid + flow['from'][0])
+            pt2 = self.cell_center(flow['to'][1] * self.grid + flow['to'][0])
+            thickness = 1 + round(9 * flow['count'] / max_count)
+            color = tuple(int(c) for c in colors[min(255, int(flow['probability'] * 255))])
+            draw_arrow_fixed_tip(vis_map, pt1, pt2, color, thickness=thickness, tip_length=12 + 2 * thickness)
+            mid = ((pt1[0] + pt2[0]) // 2, (pt1[1] + pt2[1]) // 2)
+            cv2.putText(vis_map, str(flow['count']), mid, cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+        return vis_map, flows
+
+    def save(self, path):
+        np.savez_compressed(path, counts=self.counts, map_size=np.array([self.map_width, self.map_height]),
+                            phase_minutes=np.array(self.phase_minutes), game_num=self.game_num)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            map_width, map_height = data['map_size'].tolist()
+            grid = int(round(np.sqrt(data['counts'].shape[-1])))
+            acc = cls(map_width, map_height, grid=grid, phase_minutes=data['phase_minutes'].tolist())
+            acc.counts = data['counts'].astype(np.uint32)
+            acc.game_num = int(data['game_num'])
+        return acc
+
+
+def write_flow_maps(acc, dota_map, out_dir, team_name, k=DEFAULT_TOP_K, writer=None):
+    """
+    One image per side x (all phases + each phase), plus flows.json with the
+    flows drawn in every image. Images whose flows and label did not change
+    since the last run are skipped, see utils/encode.py.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    own_writer = writer is None
+    if own_writer:
+        writer = ImageWriter(out_dir)
+    map_key = fingerprint(dota_map)
+    paths = []
+    manifest = {'grid': acc.grid, 'game_num': acc.game_num, 'images': []}
+    for side in SIDES:
+        for phase in [None] + list(range(len(acc.phases))):
+            phase_name = 'all' if phase is None else acc.phases[phase]
+            title = f'{team_name}-{side}-flows-{phase_name}'
+            label = f'{title} (top {k}, {acc.game_num} games)'
+            path = writer.path(out_dir, title)
+            flows = acc.top_flows(side, phase, k)
+            key = fingerprint(map_key, label, acc.grid, flows)
+            if not writer.unchanged(path, key):
+                vis_map, flows = acc.render_flows(dota_map, side, phase, k)
+                cv2.putText(vis_map, label, (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 200), 2)
+                cv2.putText(vis_map, 'Made by SPACE', (vis_map.shape[1] - 300, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (200, 0, 0), 2)
+                writer.write(path, vis_map, key)
+            paths.append(path)
+            manifest['images'].append({'path': path.name, 'side': side, 'phase': phase_name, 'flows': flows})
+    with open(out_dir / 'flows.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    if own_writer:
+        writer.close()
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='merge saved transition accumulators and render their top flows')
+    parser.add_argument('inputs', nargs='*', help='transitions.npz files written by vision_smoke_moving.py --transitions')
+    parser.add_argument('--warehouse', type=str, default=None, help='also accumulate the games of --team from this SQLite warehouse, a batch at a time')
+    parser.add_argument('--grid', type=int, default=DEFAULT_GRID, help='with --warehouse: grid cells per map side')
+    parser.add_argument('--output', type=str, default='transitions_merged.npz')
+    parser.add_argument('--render-dir', type=str, default=None)
+    parser.add_argument('--team', type=str, default='merged')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+    if not args.inputs and args.warehouse is None:
+        parser.error('give transitions.npz files and / or --warehouse')
+
+    dota_map = cv2.imread('dota2_map.jpg')
+    accs = [TransitionAccumulator.load(path) for path in args.inputs]
+    if args.warehouse is not None:
+        from utils.warehouse import Warehouse
+
+        acc = TransitionAccumulator(dota_map.shape[1], dota_map.shape[0], grid=args.grid)
+        with Warehouse(args.warehouse) as warehouse:
+            acc.add_summary(warehouse.iter_summary(warehouse.select(team=args.team)))
+        accs.append(acc)
+    acc = accs[0]
+    for other in accs[1:]:
+        acc.merge(other)
+    acc.save(args.output)
+    print(f'{args.output} saved ({acc.game_num} games)')
+    if args.render_dir is not None:
+        paths = write_flow_maps(acc, dota_map, args.render_dir, args.team, k=args.top_k)
+        print(f'{len(paths)} flow maps saved to {args.render_dir}')
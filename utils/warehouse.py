@@ -0,0 +1,298 @@
+"""
+SQLite warehouse of parsed games, for keeping whole seasons of several teams.
+
+Three tables:
+
+    games     one row per (team, game_id): key faction side and game_time
+    players   hero / player of both factions, faction is 'key' or 'against'
+    events    one row per (event, hero) with the event store columns
+              (see utils/event_store.py), side, kind and ward_status as names
+
+with indexes on events (side, kind, time_s), events (hero, game) and
+players (player, faction), so questions like "dire observer wards between
+12 and 20 minutes" or "every game where X played Pudge" are answered by
+SQLite without loading the other games:
+
+    SELECT g.game_id, e.time, e.x_px, e.y_px FROM events e JOIN games g ON g.id = e.game
+    WHERE e.side = 'dire' AND e.kind = 'placed_observer' AND e.time_s BETWEEN 720 AND 1200
+
+``Warehouse.upsert`` loads games in batches, one transaction per batch. A game
+that is already stored for the team is replaced, so loading the same pages
+again leaves the warehouse unchanged. ``Warehouse.select`` takes the filters
+of ``GameStore.select`` as a SQL WHERE clause and ``Warehouse.iter_summary``
+(or ``Warehouse.summary``) streams the selected games back as
+``events_summary`` rows, a batch at a time.
+"""
+import argparse
+import json
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from utils.event_store import EVENT_COLUMNS, EVENT_DTYPES, KINDS, SIDES, STRING_COLUMNS, WARD_STATUSES, summary_to_columns, to_events_summary
+from utils.game_store import INDEXES
+
+
+DEFAULT_BATCH_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    team TEXT NOT NULL,
+    game_id INTEGER NOT NULL,
+    side TEXT NOT NULL,
+    game_time TEXT NOT NULL,
+    UNIQUE (team, game_id)
+);
+CREATE TABLE IF NOT EXISTS players (
+    game INTEGER NOT NULL,
+    faction TEXT NOT NULL,
+    hero TEXT NOT NULL,
+    player TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    game INTEGER NOT NULL,
+    side TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    time_s INTEGER NOT NULL,
+    hero TEXT NOT NULL,
+    player TEXT NOT NULL,
+    ward_cnt INTEGER NOT NULL,
+    left_percent REAL NOT NULL,
+    top_percent REAL NOT NULL,
+    x_px INTEGER NOT NULL,
+    y_px INTEGER NOT NULL,
+    lifetime_s INTEGER NOT NULL DEFAULT 0,
+    ward_status TEXT NOT NULL DEFAULT '',
+    event_idx INTEGER NOT NULL,
+    cluster_id INTEGER NOT NULL,
+    time TEXT NOT NULL,
+    action TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_game ON players (game);
+CREATE INDEX IF NOT EXISTS players_player ON players (player, faction);
+CREATE INDEX IF NOT EXISTS events_side_kind_time ON events (side, kind, time_s);
+CREATE INDEX IF NOT EXISTS events_hero_game ON events (hero, game);
+CREATE INDEX IF NOT EXISTS events_game ON events (game);
+"""
+
+# events columns in table order, game is the games.id of the row
+EVENT_FIELDS = ('side', 'kind', 'time_s', 'hero', 'player', 'ward_cnt', 'left_percent', 'top_percent',
+                'x_px', 'y_px', 'lifetime_s', 'ward_status', 'event_idx', 'cluster_id', 'time', 'action')
+# columns added after the first schema, added to older warehouses when they are opened
+ADDED_COLUMNS = {
+    'lifetime_s': "INTEGER NOT NULL DEFAULT 0",
+    'ward_status': "TEXT NOT NULL DEFAULT ''",
+}
+
+# filter -> (faction, players column) for the filters answered from the players table
+PLAYER_FILTERS = {
+    'player': ('key', 'player'),
+    'hero': ('key', 'hero'),
+    'opponent': ('against', 'player'),
+}
+# filter -> length of the game_time prefix it compares
+DATE_FILTERS = {'date': 10, 'month': 7, 'year': 4}
+
+
+def _values(value):
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+class Warehouse:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        # WAL lets a render read while an ingest is writing the next batch
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(events)')}
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f'ALTER TABLE events ADD COLUMN {name} {definition}')
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def upsert(self, events_summary, team, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Insert or replace the games of ``events_summary`` (dicts or compact
+        games) for team, one transaction per batch. Returns the number of games.
+        """
+        count = 0
+        batch = []
+        for game in events_summary:
+            batch.append(game)
+            if len(batch) == batch_size:
+                count += self._upsert_batch(batch, team)
+                batch = []
+        if batch:
+            count += self._upsert_batch(batch, team)
+        return count
+
+    def _upsert_batch(self, batch, team):
+        games, events = summary_to_columns(batch)
+        with self.conn:
+            refs = {}
+            for game_id, side, game_time in zip(games['game_id'].tolist(), games['side'].tolist(), games['game_time'].tolist()):
+                refs[game_id] = self.conn.execute(
+                    'INSERT INTO games (team, game_id, side, game_time) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (team, game_id) DO UPDATE SET side = excluded.side, game_time = excluded.game_time '
+                    'RETURNING id', (team, game_id, SIDES[side], game_time)).fetchone()[0]
+            old = [(ref,) for ref in refs.values()]
+            self.conn.executemany('DELETE FROM players WHERE game = ?', old)
+            self.conn.executemany('DELETE FROM events WHERE game = ?', old)
+
+            players = []
+            for game in batch:
+                ref = refs[int(game['game_id'])]
+                players.extend((ref, 'key', hero, player) for hero, player in game['hero_players'].items())
+                players.extend((ref, 'against', hero, player) for hero, player in game['hero_players_against'].items())
+            self.conn.executemany('INSERT INTO players (game, faction, hero, player) VALUES (?, ?, ?, ?)', players)
+
+            columns = [[refs[game_id] for game_id in events['game_id'].tolist()]]
+            for name in EVENT_FIELDS:
+                values = events[name].tolist()
+                if name == 'side':
+                    values = [SIDES[v] for v in values]
+                elif name == 'kind':
+                    values = [KINDS[v] for v in values]
+                elif name == 'ward_status':
+                    values = [WARD_STATUSES[v] for v in values]
+                columns.append(values)
+            self.conn.executemany(f'INSERT INTO events (game, {", ".join(EVENT_FIELDS)}) '
+                                  f'VALUES (?, {_placeholders(EVENT_FIELDS)})', zip(*columns))
+        return len(batch)
+
+    def select(self, team=None, limit=None, since=None, until=None, **filters):
+        """
+        games.id of the games matching every filter, newest game first. Takes
+        the filters of ``GameStore.select``; list values match any of them.
+        """
+        unknown = set(filters) - set(INDEXES)
+        if unknown:
+            raise ValueError(f'unknown game filters: {sorted(unknown)}, choose from {list(INDEXES)}')
+        where = []
+        params = []
+        if team is not None:
+            where.append('team = ?')
+            params.append(team)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            values = _values(value)
+            if name in PLAYER_FILTERS:
+                faction, column = PLAYER_FILTERS[name]
+                where.append(f'id IN (SELECT game FROM players WHERE faction = ? AND {column} IN ({_placeholders(values)}))')
+                params.extend([faction] + values)
+            elif name in DATE_FILTERS:
+                where.append(f'substr(game_time, 1, {DATE_FILTERS[name]}) IN ({_placeholders(values)})')
+                params.extend(values)
+            else:
+                where.append(f'{name} IN ({_placeholders(values)})')
+                params.extend(values)
+        if since is not None:
+            where.append('substr(game_time, 1, 10) >= ?')
+            params.append(str(since)[:10])
+        if until is not None:
+            where.append('substr(game_time, 1, 10) <= ?')
+            params.append(str(until)[:10])
+
+        sql = 'SELECT id FROM games'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY game_id DESC, team'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def iter_summary(self, refs, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Stream the games with these games.id as ``events_summary`` rows, in
+        the given order, reading batch_size games per query.
+        """
+        for start in range(0, len(refs), batch_size):
+            yield from self._read_batch(refs[start:start + batch_size])
+
+    def _read_batch(self, refs):
+        marks = _placeholders(refs)
+        games = {ref: row for ref, *row in self.conn.execute(
+            f'SELECT id, game_id, side, game_time FROM games WHERE id IN ({marks})', refs)}
+        hero_players = {ref: ({}, {}) for ref in refs}
+        for ref, faction, hero, player in self.conn.execute(
+                f'SELECT game, faction, hero, player FROM players WHERE game IN ({marks}) ORDER BY rowid', refs):
+            hero_players[ref][faction == 'against'][hero] = player
+
+        rows = self.conn.execute(f'SELECT game, {", ".join(EVENT_FIELDS)} FROM events '
+                                 f'WHERE game IN ({marks}) ORDER BY game, rowid', refs).fetchall()
+        fields = list(zip(*rows)) if rows else [()] * (len(EVENT_FIELDS) + 1)
+        events = {'game_id': np.array([games[ref][0] for ref in fields[0]], dtype=np.int64)}
+        for name, values in zip(EVENT_FIELDS, fields[1:]):
+            if name == 'side':
+                values = [SIDES.index(v) for v in values]
+            elif name == 'kind':
+                values = [KINDS.index(v) for v in values]
+            elif name == 'ward_status':
+                values = [WARD_STATUSES.index(v) for v in values]
+            events[name] = np.array(values, dtype=object if name in STRING_COLUMNS else EVENT_DTYPES.get(name, np.int32))
+        events = {name: events[name] for name in EVENT_COLUMNS}
+
+        refs = [ref for ref in refs if ref in games]
+        game_columns = {
+            'game_id': np.array([games[ref][0] for ref in refs], dtype=np.int64),
+            'side': np.array([SIDES.index(games[ref][1]) for ref in refs], dtype=np.int8),
+            'game_time': np.array([games[ref][2] for ref in refs], dtype=str),
+            'hero_players': [json.dumps(hero_players[ref][0]) for ref in refs],
+            'hero_players_against': [json.dumps(hero_players[ref][1]) for ref in refs],
+        }
+        return to_events_summary(game_columns, events)
+
+    def summary(self, team=None, limit=None, since=None, until=None, **filters):
+        """
+        Stream the ``events_summary`` rows of the matching games, newest game
+        first. The filters run in SQL, only the matching games are read.
+        """
+        return self.iter_summary(self.select(team=team, limit=limit, since=since, until=until, **filters))
+
+    def stats(self):
+        counts = {}
+        for table in ('games', 'players', 'events'):
+            counts[table] = self.conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+        counts['teams'] = dict(self.conn.execute('SELECT team, count(*) FROM games GROUP BY team ORDER BY team').fetchall())
+        return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='load event stores into a SQLite warehouse')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    load_parser = subparsers.add_parser('load', help='upsert the games of an event store')
+    load_parser.add_argument('store', type=str, help='event store directory written with --format store')
+    load_parser.add_argument('warehouse', type=str, help='SQLite database, created if missing')
+    load_parser.add_argument('--team', type=str, required=True)
+    load_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    stats_parser = subparsers.add_parser('stats', help='print table sizes and games per team')
+    stats_parser.add_argument('warehouse', type=str)
+    args = parser.parse_args()
+
+    with Warehouse(args.warehouse) as warehouse:
+        if args.command == 'load':
+            from utils.event_store import load_event_store
+
+            count = warehouse.upsert(to_events_summary(*load_event_store(args.store)), args.team, batch_size=args.batch_size)
+            print(f'{count} games loaded into {args.warehouse}')
+        print(warehouse.stats())
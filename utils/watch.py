@@ -0,0 +1,149 @@
+"""
+Watch mode: incrementally ingest match pages saved while the script runs.
+
+The data directory is polled for new or changed html files (by mtime and
+size). Only those pages are parsed; their rows are appended to the event
+store as a new part and merged into events_summary.csv, and only the side
+images that contain an affected game are re-rendered. Rendering only touches
+the top-N games of a side, so parsing and rendering a new match cost the same
+however many matches the season archive already holds.
+
+events_summary.csv keeps the order ingest writes (newest game first) and one
+row per game, so new games go to the top and a changed page replaces its row.
+Either way the file is copied once, record by record and without parsing the
+games: that copy is the one step of a poll that grows with the archive.
+
+A page that fails to parse (e.g. one that is still being saved) is reported
+and retried on the next poll.
+"""
+import csv
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from utils.compact import summary_rows
+from utils.event_store import write_event_store
+from utils.ingest import game_id_from_path, parse_games
+from utils.warehouse import Warehouse
+
+
+def snapshot(data_dir, pattern='*.html'):
+    state = {}
+    for path in Path(data_dir).glob(pattern):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        state[path] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def changed_files(data_dir, previous, pattern='*.html'):
+    """
+    Returns (changed paths sorted by game id, new snapshot).
+    """
+    current = snapshot(data_dir, pattern)
+    changed = [path for path, sig in current.items() if previous.get(path) != sig]
+    return sorted(changed, key=lambda x: int(game_id_from_path(x)), reverse=True), current
+
+
+def _csv_records(lines):
+    # raw text of every csv record, a quoted field may span several lines
+    record = ''
+    for line in lines:
+        record += line
+        if record.count('"') % 2 == 0:
+            yield record
+            record = ''
+
+
+def merge_csv(rows, csv_path):
+    """
+    Merge rows into events_summary.csv, newest game first like ingest writes
+    it; a row replaces the stored row of its game. Old records are copied as
+    they are through a temporary file, so a reader never sees half of it.
+    """
+    rows = sorted(summary_rows(rows), key=lambda row: int(row['game_id']), reverse=True)
+    pending = [(int(row['game_id']), pd.DataFrame([row]).to_csv(header=False, index=False, lineterminator='\n')) for row in rows]
+    tmp_path = csv_path.with_name(csv_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+        if not csv_path.exists():
+            dst.write(pd.DataFrame(rows[:1]).to_csv(index=False, lineterminator='\n').split('\n', 1)[0] + '\n')
+            dst.writelines(text for _, text in pending)
+        else:
+            with open(csv_path, encoding='utf-8', newline='') as src:
+                records = _csv_records(src)
+                header = next(records)
+                dst.write(header)
+                id_column = next(csv.reader([header])).index('game_id')
+                i = 0
+                for record in records:
+                    game_id = int(next(csv.reader(record.splitlines(keepends=True)))[id_column])
+                    while i < len(pending) and pending[i][0] >= game_id:
+                        dst.write(pending[i][1])
+                        i += 1
+                    if i and pending[i - 1][0] == game_id:
+                        # the old row of a changed game
+                        continue
+                    dst.write(record)
+                dst.writelines(text for _, text in pending[i:])
+    os.replace(tmp_path, csv_path)
+
+
+def watch(data_dir, store, map_width, map_height, key_player, out_dir, render, parser, cache=None,
+          write_csv=True, interval=5.0, pattern='*.html', max_polls=None, tables=None, warehouse=None, team=None):
+    """
+    Poll data_dir and ingest new / changed pages until interrupted.
+    The rows are upserted into store, the GameStore the images are rendered
+    from, so a poll only indexes the pages it parsed. render(sides, rows) is
+    called with the set of sides whose image has to be redrawn and those rows.
+    With intern tables the new rows are compact games, like parse_games.
+    With a warehouse path the rows are also upserted into it for team.
+    """
+    out_dir = Path(out_dir)
+    state = snapshot(data_dir, pattern)
+    print(f'watching {data_dir} every {interval}s, press Ctrl+C to stop')
+
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            time.sleep(interval)
+            polls += 1
+            changed, state = changed_files(data_dir, state, pattern)
+            if len(changed) == 0:
+                continue
+
+            start = time.perf_counter()
+            rows = []
+            for path in changed:
+                try:
+                    rows.extend(parse_games([path], map_width, map_height, key_player, parser=parser, cache=cache, tables=tables))
+                except Exception as e:
+                    # e.g. a page that is still being saved; left out of the snapshot so the next poll retries it
+                    print(f'could not parse {path}: {type(e).__name__}: {e}')
+                    del state[path]
+            if len(rows) == 0:
+                continue
+            affected_sides = set()
+            for row in rows:
+                old = store.upsert(row)
+                affected_sides.add(row['side'])
+                if old is not None:
+                    affected_sides.add(old['side'])
+                    print(f'{row["game_id"]} changed, the event store keeps the latest version')
+
+            # append only, earlier parts are never rewritten
+            part_path = write_event_store(rows, out_dir / 'event_store', append=True)
+            if write_csv:
+                merge_csv(rows, out_dir / 'events_summary.csv')
+            if warehouse is not None:
+                # changed games replace their old version in place
+                with Warehouse(warehouse) as db:
+                    db.upsert(rows, team)
+
+            render(affected_sides, rows)
+            print(f'ingested {len(rows)} page(s) into {part_path.name} in {time.perf_counter() - start:.2f}s')
+    except KeyboardInterrupt:
+        print('stopped watching')
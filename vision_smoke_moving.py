@@ -1,323 +1,496 @@
-import cv2
 import argparse
-import pandas as pd
-from bs4 import BeautifulSoup
+import struct
+import sys
 from pathlib import Path
-from tqdm import tqdm
-from utils.vis import draw_arrow_fixed_tip
 
+# cv2, pandas, numpy and tqdm are imported inside the commands that use them,
+# so e.g. `export` or `--help` do not pay for loading all of them
 
-def to_timedelta(t):
-
-    delta_time = 0
-    if t[0] == '-':
-        negative = True
-        t = t[1:]
-    else:
-        negative = False
-
-    parts = list(map(int, t.split(":")))
-    if len(parts) == 2:  # mm:ss
-        minutes, seconds = parts
-        delta_time = minutes * 60 + seconds
-    elif len(parts) == 3:  # hh:mm:ss
-        hours, minutes, seconds = parts
-        delta_time = hours * 3600 + minutes * 60 + seconds
-    else:
-        raise ValueError("Unsupported time format")
-
-    if negative:
-        if delta_time >= 0:
-            delta_time = -delta_time
-
-    return delta_time
+COMMANDS = {
+    'ingest': 'parse saved pages into events_summary.csv, the event store and / or a JSON bundle',
+    'render': 'draw the ward maps (and heatmaps / tiles / sweeps) from an event store, without parsing',
+    'export': 'write a JSON bundle or events_summary.csv from an event store',
+}
 
 
-def parse_events(file_path, map_width, map_height, key_player):
-
+def parse_events(file_path, map_width, map_height, key_player, parser='fast'):
+    from utils.parsers import get_parser
 
     with open(file_path, 'r', encoding='utf-8') as file:
         content = file.read()
-    
-    soup = BeautifulSoup(content, 'html.parser')
-
-    # check if the game side is Radiant or Dire
-    res = soup.find('a', string=key_player)
-    if 'radiant' in str(res).lower():
-        side = 'radiant'
-        side_against = 'dire'
-    else:
-        side = 'dire'
-        side_against = 'radiant'
-    # print(side)
-
-    # parse the time of the game, the the year-month-day
-    # <time datetime="2025-11-15T17:24:12+00:00" title="Sat, 15 Nov 2025 17:24:12 +0000" data-time-ago="2025-11-15T17:24:12+00:00">13 hours ago</time>
-    time_span = soup.find('time')
-    game_time = time_span['datetime']
-
-    # find the player and hero name
-    player_section = soup.find('section', class_=side)
-    player_section_against = soup.find('section', class_=side_against)
-    hero_players = dict()
-    hero_players_against = dict()
-
-    for player in player_section.find_all('tr', class_=f'faction-{side}'):
-        hero = player.find('img', class_='image-hero image-icon')
-        hero_name = hero['title'].replace("'", "")
-        player_name = player.find('a', class_=f'player-{side}')
-        hero_players[hero_name] = player_name.get_text(strip=True)
-    for player in player_section_against.find_all('tr', class_=f'faction-{side_against}'):
-        hero = player.find('img', class_='image-hero image-icon')
-        hero_name = hero['title'].replace("'", "")
-        player_name = player.find('a', class_=f'player-{side_against}')
-        hero_players_against[hero_name] = player_name.get_text(strip=True)
-
-    # Assuming events are in a specific HTML structure, e.g., <div class="event">
-    soup = soup.find('div', class_='match-log')
-
-    hero_events = dict()
-    observer_ward_cnt = 0
-
-    for event_div in soup.find_all('div', class_='event'):
-        data_div = event_div.find('div', class_='line')
-        if data_div is None:
-            continue
-        # print(data_div)
-        # break
-
-        heros = data_div.find_all('a', class_=f'color-faction-{side}')
-        if len(heros) == 0:
-            # not the action we are interested in
-            continue
-
-        event = {}
-        event['time'] = data_div.find('span', class_='time').get_text(strip=True) if data_div.find('span', class_='time') else None
-
-        action = data_div.find('div', class_='event').get_text()
-        # remove extra \n and spaces in action
-        action = ' '.join(action.split())
-
-        event['action'] = action
-        event['key_action'] = None
-        if 'placed a Observer Ward' in action:
-            event['key_action'] = 'placed_observer'
-            observer_ward_cnt += 1
-            event['observer_ward_cnt'] = observer_ward_cnt
-        elif 'activated Smoke of Deceit to stealth' in action:
-            event['key_action'] = 'smoke'
-        elif 'placed a Sentry Ward' in action:
-            event['key_action'] = 'placed_sentry'
-        else:
-            continue
-
-        hero_names = set()
-        for hero in heros:
-            # hero_name is in <img> alt tag
-            hero_name = hero.find('img')['alt']
-            if hero_name not in hero_events:
-                hero_events[hero_name] = []
-            hero_names.add(hero_name)
-            # print(hero_name)
-        # print(action)
-
-        pos_span = data_div.find('span', class_='minimap-tooltip')
-        map_item = pos_span.find('span', class_='map-item')
-    
-        style = map_item['style']
-        left_str = style.split('left:')[1].split('%')[0].strip()
-        top_str = style.split('top:')[1].split('%')[0].strip()
-        event['position'] = {
-            'left_percent': float(left_str),
-            'top_percent': float(top_str)
-        }
-
-        left = float(left_str) * 0.01 * map_width
-        top = float(top_str) * 0.01 * map_height
-        event['position_px'] = (int(left), int(top))
-        # Extract left and top percentages from style
-
-        for hero_name in list(hero_names):
-            hero_events[hero_name].append(event)
-    # print(hero_events)
-   
-    return hero_events, hero_players, hero_players_against, game_time, side
-
-
-if __name__ == "__main__":
-    argparse = argparse.ArgumentParser()
-    argparse.add_argument('--team', type=str, default='yb')
-    argparse.add_argument('--ward-cnt', type=int, default=2)
-    argparse.add_argument('--top-n', type=int, default=5)
-    argparse.add_argument('--player', type=str, default='YB.BoBoKa')
-    args = argparse.parse_args()
-    team_name = args.team
-
-    max_ward_cnt = args.ward_cnt
-    print('Collecting events with observer ward count <=', max_ward_cnt)
-
-    games = list(Path(f'data_{team_name}').glob('*.html'))
-    games = sorted(games, key=lambda x: int(x.stem.split(' ')[1]), reverse=True)
-    game_num = len(games)
-    print('total game num:', game_num)
-
-    dota_map = cv2.imread('dota2_map.jpg')
-    map_height, map_width, _ = dota_map.shape
 
-    out_dir = Path(f'output_{team_name}')
-    out_dir.mkdir(exist_ok=True)
-
-    sides = ['dire', 'radiant']
-    game_color = [
-        (0, 0, 255),
-        (0, 255, 0),
-        # (255, 0, 0),
-        (255, 255, 0),
-        (255, 0, 255),
-        # (0, 255, 255),
-        (0, 128, 255),
-        (128, 0, 255),
-        (128, 128, 255),
-        (128, 255, 0),
-        (255, 128, 0),
-        (255, 128, 128),
-        (255, 0, 128),
-        (128, 0, 128),
-        (128, 128, 128),
-        (128, 255, 255),
-        (255, 128, 255),
-        (255, 255, 128),
-        (255, 255, 255),
-    ]
-    # smoke color is purple
-    smoke_color = (173, 13, 106)
-    # observer ward color is yellow
-    observer_ward_color = (0, 255, 255)
-    sentry_ward_color = (255, 0, 0)
+    return get_parser(parser)(content, map_width, map_height, key_player)
+
+
+def map_size(map_path):
+    """
+    (width, height) from the JPEG header, without decoding the map.
+    """
+    with open(map_path, 'rb') as f:
+        data = f.read()
+    i = 2
+    while i + 9 < len(data):
+        marker, length = data[i + 1], struct.unpack('>H', data[i + 2:i + 4])[0]
+        # SOF0..SOF15 except DHT / JPG / DAC hold the frame size
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    raise ValueError(f'no frame header in {map_path}')
+
+
+def add_filter_args(parser):
+    from utils.game_store import add_filter_args
+
+    add_filter_args(parser)
+
+
+def add_profile_args(parser):
+    parser.add_argument('--profile', action='store_true', help='record time, call counts and peak memory per stage and file into output_{team}/profile.json')
+    parser.add_argument('--profile-no-memory', action='store_true', help='with --profile: skip tracemalloc, it slows python code down noticeably')
+    parser.add_argument('--profile-top', type=int, default=10, help='with --profile: number of slowest files to list')
+
+
+def add_ingest_args(parser, default_format='csv'):
+    from utils.parse_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+    from utils.parsers import DEFAULT_PARSER, PARSERS
+
+    parser.add_argument('--player', type=str, default='YB.BoBoKa')
+    parser.add_argument('--data', type=str, nargs='+', default=None, help='directories and zip / tar(.gz) archives of saved pages, defaults to data_{team}/')
+    parser.add_argument('--parser', type=str, default=DEFAULT_PARSER, choices=list(PARSERS))
+    parser.add_argument('--jobs', type=int, default=1, help='number of parsing / rendering processes, 0 means one per cpu')
+    parser.add_argument('--format', type=str, default=default_format, choices=['csv', 'store', 'both'], help='write events_summary.csv, the columnar event store or both')
+    parser.add_argument('--bundle', action='store_true', help='also write output_{team}/events_bundle.json.gz for the web visualizer')
+    parser.add_argument('--warehouse', type=str, default=None, help='also upsert the parsed games into this SQLite warehouse, see utils/warehouse.py')
+    parser.add_argument('--compact', action='store_true', help='keep parsed games as typed arrays instead of event dicts, for archives of thousands of games')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // 1024 // 1024)
+    parser.add_argument('--no-cache', action='store_true', help='parse every page without reading or writing the parse cache')
+    parser.add_argument('--clear-cache', action='store_true', help='drop all cached parse results before parsing')
+    parser.add_argument('--cache-stats', action='store_true', help='print parse cache hit and miss counts')
+
+
+def add_render_args(parser):
+    from utils.encode import DEFAULT_ENCODE_JOBS, IMAGE_FORMATS
+    from utils.heatmap import DEFAULT_BINS
+    from utils.sweep import int_list
+    from utils.tiles import DEFAULT_TILE_SIZE
+    from utils.transitions import DEFAULT_GRID, DEFAULT_TOP_K
+
+    parser.add_argument('--ward-cnt', type=int_list, default='2', help='with --sweep: a list or range, e.g. 1,2,3 or 1-4')
+    parser.add_argument('--top-n', type=int_list, default='5', help='with --sweep: a list or range, e.g. 3,5,10')
+    parser.add_argument('--sweep', action='store_true', help='render every side / --ward-cnt / --top-n combination from one parse')
+    parser.add_argument('--heatmap', action='store_true', help='also write observer / sentry / smoke density heatmaps per side and phase')
+    parser.add_argument('--heatmap-bins', type=int, default=DEFAULT_BINS)
+    parser.add_argument('--heatmap-sigma', type=float, default=2.0, help='gaussian smoothing of the accumulated grid, in bins')
+    parser.add_argument('--transitions', action='store_true', help='also write transition counts between map grid cells and top flow maps per side and phase')
+    parser.add_argument('--transition-grid', type=int, default=DEFAULT_GRID, help='grid cells per map side for --transitions')
+    parser.add_argument('--transition-top-k', type=int, default=DEFAULT_TOP_K, help='flows drawn per --transitions image')
+    parser.add_argument('--lifetimes', action='store_true', help='also write ward lifetime maps per side and ward type and per-spot survival to output_{team}/lifetimes')
+    parser.add_argument('--layer-cache', type=str, default=None, help='directory to keep rasterized per-game overlay layers between runs')
+    parser.add_argument('--tiles', action='store_true', help='also write zoomable tile pyramids of the map and each side overlay to output_{team}/tiles')
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument('--image-format', type=str, default='jpg', choices=IMAGE_FORMATS, help='format of the written images')
+    parser.add_argument('--quality', type=int, default=None, help='jpg quality 0-100 (default 95), webp quality 1-100 (default 90, 101 is lossless) or png compression level 0-9')
+    parser.add_argument('--encode-jobs', type=int, default=DEFAULT_ENCODE_JOBS, help='threads encoding images in the background, 0 means one per cpu')
+    parser.add_argument('--force', action='store_true', help='render every image, also those whose inputs did not change since the last run')
+
+
+def check_render_args(args):
+    if args.tiles and args.sweep:
+        raise ValueError('--tiles cuts the plain side images and cannot be combined with --sweep')
+    if not args.sweep:
+        if len(args.ward_cnt) > 1 or len(args.top_n) > 1:
+            raise ValueError('lists of --ward-cnt / --top-n values need --sweep')
+        args.ward_cnt = args.ward_cnt[0]
+        args.top_n = args.top_n[0]
+        print('Collecting events with observer ward count <=', args.ward_cnt)
+
+
+def resolve_key_player(args):
     key_players = {
         'yb': 'YB.BoBoKa',
     }
     key_player = args.player
     if key_player is None:
-        key_player = key_players.get(team_name, None)
+        key_player = key_players.get(args.team, None)
     if key_player is None:
-        raise ValueError(f'key_player is not set, please set it with --player')
-
-    events_summary = []
-
-    for i in tqdm(range(0, game_num), desc='Processing games'):
-        data_html_path = games[i]
-
-        # if '8526048356' not in data_html_path.stem:
-            # continue
-        events, hero_players, hero_players_against, game_time, side = parse_events(data_html_path, map_width, map_height, key_player=key_player)
-        # assert 0 < len(hero_players_against) <= 5, f'hero_players_against: {hero_players_against}'
-        # print(hero_players_against)
-        events_summary.append({
-            'events': events,
-            'hero_players': hero_players,
-            'hero_players_against': hero_players_against,
-            'side': side,
-            'game_id': data_html_path.stem.split(' ')[1],
-            'game_time': game_time,
-        })
+        raise ValueError('key_player is not set, please set it with --player')
+    return key_player
+
+
+def ingest(args, out_dir, map_width, map_height):
+    """
+    Parse the pages and write the requested outputs, returns (events_summary, cache, tables).
+    """
+    from utils.compact import InternTables, summary_rows
+    from utils.ingest import game_id_from_path, parse_games
+    from utils.parse_cache import ParseCache
+    from utils.profiler import profile_stage
+    from utils.sources import list_sources
+
+    # archive members are read in place, without extracting them
+    games = list_sources(args.data or [f'data_{args.team}'])
+    games = sorted(games, key=lambda x: int(game_id_from_path(x)), reverse=True)
+    game_num = len(games)
+    print('total game num:', game_num)
+
+    key_player = resolve_key_player(args)
+    cache = None
+    if not args.no_cache:
+        cache = ParseCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
+        if args.clear_cache:
+            cache.clear()
+
+    # with --compact all games share one set of intern tables for hero / player / time / action strings
+    tables = InternTables() if args.compact else None
+    with profile_stage('ingest'):
+        events_summary = parse_games(games, map_width, map_height, key_player, parser=args.parser, jobs=args.jobs, cache=cache, tables=tables)
+    if cache is not None and args.cache_stats:
+        print('parse cache:', cache.stats())
 
     # save the events summary, then will be used for web visualization
-    events_summary_df = pd.DataFrame(events_summary)
-    events_summary_df.to_csv(out_dir / f'events_summary.csv', index=False, lineterminator='\n')
-    print('events_summary.csv saved')
-    
-    for side in sides:
-        print(f'Processing side: {side}')
-
-        vis_map = dota_map.copy()
-        game_idx = 0
-
-        if side == 'dire':
-            offset = 40
+    if args.format in ('csv', 'both'):
+        with profile_stage('write_csv'):
+            write_csv(summary_rows(events_summary), out_dir / 'events_summary.csv')
+        print('events_summary.csv saved')
+    if args.format in ('store', 'both') or getattr(args, 'watch', False):
+        from utils.event_store import write_event_store
+
+        # one row per event in compressed numpy columns, see utils/event_store.py
+        with profile_stage('write_store'):
+            part_path = write_event_store(events_summary, out_dir / 'event_store')
+        print(f'{part_path} saved')
+    if args.bundle:
+        from utils.bundle import write_bundle
+
+        # columns, integer seconds and per-game indexes, loaded by webpage/js/visualizer.js without re-parsing
+        with profile_stage('write_bundle'):
+            bundle_path = write_bundle(events_summary, out_dir / 'events_bundle.json.gz')
+        print(f'{bundle_path} saved')
+    if args.warehouse:
+        from utils.warehouse import Warehouse
+
+        # one transaction per batch of games, games already stored for the team are replaced
+        with profile_stage('write_warehouse'), Warehouse(args.warehouse) as warehouse:
+            count = warehouse.upsert(events_summary, args.team)
+        print(f'{count} games saved to {args.warehouse}')
+    return events_summary, cache, tables
+
+
+def write_csv(rows, csv_path):
+    for _ in iter_write_csv(rows, csv_path):
+        pass
+
+
+def iter_write_csv(rows, csv_path):
+    """
+    Yield rows while writing them to csv_path, so the same stream of games
+    can feed another writer.
+    """
+    import pandas as pd
+
+    # in chunks, so compact games are only turned back into dicts a few at a time
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(row)
+        yield row
+        if len(chunk) == 256:
+            pd.DataFrame(chunk).to_csv(csv_path, mode='w' if first else 'a', header=first, index=False, lineterminator='\n')
+            chunk = []
+            first = False
+    if chunk or first:
+        pd.DataFrame(chunk).to_csv(csv_path, mode='w' if first else 'a', header=first, index=False, lineterminator='\n')
+
+
+def render(args, out_dir, events_summary, filtered=False):
+    """
+    Write the side images (or the sweep), heatmaps and tiles. events_summary
+    is a list of games or a GameStore, already matching the game filters if
+    filtered. Returns the render_sides function to redraw single sides, None
+    for a sweep.
+    """
+    import cv2
+
+    from utils.encode import ImageWriter, fingerprint
+    from utils.game_store import GameStore, filters_from_args, game_matches
+    from utils.profiler import profile_stage
+    from utils.render import LayerCache, render_side, render_side_overlay, side_render_key, ward_map_title
+    from utils.tiles import write_tile_pyramids
+
+    store = events_summary if isinstance(events_summary, GameStore) else GameStore(events_summary)
+    filters = filters_from_args(args)
+    # games are picked through the store indexes; without filters this is the store itself
+    games = store if filtered else store.subset(**filters)
+    if len(games) != len(store):
+        print(f'{len(games)} of {len(store)} games selected')
+    team_name = args.team
+    dota_map = cv2.imread('dota2_map.jpg')
+    map_height, map_width, _ = dota_map.shape
+    sides = ['dire', 'radiant']
+    # images are encoded in the background and skipped when their inputs did not change
+    writer = ImageWriter(out_dir, fmt=args.image_format, quality=args.quality, jobs=args.encode_jobs, force=args.force)
+    map_key = fingerprint(dota_map)
+
+    if args.heatmap:
+        from utils.heatmap import HeatmapAccumulator, write_heatmaps
+
+        with profile_stage('heatmap'):
+            heatmap = HeatmapAccumulator(map_width, map_height, bins=args.heatmap_bins)
+            heatmap.add_summary(games.games)
+            # keep the raw accumulator so runs over other games can be merged later
+            heatmap.save(out_dir / 'heatmap.npz')
+            paths = write_heatmaps(heatmap, dota_map, out_dir / 'heatmap', team_name, sigma=args.heatmap_sigma, writer=writer)
+        print(f'{len(paths)} heatmaps saved to {out_dir / "heatmap"}')
+
+    if args.transitions:
+        from utils.transitions import TransitionAccumulator, write_flow_maps
+
+        with profile_stage('transitions'):
+            transitions = TransitionAccumulator(map_width, map_height, grid=args.transition_grid)
+            transitions.add_summary(games)
+            transitions.save(out_dir / 'transitions.npz')
+            paths = write_flow_maps(transitions, dota_map, out_dir / 'transitions', team_name, k=args.transition_top_k, writer=writer)
+        print(f'{len(paths)} flow maps saved to {out_dir / "transitions"}')
+
+    if args.lifetimes:
+        from utils.event_store import summary_to_columns
+        from utils.lifetimes import write_lifetime_maps
+
+        with profile_stage('lifetimes'):
+            paths = write_lifetime_maps(summary_to_columns(games.games)[1], dota_map, out_dir / 'lifetimes', team_name, writer=writer)
+        print(f'{len(paths)} lifetime maps and ward_survival.csv saved to {out_dir / "lifetimes"}')
+
+    if args.sweep:
+        from utils.sweep import run_sweep
+
+        with profile_stage('imwrite'):
+            writer.close()
+        with profile_stage('sweep'):
+            manifest = run_sweep(games.games, 'dota2_map.jpg', out_dir / 'sweep', team_name, args.ward_cnt, args.top_n,
+                                 sides=sides, jobs=args.jobs, layer_cache_dir=args.layer_cache,
+                                 image_format=args.image_format, quality=args.quality, force=args.force)
+        print(f'{len(manifest["images"])} images saved, see {out_dir / "sweep" / "manifest.json"}')
+        return None
+
+    max_ward_cnt = args.ward_cnt
+    layer_cache = LayerCache(args.layer_cache)
+
+    def render_sides(render_sides, rows=()):
+        # rows watch has just upserted into the store, only they are (re)indexed
+        if games is not store:
+            for row in rows:
+                if game_matches(row, **filters):
+                    games.upsert(row)
+                else:
+                    games.remove(row['game_id'])
+        for side in sides:
+            if side not in render_sides:
+                continue
+            print(f'Processing side: {side}')
+
+            path = writer.path(out_dir, ward_map_title(team_name, side, max_ward_cnt, args.top_n))
+            with profile_stage('fingerprint'):
+                key = fingerprint(map_key, side_render_key(dota_map.shape, games, side, max_ward_cnt, args.top_n, team_name))
+            if writer.unchanged(path, key):
+                print(f'{path.name} unchanged, skipped')
+            else:
+                with profile_stage('render'):
+                    _, vis_map = render_side(dota_map, games, side, max_ward_cnt, args.top_n, team_name, layer_cache)
+                # encoded by the writer threads while the next side renders
+                writer.write(path, vis_map, key)
+                print(f'{path.name} saved')
+
+            if args.tiles:
+                # unchanged tiles are skipped by content hash, see utils/tiles.py
+                with profile_stage('tiles'):
+                    overlay = render_side_overlay(dota_map.shape, games, side, max_ward_cnt, args.top_n, layer_cache)
+                    layer_name = f'{side}_wards_{max_ward_cnt}_top_{args.top_n}'
+                    written = write_tile_pyramids({layer_name: overlay}, out_dir / 'tiles', tile_size=args.tile_size, jobs=args.jobs)
+                print(f'{written[layer_name]} tiles of {layer_name} written')
+        with profile_stage('imwrite'):
+            writer.flush()
+
+    if args.tiles:
+        with profile_stage('tiles'):
+            written = write_tile_pyramids({'map': dota_map}, out_dir / 'tiles', tile_size=args.tile_size, jobs=args.jobs)
+        print(f'{written["map"]} map tiles written')
+
+    render_sides(sides)
+    if writer.skipped:
+        print(f'{writer.skipped} images unchanged since the last run, use --force to redraw them')
+    return render_sides
+
+
+def load_store_summary(store_dir):
+    """
+    events_summary rows from an event store, newest game first like a parse.
+    """
+    from utils.event_store import load_event_store, to_events_summary
+
+    events_summary = to_events_summary(*load_event_store(store_dir))
+    return sorted(events_summary, key=lambda game: int(game['game_id']), reverse=True)
+
+
+def load_warehouse_summary(args):
+    """
+    GameStore of the --team games render draws, newest game first. The game
+    filters run in SQL and the matching games are streamed into the store, the
+    other games of the warehouse are never read.
+    """
+    import heapq
+
+    from utils.game_store import GameStore, filters_from_args
+    from utils.warehouse import Warehouse
+
+    filters = filters_from_args(args)
+    with Warehouse(args.warehouse) as warehouse:
+        if args.sweep or args.heatmap or args.transitions or args.lifetimes:
+            return GameStore(warehouse.summary(team=args.team, **filters))
+        # the side images only draw the newest --top-n games of each side
+        sides = [warehouse.summary(team=args.team, side=side, limit=args.top_n, **filters) for side in ['dire', 'radiant']]
+        return GameStore(heapq.merge(*sides, key=lambda game: -int(game['game_id'])))
+
+
+def start_profiler(args):
+    from utils.profiler import enable_profiler
+
+    return enable_profiler(trace_memory=not args.profile_no_memory) if args.profile else None
+
+
+def finish_profiler(profiler, args, out_dir):
+    if profiler is not None:
+        profiler.write(out_dir / 'profile.json')
+        print(profiler.summary(top_files=args.profile_top))
+        print(f'{out_dir / "profile.json"} saved')
+
+
+def output_dir(args):
+    out_dir = Path(f'output_{args.team}')
+    out_dir.mkdir(exist_ok=True)
+    return out_dir
+
+
+def run_all(argv):
+    # the original single command: parse, write and render in one go
+    parser = argparse.ArgumentParser(epilog='commands: ' + '; '.join(f'{name}: {help}' for name, help in COMMANDS.items()) +
+                                            '. Run `vision_smoke_moving.py <command> --help` for their options.')
+    parser.add_argument('--team', type=str, default='yb')
+    add_ingest_args(parser)
+    add_render_args(parser)
+    add_filter_args(parser)
+    parser.add_argument('--watch', action='store_true', help='keep running and ingest pages saved to data_{team}/ after the first run')
+    parser.add_argument('--watch-interval', type=float, default=5.0, help='seconds between two scans of data_{team}/')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    profiler = start_profiler(args)
+
+    if args.watch and args.sweep:
+        raise ValueError('--watch re-renders the plain side images and cannot be combined with --sweep')
+    if args.watch and args.data:
+        raise ValueError('--watch polls data_{team}/ and cannot be combined with --data')
+    check_render_args(args)
+
+    out_dir = output_dir(args)
+    events_summary, cache, tables = ingest(args, out_dir, *map_size('dota2_map.jpg'))
+    from utils.game_store import GameStore
+
+    # one store for the whole run, watch adds the games it ingests to it
+    store = GameStore(events_summary)
+    render_sides = render(args, out_dir, store)
+
+    if args.watch:
+        from utils.watch import watch
+
+        map_width, map_height = map_size('dota2_map.jpg')
+        watch(Path(f'data_{args.team}'), store, map_width, map_height, resolve_key_player(args), out_dir, render_sides,
+              parser=args.parser, cache=cache, write_csv=args.format in ('csv', 'both'), interval=args.watch_interval, tables=tables,
+              warehouse=args.warehouse, team=args.team)
+
+    finish_profiler(profiler, args, out_dir)
+
+
+def run_ingest(argv):
+    parser = argparse.ArgumentParser(prog='vision_smoke_moving.py ingest', description=COMMANDS['ingest'])
+    parser.add_argument('--team', type=str, default='yb')
+    add_ingest_args(parser, default_format='both')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    profiler = start_profiler(args)
+
+    out_dir = output_dir(args)
+    ingest(args, out_dir, *map_size('dota2_map.jpg'))
+    finish_profiler(profiler, args, out_dir)
+
+
+def run_render(argv):
+    parser = argparse.ArgumentParser(prog='vision_smoke_moving.py render', description=COMMANDS['render'])
+    parser.add_argument('--team', type=str, default='yb')
+    parser.add_argument('--store', type=str, default=None, help='event store written by ingest, defaults to output_{team}/event_store')
+    parser.add_argument('--warehouse', type=str, default=None, help='read the games of --team from this SQLite warehouse instead of the event store')
+    parser.add_argument('--jobs', type=int, default=1, help='number of rendering processes, 0 means one per cpu')
+    add_render_args(parser)
+    add_filter_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    profiler = start_profiler(args)
+    check_render_args(args)
+
+    out_dir = output_dir(args)
+    from utils.profiler import profile_stage
+
+    with profile_stage('load_store'):
+        if args.warehouse:
+            events_summary = load_warehouse_summary(args)
         else:
-            offset = -25
+            events_summary = load_store_summary(args.store or out_dir / 'event_store')
+    print('total game num:', len(events_summary))
+    # warehouse games were filtered in SQL
+    render(args, out_dir, events_summary, filtered=bool(args.warehouse))
+    finish_profiler(profiler, args, out_dir)
+
+
+def run_export(argv):
+    parser = argparse.ArgumentParser(prog='vision_smoke_moving.py export', description=COMMANDS['export'])
+    parser.add_argument('--team', type=str, default='yb')
+    parser.add_argument('--store', type=str, default=None, help='event store written by ingest, defaults to output_{team}/event_store')
+    parser.add_argument('--warehouse', type=str, default=None, help='read the games of --team from this SQLite warehouse instead of the event store')
+    parser.add_argument('--bundle', type=str, default=None, help='bundle path (.json or .json.gz), defaults to output_{team}/events_bundle.json.gz')
+    parser.add_argument('--csv', type=str, default=None, help='also write events_summary.csv to this path')
+    add_filter_args(parser)
+    args = parser.parse_args(argv)
+
+    from utils.bundle import write_bundle
+    from utils.game_store import GameStore, filters_from_args
+
+    out_dir = output_dir(args)
+    if args.warehouse:
+        from utils.warehouse import Warehouse
+
+        with Warehouse(args.warehouse) as warehouse:
+            refs = warehouse.select(team=args.team, **filters_from_args(args))
+            print(f'{len(refs)} games selected')
+            # streamed from SQL a batch of games at a time, the csv and the bundle are written in one pass
+            games = warehouse.iter_summary(refs)
+            if args.csv:
+                games = iter_write_csv(games, args.csv)
+            bundle_path = write_bundle(games, args.bundle or out_dir / 'events_bundle.json.gz')
+        if args.csv:
+            print(f'{args.csv} saved')
+    else:
+        games = GameStore(load_store_summary(args.store or out_dir / 'event_store')).select(**filters_from_args(args))
+        print(f'{len(games)} games selected')
+        if args.csv:
+            write_csv(games, args.csv)
+            print(f'{args.csv} saved')
+        bundle_path = write_bundle(games, args.bundle or out_dir / 'events_bundle.json.gz')
+    print(f'{bundle_path} saved')
 
-        for _, game_event in enumerate(events_summary):
 
-            game_side = game_event['side']
-            if game_side != side:
-                continue
-            game_id = game_event['game_id']
-            all_hero_events = game_event['events']
-            key_heros = []
-            cut_event_time = None
-
-            for hero_name, hero_events in all_hero_events.items():
-
-                key_hero = False
-                for event in hero_events:
-                    if event['key_action'] == 'placed_observer' and event['observer_ward_cnt'] <= max_ward_cnt:
-                        key_hero = True
-                        if event['observer_ward_cnt'] == max_ward_cnt:
-                            cut_event_time = to_timedelta(event['time'])
-                        # break
-                    # elif event['key_action'] == 'placed_sentry':
-                        # key_hero = True
-                
-                if key_hero:
-                    key_heros.append(hero_name)
-
-            # cut_event_time = 0
-               
-            for hero_name, hero_events in all_hero_events.items():
-
-                if hero_name not in key_heros:
-                    continue
-
-                last_position_px = None
-                for event in hero_events:
-                    event_time = to_timedelta(f'{event["time"]}')
-                    # print(event['time'])
-                    if event_time > cut_event_time:
-                        break
-
-                    if event['key_action'] == 'smoke':
-
-                        cv2.circle(vis_map, event['position_px'], 10, smoke_color, -1)
-                        text_pos = (int(event['position_px'][0])-50, int(event['position_px'][1])+offset)
-                        cv2.putText(vis_map, event['time'], text_pos, cv2.FONT_HERSHEY_SIMPLEX, 1, game_color[game_idx], 2)
-
-                        if last_position_px is not None:
-                            draw_arrow_fixed_tip(vis_map, last_position_px, event['position_px'], game_color[game_idx], 2)
-                        last_position_px = event['position_px']
-                    elif event['key_action'] == 'placed_observer':
-                        cv2.circle(vis_map, event['position_px'], 10, observer_ward_color, -1)
-                        text_pos = (int(event['position_px'][0])-50, int(event['position_px'][1])+offset)
-                        cv2.putText(vis_map, event['time'] + f"[{str(event['observer_ward_cnt'])}]", text_pos, cv2.FONT_HERSHEY_SIMPLEX, 1, game_color[game_idx], 2)
-                        if last_position_px is not None:
-                            draw_arrow_fixed_tip(vis_map, last_position_px, event['position_px'], game_color[game_idx], 2)
-                        last_position_px = event['position_px']
-
-                    elif event['key_action'] == 'placed_sentry':
-                        cv2.circle(vis_map, event['position_px'], 10, sentry_ward_color, -1)
-                        text_pos = (int(event['position_px'][0])-50, int(event['position_px'][1])+offset)
-                        cv2.putText(vis_map, event['time'], text_pos, cv2.FONT_HERSHEY_SIMPLEX, 1, game_color[game_idx], 2)
-                        if last_position_px is not None:
-                            draw_arrow_fixed_tip(vis_map, last_position_px, event['position_px'], game_color[game_idx], 2)
-                        last_position_px = event['position_px']
-
-            # set gray background for the game id
-            cv2.rectangle(vis_map, (vis_map.shape[1] - 260, game_idx * 40+20), (vis_map.shape[1]-40, game_idx * 40 + 70), (128, 128, 128), -1)
-            cv2.putText(vis_map, f'{game_id}', (vis_map.shape[1] - 250, game_idx * 40 + 50), cv2.FONT_HERSHEY_SIMPLEX, 1, game_color[game_idx], 2)
-            
-            game_idx += 1
-            if args.top_n is not None and game_idx >= args.top_n:
-                break
-                   
-        title = f'{team_name}-{side}-Wards<={max_ward_cnt}'
-        if args.top_n is not None:
-            title += f'-Top {args.top_n} Games'
-       
-        cv2.putText(vis_map, f'{title}', (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 200), 2)
-        cv2.putText(vis_map, 'Made by SPACE', (vis_map.shape[1] - 300, vis_map.shape[0] - 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (200, 0, 0), 2)
-        cv2.imwrite(str(out_dir / f'{title}.jpg'), vis_map)
-        print(f'{title}.jpg saved')
-
-        # break
-        
\ No newline at end of file
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        {'ingest': run_ingest, 'render': run_render, 'export': run_export}[argv[0]](argv[1:])
+    else:
+        run_all(argv)
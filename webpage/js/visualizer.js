@@ -6,6 +6,9 @@
 // Global variables
 let gamesData = [];
 let allEvents = [];
+let gamesById = new Map();
+// JSON bundle written by vision_smoke_moving.py --bundle, null for CSV data
+let bundle = null;
 let selectedGames = new Set();
 let maxObserverWards = 2;
 let showSentryWards = false;
@@ -27,7 +30,13 @@ function initializeEventListeners() {
     // File upload handler
     document.getElementById('csvFile').addEventListener('change', function(event) {
         const file = event.target.files[0];
-        if (file) {
+        if (!file) return;
+        const name = file.name.toLowerCase();
+        if (name.endsWith('.gz')) {
+            loadBundleFile(file, true);
+        } else if (name.endsWith('.json')) {
+            loadBundleFile(file, false);
+        } else {
             loadCSVFile(file);
         }
     });
@@ -74,6 +83,121 @@ function loadCSVFile(file) {
     reader.readAsText(file);
 }
 
+/**
+ * Load a JSON bundle, gunzipped in the browser when compressed
+ */
+async function loadBundleFile(file, compressed) {
+    showLoading(true);
+    hideError();
+
+    try {
+        let text;
+        if (compressed) {
+            if (typeof DecompressionStream === 'undefined') {
+                throw new Error('this browser cannot decompress .gz files, load the uncompressed .json bundle instead');
+            }
+            text = await new Response(file.stream().pipeThrough(new DecompressionStream('gzip'))).text();
+        } else {
+            text = await file.text();
+        }
+        parseBundleData(JSON.parse(text));
+        showLoading(false);
+        document.getElementById('dataSection').style.display = 'block';
+    } catch (error) {
+        showError('Error loading bundle: ' + error.message);
+        showLoading(false);
+    }
+}
+
+/**
+ * Populate game information from a bundle, events are built per game when it is selected
+ */
+function parseBundleData(data) {
+    if (data.format !== 'ti14-vision-bundle') {
+        throw new Error('not a vision bundle');
+    }
+
+    bundle = data;
+    allEvents = [];
+    gamesData = data.games.game_id.map((gameId, index) => ({
+        gameId: gameId,
+        side: data.games.side[index],
+        heroPlayers: data.games.hero_players[index],
+        heroPlayersAgainst: data.games.hero_players_against[index],
+        gameTime: data.games.game_time[index],
+        bundleIndex: index,
+        observerTimes: data.games.observer_times[index],
+        bundleEvents: null
+    }));
+
+    if (gamesData.length === 0) {
+        showError('The bundle does not contain any games.');
+        return;
+    }
+
+    indexGames();
+    populateGamesList();
+    populatePlayerNames();
+    updateVisualization();
+    updateStats();
+}
+
+/**
+ * Event objects of one bundle game, in time order
+ */
+function bundleGameEvents(game) {
+    if (game.bundleEvents) return game.bundleEvents;
+
+    const events = bundle.events;
+    const start = bundle.games.event_offsets[game.bundleIndex];
+    const end = bundle.games.event_offsets[game.bundleIndex + 1];
+    game.bundleEvents = [];
+    for (let i = start; i < end; i++) {
+        const keyAction = bundle.kinds[events.kind[i]];
+        const event = {
+            time: bundle.times[events.time[i]],
+            time_s: events.time_s[i],
+            key_action: keyAction,
+            position: {
+                left_percent: events.left_percent[i],
+                top_percent: events.top_percent[i]
+            },
+            cluster_id: events.cluster_id[i],
+            hero: bundle.heroes[events.hero[i]],
+            gameId: game.gameId,
+            side: game.side
+        };
+        if (keyAction === 'placed_observer') {
+            event.observer_ward_cnt = events.ward_cnt[i];
+        }
+        game.bundleEvents.push(event);
+    }
+    return game.bundleEvents;
+}
+
+/**
+ * Events of the selected games
+ */
+function selectedEvents() {
+    if (!bundle) {
+        return allEvents.filter(event => selectedGames.has(event.gameId));
+    }
+    const events = [];
+    gamesData.forEach(game => {
+        if (selectedGames.has(game.gameId)) {
+            events.push(...bundleGameEvents(game));
+        }
+    });
+    return events;
+}
+
+/**
+ * Look up games by id instead of scanning gamesData for every marker
+ */
+function indexGames() {
+    gamesById = new Map(gamesData.map(game => [game.gameId, game]));
+}
+
 /**
  * Convert Python tuples to JSON arrays
  */
@@ -100,6 +224,7 @@ function parseCSVData(csv) {
     
     gamesData = [];
     allEvents = [];
+    bundle = null;
 
     for (let i = 1; i < lines.length; i++) {
         const line = lines[i];
@@ -178,6 +303,7 @@ function parseCSVData(csv) {
         return;
     }
     
+    indexGames();
     populateGamesList();
     populatePlayerNames();
     updateVisualization();
@@ -540,7 +666,7 @@ function updateVisualization() {
     document.querySelectorAll('.path-arrow').forEach(arrow => arrow.remove());
 
     // Filter events based on selected games and ward limits
-    let filteredEvents = filterEventsByWardLimit(allEvents.filter(event => selectedGames.has(event.gameId)));
+    let filteredEvents = filterEventsByWardLimit(selectedEvents());
     
     // Apply observer-only mode if enabled
     if (observerOnlyMode) {
@@ -560,7 +686,7 @@ function updateVisualization() {
     // Sort events by time within each hero group
     Object.keys(eventsByGameAndHero).forEach(key => {
         eventsByGameAndHero[key].sort((a, b) => {
-            return parseTime(a.time) - parseTime(b.time);
+            return eventSeconds(a) - eventSeconds(b);
         });
     });
 
@@ -577,14 +703,14 @@ function updateVisualization() {
         if (a.gameId !== b.gameId) {
             return a.gameId.localeCompare(b.gameId);
         }
-        return parseTime(a.time) - parseTime(b.time);
+        return eventSeconds(a) - eventSeconds(b);
     });
 
-    // Deduplicate smoke events for visualization
+    // Deduplicate smoke events for visualization, bundles merge a team smoke into one cluster
     const seenSmokeEvents = new Set();
     const eventsToVisualize = sortedFilteredEvents.filter(event => {
         if (event.key_action === 'smoke') {
-            const smokeKey = `${event.gameId}_${event.time}_${event.position.left_percent}_${event.position.top_percent}`;
+            const smokeKey = event.cluster_id !== undefined ? `${event.gameId}_c${event.cluster_id}` : `${event.gameId}_${event.time}_${event.position.left_percent}_${event.position.top_percent}`;
             if (seenSmokeEvents.has(smokeKey)) {
                 return false;
             }
@@ -669,7 +795,7 @@ function createEventMarker(event) {
     playerNameLabel.style.top = `${top}%`;
     
     // Find the player name for this hero in this game
-    const gameData = gamesData.find(game => game.gameId === event.gameId);
+    const gameData = gamesById.get(event.gameId);
     let playerName = event.hero; // fallback to hero name
     if (gameData && gameData.heroPlayers && gameData.heroPlayers[event.hero]) {
         playerName = gameData.heroPlayers[event.hero];
@@ -701,7 +827,7 @@ function showTooltip(e, event) {
                       event.key_action === 'placed_observer' ? 'Observer Ward' : 'Sentry Ward';
     
     // Find the player name for this hero in this game
-    const gameData = gamesData.find(game => game.gameId === event.gameId);
+    const gameData = gamesById.get(event.gameId);
     let playerName = '';
     if (gameData && gameData.heroPlayers && gameData.heroPlayers[event.hero]) {
         playerName = ` (${gameData.heroPlayers[event.hero]})`;
@@ -742,17 +868,25 @@ function filterEventsByWardLimit(events) {
 
     const filteredEvents = [];
     Object.values(eventsByGame).forEach(gameEvents => {
-        gameEvents.sort((a, b) => parseTime(a.time) - parseTime(b.time));
+        gameEvents.sort((a, b) => eventSeconds(a) - eventSeconds(b));
         
         let observerWardCount = 0;
         let cutoffTime = null;
+        const game = gamesById.get(gameEvents[0].gameId);
         
-        for (let event of gameEvents) {
-            if (event.key_action === 'placed_observer') {
-                observerWardCount++;
-                if (observerWardCount === maxObserverWards) {
-                    cutoffTime = parseTime(event.time);
-                    break;
+        if (game && game.observerTimes) {
+            // precomputed in the bundle
+            if (maxObserverWards <= game.observerTimes.length) {
+                cutoffTime = game.observerTimes[maxObserverWards - 1];
+            }
+        } else {
+            for (let event of gameEvents) {
+                if (event.key_action === 'placed_observer') {
+                    observerWardCount++;
+                    if (observerWardCount === maxObserverWards) {
+                        cutoffTime = eventSeconds(event);
+                        break;
+                    }
                 }
             }
         }
@@ -773,7 +907,7 @@ function filterEventsByWardLimit(events) {
             });
         } else {
             gameEvents.forEach(event => {
-                const eventTime = parseTime(event.time);
+                const eventTime = eventSeconds(event);
                 if (eventTime <= cutoffTime) {
                     if (event.key_action === 'placed_sentry') {
                         if (showSentryWards) {
@@ -809,7 +943,7 @@ function filterObserverOnlyMode(events) {
 
     const filteredEvents = [];
     Object.values(eventsByGame).forEach(gameEvents => {
-        gameEvents.sort((a, b) => parseTime(a.time) - parseTime(b.time));
+        gameEvents.sort((a, b) => eventSeconds(a) - eventSeconds(b));
         
         let observerWardCount = 0;
         
@@ -826,6 +960,13 @@ function filterObserverOnlyMode(events) {
     return filteredEvents;
 }
 
+/**
+ * Event time in seconds, precomputed by the parser or bundle when available
+ */
+function eventSeconds(event) {
+    return event.time_s !== undefined ? event.time_s : parseTime(event.time);
+}
+
 /**
  * Parse time string to seconds
  */
@@ -940,8 +1081,7 @@ function getHeroColor(heroName, gameId) {
  * Update statistics display
  */
 function updateStats() {
-    const selectedEvents = allEvents.filter(event => selectedGames.has(event.gameId));
-    let filteredEvents = filterEventsByWardLimit(selectedEvents);
+    let filteredEvents = filterEventsByWardLimit(selectedEvents());
     
     if (observerOnlyMode) {
         filteredEvents = filterObserverOnlyMode(filteredEvents);
@@ -950,7 +1090,7 @@ function updateStats() {
     const uniqueSmokeEvents = new Set();
     const smokeEvents = filteredEvents.filter(e => e.key_action === 'smoke');
     smokeEvents.forEach(event => {
-        const smokeKey = `${event.gameId}_${event.time}`;
+        const smokeKey = event.cluster_id !== undefined ? `${event.gameId}_c${event.cluster_id}` : `${event.gameId}_${event.time}`;
         uniqueSmokeEvents.add(smokeKey);
     });
     